@@ -0,0 +1,79 @@
+"""
+Runs the benchmark suite. Replaces the old `run/perf/meas_complexity.py`.
+
+Running:
+python -m halfplane.bench --output data/bench/baseline.json
+python -m halfplane.bench --baseline data/bench/baseline.json
+python -m halfplane.bench --filter "detect_boundary/*" --repeats 15
+
+With `--baseline`, the exit code is 1 if any case regressed.
+"""
+
+import fnmatch
+import sys
+from argparse import ArgumentParser
+
+from . import report
+from .cases import all_cases
+
+
+def main(argv=None) -> int:
+    parser = ArgumentParser(prog="python -m halfplane.bench")
+    parser.add_argument(
+        "--filter",
+        action="append",
+        default=[],
+        help="Glob over case names, e.g. 'find_vertices/*'. Can be repeated.",
+    )
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--repeats", type=int, default=7)
+    parser.add_argument("--output", help="Path of the JSON report.")
+    parser.add_argument("--baseline", help="JSON report to compare against.")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.1,
+        help="Relative change of the median that counts as a regression.",
+    )
+    parser.add_argument("--list", action="store_true", help="List cases and exit.")
+    args = parser.parse_args(argv)
+
+    cases = [
+        case
+        for case in all_cases()
+        if not args.filter
+        or any(fnmatch.fnmatchcase(case.name, pattern) for pattern in args.filter)
+    ]
+    if args.list:
+        print("\n".join(case.name for case in cases))
+        return 0
+
+    def _progress(case, stats):
+        print(report.format_stats(case.name, stats), file=sys.stderr)
+
+    current = report.run_suite(
+        cases, warmup=args.warmup, repeats=args.repeats, progress=_progress
+    )
+    if args.output:
+        report.save(current, args.output)
+
+    if args.baseline is None:
+        return 0
+
+    baseline = report.load(args.baseline)
+    # Cases left out by the filters aren't missing.
+    names = {case.name for case in cases}
+    baseline["results"] = {
+        name: stats for name, stats in baseline["results"].items() if name in names
+    }
+    comparisons = report.compare(baseline, current, threshold=args.threshold)
+    print(report.format_comparisons(comparisons))
+    regressions = [c for c in comparisons if c.status == "regression"]
+    if regressions:
+        print(f"{len(regressions)} regression(s)", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,235 @@
+"""
+Benchmark cases. Each case times a single phase of the pipeline on a single
+input shape.
+
+Inputs are built anew before every repeat, outside of the timed region.
+Shapes cache a lot of lazily calculated state (cross points, eterm endpoints,
+the eterm index), so reusing them would time warm caches after the first
+repeat. Phases later in the pipeline get their inputs from the earlier
+phases, in the same state `flat.detect_boundary()` would see them in.
+
+The exception are the `incremental_edit` cases. Building the boundary is way
+slower than the timed edit, so a single boundary is shared by all repeats. An
+edit adds an eterm and removes it again, leaving the boundary as it was.
+"""
+
+import dataclasses
+import functools
+import itertools
+import math
+import random
+import typing as t
+
+import numpy as np
+
+from .. import common_shapes, flat, incremental, shape_gen
+
+
+@dataclasses.dataclass(frozen=True)
+class Case:
+    phase: str
+    shape: str
+
+    setup: t.Callable[[], tuple]
+    "Builds the arguments of `run`. Not timed."
+
+    run: t.Callable[..., t.Any]
+    "The timed call."
+
+    @property
+    def name(self) -> str:
+        return f"{self.phase}/{self.shape}"
+
+
+def _random_rects(seed: int, n: int) -> flat.Esum:
+    rng = random.Random(seed)
+    return flat.Esum.from_terms(
+        *(
+            shape_gen.rect(
+                min_x=rng.randint(0, 20),
+                min_y=rng.randint(0, 20),
+                width=rng.randint(1, 5),
+                height=rng.randint(1, 5),
+            ).eterms[0]
+            for _ in range(n)
+        )
+    )
+
+
+def _sparse_rects(seed: int, n: int) -> t.List[flat.Eterm]:
+    """Rects spread over an area that grows with `n`, so each one overlaps
+    only a few others.
+    """
+    rng = random.Random(seed)
+    span = round(30 * math.sqrt(n))
+    return [
+        shape_gen.rect(
+            min_x=rng.randint(0, span),
+            min_y=rng.randint(0, span),
+            width=rng.randint(1, 5),
+            height=rng.randint(1, 5),
+        ).eterms[0]
+        for _ in range(n)
+    ]
+
+
+def _diagonal_rects(seed: int, n: int) -> t.List[flat.Eterm]:
+    """Rects along the diagonal. The lines of each rect only reach the rects
+    next to it, however long the diagonal gets.
+    """
+    rng = random.Random(seed)
+    return [
+        shape_gen.rect(
+            min_x=8 * i + rng.randint(0, 3),
+            min_y=8 * i + rng.randint(0, 3),
+            width=rng.randint(1, 5),
+            height=rng.randint(1, 5),
+        ).eterms[0]
+        for i in range(n)
+    ]
+
+
+# Factories, so every call gives fresh objects. Names are part of the stored
+# results, don't change them.
+SHAPES: t.Dict[str, t.Callable[[], flat.Esum]] = {
+    "triangle": common_shapes.triangle,
+    "letter_c": common_shapes.letter_c,
+    "crude_c": common_shapes.crude_c,
+    "hourglass": common_shapes.hourglass,
+    "big_l": common_shapes.big_l,
+    "rect_union_chain_5": lambda: shape_gen.rect_union_chain(n=5),
+    "rect_union_chain_40": lambda: shape_gen.rect_union_chain(n=40),
+    "rect_intersection_chain_5": lambda: shape_gen.rect_intersection_chain(n=5),
+    "play_button_chain_4": lambda: shape_gen.play_button_chain(
+        min_x=4.0, min_y=3.0, n=4, stride=0.2
+    ),
+    "random_rects_30": lambda: _random_rects(seed=0, n=30),
+}
+
+# `Esum.conjugate` is a cartesian product of the eterms, so it's only timed on
+# shapes where that stays small.
+_MAX_CONJUGATE_TERMS = 5000
+
+_N_POINTS = 10_000
+
+
+def _fresh(shape: str) -> flat.Esum:
+    return SHAPES[shape]()
+
+
+def _hses(esum: flat.Esum) -> t.List[flat.Hs]:
+    return [hs for eterm in esum.eterms for hs in eterm.hses]
+
+
+def _points(esum: flat.Esum) -> np.ndarray:
+    hs_ends = flat._hses_endpoints(_hses(esum)).reshape(-1, 2)
+    low, high = hs_ends.min(axis=0) - 1, hs_ends.max(axis=0) + 1
+    return np.random.default_rng(0).uniform(low, high, size=(_N_POINTS, 2))
+
+
+def _setup_segments(shape: str) -> tuple:
+    return (flat.find_vertices(_fresh(shape)),)
+
+
+def _setup_filter(shape: str) -> tuple:
+    esum = _fresh(shape)
+    return esum, flat.find_segments(flat.find_vertices(esum))
+
+
+def _n_conjugate_terms(esum: flat.Esum) -> int:
+    n = 1
+    for eterm in esum.eterms:
+        n *= len(eterm.hses)
+    return n
+
+
+def _shape_cases(shape: str) -> t.List[Case]:
+    def _only_esum() -> tuple:
+        return (_fresh(shape),)
+
+    cases = [
+        Case("find_all_xs", shape, lambda: (_hses(_fresh(shape)),), flat.find_all_xs),
+        Case("find_vertices", shape, _only_esum, flat.find_vertices),
+        Case(
+            "find_segments", shape, lambda: _setup_segments(shape), flat.find_segments
+        ),
+        Case(
+            "filter_segments", shape, lambda: _setup_filter(shape), flat.filter_segments
+        ),
+        Case("detect_boundary", shape, _only_esum, flat.detect_boundary),
+        Case(
+            "intersection",
+            shape,
+            lambda: (_fresh(shape), common_shapes.triangle()),
+            lambda esum, other: esum.intersection(other),
+        ),
+        Case(
+            "contains",
+            shape,
+            lambda: (_fresh(shape), _points(_fresh(shape))),
+            lambda esum, points: esum.contains_many(points),
+        ),
+    ]
+    if _n_conjugate_terms(_fresh(shape)) <= _MAX_CONJUGATE_TERMS:
+        cases.append(Case("conjugate", shape, _only_esum, lambda esum: esum.conjugate))
+    return cases
+
+
+# Number of sparse rects in the shape, and in the pools of eterms that get added.
+_N_EDITED_RECTS = 1000
+_N_ADDED_RECTS = 16
+
+# Eterms of the edited shapes, and the pools of eterms that get added. The
+# added diagonal rects are at the start of the diagonal, so they have the same
+# neighbours in both sizes. Their edits should take the same time.
+_EDITED_SHAPES: t.Dict[
+    str, t.Callable[[], t.Tuple[t.List[flat.Eterm], t.List[flat.Eterm]]]
+] = {
+    f"sparse_rects_{_N_EDITED_RECTS}": lambda: (
+        _sparse_rects(seed=0, n=_N_EDITED_RECTS),
+        _sparse_rects(seed=1, n=_N_ADDED_RECTS),
+    ),
+    "diagonal_rects_250": lambda: (
+        _diagonal_rects(seed=0, n=250),
+        _diagonal_rects(seed=1, n=_N_ADDED_RECTS),
+    ),
+    "diagonal_rects_1000": lambda: (
+        _diagonal_rects(seed=0, n=1000),
+        _diagonal_rects(seed=1, n=_N_ADDED_RECTS),
+    ),
+}
+
+
+@functools.lru_cache(maxsize=None)
+def _edit_inputs(
+    shape: str,
+) -> t.Tuple[incremental.IncrementalBoundary, t.Iterator[flat.Eterm]]:
+    eterms, pool = _EDITED_SHAPES[shape]()
+    boundary = incremental.IncrementalBoundary(flat.Esum.from_terms(*eterms))
+    # Adding an eterm that's already there would do nothing, and removing it
+    # would then change the shared boundary.
+    shared = set(eterms)
+    added = [e for e in pool if e not in shared]
+    return boundary, itertools.cycle(added)
+
+
+def _setup_edit(shape: str) -> tuple:
+    boundary, added = _edit_inputs(shape)
+    return boundary, next(added)
+
+
+def _add_and_remove(boundary: incremental.IncrementalBoundary, eterm: flat.Eterm):
+    boundary.add_eterm(eterm)
+    boundary.remove_eterm(eterm)
+
+
+def all_cases() -> t.List[Case]:
+    return [case for shape in SHAPES for case in _shape_cases(shape)] + [
+        Case(
+            "incremental_edit",
+            shape,
+            functools.partial(_setup_edit, shape),
+            _add_and_remove,
+        )
+        for shape in _EDITED_SHAPES
+    ]
@@ -0,0 +1,170 @@
+"""
+Benchmark reports and their comparison against a baseline.
+
+A report is a JSON document:
+    {
+        "version": 1,
+        "created": "2024-01-01T00:00:00+00:00",
+        "environment": {"python": .., "platform": .., "numpy": .., ..},
+        "settings": {"warmup": .., "repeats": ..},
+        "results": {"<phase>/<shape>": {"median_ns": .., "q1_ns": .., ..}},
+    }
+"""
+
+import dataclasses
+import datetime
+import json
+import os
+import platform
+import typing as t
+from pathlib import Path
+
+import numpy as np
+
+from .cases import Case
+from .timing import Stats, measure
+
+
+FORMAT_VERSION = 1
+
+Report = t.Dict[str, t.Any]
+
+
+def environment() -> t.Dict[str, t.Any]:
+    return {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpu_count": os.cpu_count(),
+        "numpy": np.__version__,
+    }
+
+
+def run_suite(
+    cases: t.Sequence[Case],
+    warmup: int = 1,
+    repeats: int = 7,
+    progress: t.Optional[t.Callable[[Case, Stats], None]] = None,
+) -> Report:
+    """Measures every case.
+
+    Args:
+        progress: called after each case.
+    """
+    results = {}
+    for case in cases:
+        stats = measure(case, warmup=warmup, repeats=repeats)
+        results[case.name] = stats.to_json()
+        if progress is not None:
+            progress(case, stats)
+
+    return {
+        "version": FORMAT_VERSION,
+        "created": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "environment": environment(),
+        "settings": {"warmup": warmup, "repeats": repeats},
+        "results": results,
+    }
+
+
+def save(report: Report, path: t.Union[str, Path]):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(report, indent=2, sort_keys=True) + "\n")
+
+
+def load(path: t.Union[str, Path]) -> Report:
+    report = json.loads(Path(path).read_text())
+    if report.get("version") != FORMAT_VERSION:
+        raise ValueError(f"Unsupported report version: {report.get('version')}")
+    return report
+
+
+@dataclasses.dataclass(frozen=True)
+class Comparison:
+    name: str
+    baseline: t.Optional[Stats]
+    current: t.Optional[Stats]
+    status: str
+    """One of:
+    - "regression": slower by more than the threshold, IQRs don't overlap
+    - "improvement": faster by more than the threshold, IQRs don't overlap
+    - "same": anything in between
+    - "new": not in the baseline
+    - "missing": only in the baseline
+    """
+
+    @property
+    def ratio(self) -> t.Optional[float]:
+        """Current median over the baseline median."""
+        if self.baseline is None or self.current is None:
+            return None
+        return self.current.median_ns / max(self.baseline.median_ns, 1)
+
+
+def _status(baseline: Stats, current: Stats, threshold: float) -> str:
+    ratio = current.median_ns / max(baseline.median_ns, 1)
+    if ratio > 1 + threshold and current.q1_ns > baseline.q3_ns:
+        return "regression"
+    if ratio < 1 / (1 + threshold) and current.q3_ns < baseline.q1_ns:
+        return "improvement"
+    return "same"
+
+
+def compare(
+    baseline: Report, current: Report, threshold: float = 0.1
+) -> t.List[Comparison]:
+    """Compares the cases of two reports.
+
+    A change only counts when the medians differ by more than `threshold`
+    (relative) and the interquartile ranges don't overlap, so noisy cases
+    don't get flagged.
+    """
+    baseline_results = baseline["results"]
+    current_results = current["results"]
+    comparisons = []
+    for name in sorted(baseline_results.keys() | current_results.keys()):
+        baseline_stats = current_stats = None
+        if name in baseline_results:
+            baseline_stats = Stats.from_json(baseline_results[name])
+        if name in current_results:
+            current_stats = Stats.from_json(current_results[name])
+
+        if baseline_stats is None:
+            status = "new"
+        elif current_stats is None:
+            status = "missing"
+        else:
+            status = _status(baseline_stats, current_stats, threshold)
+        comparisons.append(Comparison(name, baseline_stats, current_stats, status))
+    return comparisons
+
+
+def _format_ns(ns: t.Optional[float]) -> str:
+    if ns is None:
+        return "-"
+    for unit, scale in [("s", 1e9), ("ms", 1e6), ("us", 1e3)]:
+        if ns >= scale:
+            return f"{ns / scale:.3g}{unit}"
+    return f"{ns:.3g}ns"
+
+
+def format_stats(name: str, stats: Stats) -> str:
+    return (
+        f"{name:<45} median {_format_ns(stats.median_ns):>9}"
+        f"  IQR {_format_ns(stats.iqr_ns):>9}"
+    )
+
+
+def format_comparisons(comparisons: t.Sequence[Comparison]) -> str:
+    lines = []
+    for comparison in comparisons:
+        baseline = comparison.baseline.median_ns if comparison.baseline else None
+        current = comparison.current.median_ns if comparison.current else None
+        ratio = "" if comparison.ratio is None else f"x{comparison.ratio:.2f}"
+        lines.append(
+            f"{comparison.name:<45} {_format_ns(baseline):>9} -> "
+            f"{_format_ns(current):>9} {ratio:>7}  {comparison.status}"
+        )
+    return "\n".join(lines)
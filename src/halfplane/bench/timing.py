@@ -0,0 +1,124 @@
+"""
+Repeated timing of a single case with `time.perf_counter_ns()`.
+
+Like `timeit`, the garbage collector is off while timing. Warmup repeats run
+the same code path first, so imports, numpy's first-call overheads and CPU
+frequency ramp-up don't land in the results. Fast cases are called several
+times per sample, so a sample is long enough to be above the timer's noise.
+"""
+
+import dataclasses
+import gc
+import math
+import statistics
+import time
+import typing as t
+
+from .cases import Case
+
+
+@dataclasses.dataclass(frozen=True)
+class Stats:
+    """Timings of a single call of one case, in nanoseconds."""
+
+    median_ns: float
+    q1_ns: float
+    q3_ns: float
+    min_ns: float
+    max_ns: float
+    repeats: int
+    calls_per_sample: int = 1
+
+    @property
+    def iqr_ns(self) -> float:
+        return self.q3_ns - self.q1_ns
+
+    @classmethod
+    def from_samples(
+        cls, samples_ns: t.Sequence[float], calls_per_sample: int = 1
+    ) -> "Stats":
+        """
+        Args:
+            samples_ns: time per call of each sample.
+        """
+        if len(samples_ns) == 0:
+            raise ValueError("Need at least one sample")
+        if len(samples_ns) == 1:
+            q1 = median = q3 = float(samples_ns[0])
+        else:
+            q1, median, q3 = statistics.quantiles(samples_ns, n=4, method="inclusive")
+        return cls(
+            median_ns=median,
+            q1_ns=q1,
+            q3_ns=q3,
+            min_ns=min(samples_ns),
+            max_ns=max(samples_ns),
+            repeats=len(samples_ns),
+            calls_per_sample=calls_per_sample,
+        )
+
+    def to_json(self) -> t.Dict[str, float]:
+        return {**dataclasses.asdict(self), "iqr_ns": self.iqr_ns}
+
+    @classmethod
+    def from_json(cls, obj: t.Mapping[str, float]) -> "Stats":
+        return cls(
+            **{
+                field.name: obj[field.name]
+                for field in dataclasses.fields(cls)
+                if field.name in obj
+            }
+        )
+
+
+def _time_calls(
+    case: Case, n_calls: int, timer: t.Callable[[], int]
+) -> t.Tuple[int, int]:
+    """Start and stop time of `n_calls` calls, each with its own inputs."""
+    all_args = [case.setup() for _ in range(n_calls)]
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        start = timer()
+        for args in all_args:
+            case.run(*args)
+        stop = timer()
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return start, stop
+
+
+def measure(
+    case: Case,
+    warmup: int = 1,
+    repeats: int = 7,
+    min_sample_ns: int = 1_000_000,
+    max_calls_per_sample: int = 1000,
+    timer: t.Callable[[], int] = time.perf_counter_ns,
+) -> Stats:
+    """Times `case.run`. Every call gets fresh inputs from `case.setup`, built
+    outside of the timed region.
+
+    Args:
+        warmup: number of untimed samples. At least one sample is always run
+            to find the number of calls per sample.
+        repeats: number of timed samples.
+        min_sample_ns: cases faster than this are called several times per
+            sample, up to `max_calls_per_sample`.
+    """
+    if repeats < 1:
+        raise ValueError(f"repeats has to be positive, got {repeats}")
+
+    start, stop = _time_calls(case, 1, timer)
+    calls = min(
+        max(1, math.ceil(min_sample_ns / max(stop - start, 1))), max_calls_per_sample
+    )
+    for _ in range(warmup - 1):
+        _time_calls(case, calls, timer)
+
+    samples = []
+    for _ in range(repeats):
+        start, stop = _time_calls(case, calls, timer)
+        samples.append((stop - start) / calls)
+    return Stats.from_samples(samples, calls_per_sample=calls)
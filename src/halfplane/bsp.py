@@ -0,0 +1,377 @@
+"""
+Binary space partition of an `Esum`. Compiling a shape takes a while, but
+afterwards a containment query only needs to test the halfspaces along a
+single root-to-leaf path. That pays off for points queried one at a time.
+Batches of points are faster with `Esum.contains_many()`, which is what
+`CompiledEsum.contains_many()` runs.
+
+Interior nodes test one of the shape's halfspaces. Leaves are either fully
+inside or fully outside the shape. The nodes use the same numerical check as
+`flat._esum_contains_pt_strict()` (or `flat._esum_contains_pt_with_eps()`), so
+the compiled shape gives exactly the same answers.
+
+The predicate mode (see `core.Settings.robust`) is picked when compiling.
+Queries use that mode, whatever the current one is. In the robust mode the
+nodes test exact signs, like `flat._z_above()` does.
+"""
+
+import collections
+import dataclasses
+import typing as t
+
+import numpy as np
+
+from . import core, flat, predicates
+
+
+# Special values of `CompiledEsum.node_hs`.
+LEAF_OUT = -1
+LEAF_IN = -2
+LEAF_RESIDUAL = -3
+
+
+@dataclasses.dataclass(frozen=True, eq=False)
+class CompiledEsum:
+    esum: flat.Esum
+    "Source shape. Used for points outside of `root_box`."
+
+    threshold: float
+    "Z factor threshold of the containment check."
+
+    endpoints: np.ndarray
+    "[n_hses x 2 x 2] array. Distinct halfspaces of `esum`."
+
+    node_hs: np.ndarray
+    "[n_nodes] int64 array. Index of the tested halfspace, or one of `LEAF_*`."
+
+    node_children: np.ndarray
+    """[n_nodes x 2] int64 array. Children of interior nodes, for points that
+    failed and passed the halfspace check. For residual leaves, the first
+    column points into `residuals`.
+    """
+
+    residuals: t.Tuple[t.Tuple[t.Tuple[int, ...], ...], ...]
+    """Leaves that hit the depth limit before being decided. Each one keeps
+    a few eterms, as tuples of halfspace indices, that are checked directly.
+    """
+
+    root_box: flat.Box
+    "Area covered by the tree."
+
+    robust: bool = False
+    "Predicate mode of the queries. See `core.Settings.robust`."
+
+    _scalar_nodes: t.List[t.Tuple] = dataclasses.field(
+        init=False, repr=False, default=None
+    )
+
+    def __post_init__(self):
+        # Plain Python values are much faster than NumPy scalars for
+        # traversing the tree one point at a time.
+        ends = self.endpoints.tolist()
+        nodes = [
+            (hs_i, *ends[hs_i][0], *ends[hs_i][1], out_i, in_i)
+            if hs_i >= 0
+            else (hs_i, out_i)
+            for hs_i, (out_i, in_i) in zip(
+                self.node_hs.tolist(), self.node_children.tolist()
+            )
+        ]
+        object.__setattr__(self, "_scalar_nodes", nodes)
+
+    @property
+    def n_nodes(self) -> int:
+        return len(self.node_hs)
+
+    @property
+    def depth(self) -> int:
+        depths = [0] * self.n_nodes
+        for node_i, hs_i in enumerate(self.node_hs.tolist()):
+            if hs_i >= 0:
+                for child_i in self.node_children[node_i].tolist():
+                    depths[child_i] = depths[node_i] + 1
+        return max(depths, default=0)
+
+    def _in_root_box(self, x: float, y: float) -> bool:
+        box = self.root_box
+        return box.min_x <= x <= box.max_x and box.min_y <= y <= box.max_y
+
+    def contains(self, point: flat.Pt) -> bool:
+        x = point.x
+        y = point.y
+        if not self._in_root_box(x, y):
+            return bool(self._fallback(np.array([[x, y]], dtype=np.float64))[0])
+
+        node = self._scalar_nodes[0]
+        while node[0] >= 0:
+            _, x1, y1, x2, y2, out_i, in_i = node
+            # Same arithmetic as `flat._z_factor()`.
+            left = (x2 - x1) * (y - y1)
+            right = (y2 - y1) * (x - x1)
+            if self.robust:
+                sign = _exact_sign(left, right, x1, y1, x2, y2, x, y)
+                passed = sign > 0 if self.threshold > 0 else sign >= 0
+            else:
+                passed = left - right > self.threshold
+            node = self._scalar_nodes[in_i if passed else out_i]
+
+        if node[0] == LEAF_IN:
+            return True
+        elif node[0] == LEAF_OUT:
+            return False
+        else:
+            pt = np.array([[x, y]], dtype=np.float64)
+            return bool(self._residual_contains(node[1], pt)[0])
+
+    def contains_many(self, points: np.ndarray) -> np.ndarray:
+        """Batched `contains()`. Same as `Esum.contains_many()` of the source
+        shape, in the predicate mode of the tree.
+
+        The tree isn't walked. Moving all the points down one level at a time
+        is slower than the esum's own check, which only tests the eterms near
+        each point.
+
+        Args:
+            points: [n_points x 2] array.
+        Returns:
+            [n_points] bool array.
+        """
+        return self._fallback(np.asarray(points, dtype=np.float64).reshape(-1, 2))
+
+    def _fallback(self, points: np.ndarray) -> np.ndarray:
+        with core.robust_predicates(self.robust):
+            return flat._esum_contains_pts(self.esum, points, threshold=self.threshold)
+
+    def _residual_contains(self, residual_i: int, points: np.ndarray) -> np.ndarray:
+        result = np.zeros(len(points), dtype=bool)
+        with core.robust_predicates(self.robust):
+            for term in self.residuals[residual_i]:
+                ends = self.endpoints[list(term)]
+                result |= flat._z_above(ends, points, self.threshold).all(axis=0)
+        return result
+
+
+def compile_esum(
+    esum: flat.Esum,
+    with_eps: bool = False,
+    eps: float = 10e-7,
+    max_depth: int = 64,
+    robust: t.Optional[bool] = None,
+) -> CompiledEsum:
+    """Builds a BSP tree for `esum`.
+
+    Args:
+        with_eps: if True, the tree answers like `_esum_contains_pt_with_eps()`,
+            otherwise like `_esum_contains_pt_strict()`.
+        max_depth: nodes deeper than this become residual leaves, which check
+            their remaining eterms directly.
+        robust: predicate mode of the queries. Defaults to the current one.
+    """
+    if robust is None:
+        robust = core.settings.robust
+
+    hs_indices: t.Dict[flat.Hs, int] = {}
+    terms = [
+        tuple(hs_indices.setdefault(hs, len(hs_indices)) for hs in eterm.hses)
+        for eterm in esum.eterms
+    ]
+    endpoints = flat._hses_endpoints(hs_indices)
+
+    # Same kind of bound as in `_hses_feasible()`. Points further away are
+    # checked against the `Esum` directly.
+    scale = 1 + (np.abs(endpoints).max() if len(endpoints) > 0 else 0)
+    bound = 1e6 * scale
+    root_box = flat.Box(min_x=-bound, min_y=-bound, max_x=bound, max_y=bound)
+    root_cell = np.array(
+        [[-bound, -bound], [bound, -bound], [bound, bound], [-bound, bound]]
+    )
+
+    threshold = -eps if with_eps else eps
+    builder = _TreeBuilder(
+        endpoints=endpoints,
+        # Exact signs are compared against zero. The builder's tolerances
+        # cover both the strict and the loose check.
+        threshold=0.0 if robust else threshold,
+        max_depth=max_depth,
+    )
+    builder.add_node(root_cell, terms, depth=0)
+
+    return CompiledEsum(
+        esum=esum,
+        threshold=threshold,
+        endpoints=endpoints,
+        node_hs=np.array(builder.node_hs, dtype=np.int64),
+        node_children=np.array(builder.node_children, dtype=np.int64).reshape(-1, 2),
+        residuals=tuple(builder.residuals),
+        root_box=root_box,
+        robust=robust,
+    )
+
+
+@dataclasses.dataclass
+class _TreeBuilder:
+    endpoints: np.ndarray
+    threshold: float
+    max_depth: int
+
+    node_hs: t.List[int] = dataclasses.field(default_factory=list)
+    node_children: t.List[t.Tuple[int, int]] = dataclasses.field(
+        default_factory=list
+    )
+    residuals: t.List[t.Tuple[t.Tuple[int, ...], ...]] = dataclasses.field(
+        default_factory=list
+    )
+
+    def _add_leaf(self, leaf_kind: int, payload: int = 0) -> int:
+        self.node_hs.append(leaf_kind)
+        self.node_children.append((payload, payload))
+        return len(self.node_hs) - 1
+
+    def _tolerance(self, hs_indices: t.Sequence[int], cell: np.ndarray) -> np.ndarray:
+        """Slack for z factors calculated at the cell's vertices. Covers the
+        rounding errors of the vertices and of the z factors themselves.
+        """
+        ends = self.endpoints[list(hs_indices)]
+        lengths = np.hypot(*(ends[:, 1, :] - ends[:, 0, :]).T)
+        return 1e-9 * lengths * (1 + np.abs(cell).max() + np.abs(ends).max(axis=(1, 2)))
+
+    def _narrow_terms(
+        self, cell: np.ndarray, terms: t.Sequence[t.Tuple[int, ...]]
+    ) -> t.Optional[t.List[t.Tuple[int, ...]]]:
+        """Drops halfspaces that contain the whole cell and eterms that can't
+        contain any point of the cell. Halfspaces close to the cell are kept
+        either way.
+
+        Returns:
+            None if there's an eterm that contains the whole cell.
+        """
+        narrowed = []
+        for term in terms:
+            if len(term) == 0:
+                return None
+
+            z = flat._z_factors(self.endpoints[list(term)], cell)
+            tol = self._tolerance(term, cell)
+            if (z.max(axis=1) <= self.threshold - tol).any():
+                continue
+
+            implied = z.min(axis=1) > self.threshold + tol
+            term = tuple(hs_i for hs_i, skip in zip(term, implied) if not skip)
+            if len(term) == 0:
+                return None
+
+            narrowed.append(term)
+
+        return narrowed
+
+    def _pick_split(self, terms: t.Sequence[t.Tuple[int, ...]]) -> int:
+        """Picks the halfspace that splits the eterms most evenly, to keep the
+        tree shallow. Each eterm is represented by the mean of its halfspace
+        endpoints. Ties go to halfspaces shared by more eterms, then to the
+        first one.
+        """
+        counts = collections.Counter(hs_i for term in terms for hs_i in term)
+        if len(terms) == 1:
+            return next(iter(counts))
+
+        candidates = list(counts)
+        candidate_rows = {hs_i: row_i for row_i, hs_i in enumerate(candidates)}
+        centers = np.array(
+            [self.endpoints[list(term)].reshape(-1, 2).mean(axis=0) for term in terms]
+        )
+        z = flat._z_factors(self.endpoints[candidates], centers)
+        on_in_side = z > self.threshold
+        for term_i, term in enumerate(terms):
+            # Eterms using the split halfspace always go to the "in" side.
+            for hs_i in term:
+                on_in_side[candidate_rows[hs_i], term_i] = True
+
+        n_in = on_in_side.sum(axis=1)
+        imbalance = np.maximum(n_in, len(terms) - n_in)
+        shared = np.array([counts[hs_i] for hs_i in candidates])
+        best = np.lexsort((-shared, imbalance))[0]
+        return candidates[best]
+
+    def add_node(
+        self, cell: np.ndarray, terms: t.Sequence[t.Tuple[int, ...]], depth: int
+    ) -> int:
+        """
+        Args:
+            cell: [n_vertices x 2] array. Convex polygon that contains every
+                point that can reach this node. Can be bigger than that.
+            terms: eterms that might contain points in the cell. Each one is
+                a tuple of its halfspaces that weren't checked yet.
+        """
+        terms = self._narrow_terms(cell, terms)
+        if terms is None:
+            return self._add_leaf(LEAF_IN)
+        elif len(terms) == 0:
+            return self._add_leaf(LEAF_OUT)
+        elif depth >= self.max_depth:
+            self.residuals.append(tuple(terms))
+            return self._add_leaf(LEAF_RESIDUAL, len(self.residuals) - 1)
+
+        split_hs = self._pick_split(terms)
+
+        node_i = len(self.node_hs)
+        self.node_hs.append(split_hs)
+        self.node_children.append((-1, -1))
+
+        tol = self._tolerance([split_hs], cell)[0]
+        ends = self.endpoints[split_hs]
+        in_cell = _clip_cell(cell, ends, self.threshold - tol)
+        out_cell = _clip_cell(cell, ends[::-1], -self.threshold - tol)
+
+        out_i = self.add_node(
+            out_cell, [term for term in terms if split_hs not in term], depth + 1
+        )
+        in_i = self.add_node(
+            in_cell,
+            [tuple(hs_i for hs_i in term if hs_i != split_hs) for term in terms],
+            depth + 1,
+        )
+        self.node_children[node_i] = (out_i, in_i)
+
+        return node_i
+
+
+def _exact_sign(
+    left: float,
+    right: float,
+    x1: float,
+    y1: float,
+    x2: float,
+    y2: float,
+    x: float,
+    y: float,
+) -> int:
+    """Sign of `left - right`, the z factor of the point. Recalculated with
+    `predicates.orient()` when it's too close to zero.
+    """
+    z = left - right
+    if abs(z) > predicates.error_bound(3, abs(left) + abs(right)):
+        return 1 if z > 0 else -1
+    return predicates.orient(x1, y1, x2, y2, x, y)
+
+
+def _clip_cell(cell: np.ndarray, ends: np.ndarray, offset: float) -> np.ndarray:
+    """Part of a convex polygon where the z factor of the halfspace with
+    `ends` is above `offset`. Keeps the whole polygon if the clipped one
+    degenerates, any polygon that contains the true cell will do.
+    """
+    z = flat._z_factors(ends[None], cell)[0] - offset
+    if (z >= 0).all():
+        return cell
+
+    clipped = []
+    for (p, z_p), (q, z_q) in zip(
+        zip(cell, z), zip(np.roll(cell, -1, axis=0), np.roll(z, -1))
+    ):
+        if z_p >= 0:
+            clipped.append(p)
+        if (z_p >= 0) != (z_q >= 0):
+            clipped.append(p + (q - p) * (z_p / (z_p - z_q)))
+
+    if len(clipped) < 3:
+        return cell
+    return np.array(clipped)
@@ -0,0 +1,449 @@
+"""
+Opt-in memoization of the expensive `Esum` computations. Esums are frozen and
+compare by structure, so they can be used directly as cache keys. Two esums
+built separately from the same eterms share the cached results.
+
+Usage:
+    memo = EsumMemo(maxsize=64)
+    segments = flat.detect_boundary(esum, cache=memo)
+
+`DiskCache` keeps boundaries between processes. Entries are named by
+`canonical_hash()` of the esum, so they don't depend on the order of eterms
+or on the Python hash seed.
+
+Results computed with robust predicates (see `core.Settings.robust`) are kept
+apart from the float ones, both in memory and on disk. Boundaries are stored
+as float64, so esums with `Fraction` coordinates skip the disk.
+"""
+
+import collections
+import dataclasses
+import hashlib
+import os
+import tempfile
+import threading
+import typing as t
+import zipfile
+from fractions import Fraction
+from pathlib import Path
+
+import numpy as np
+
+from . import core, flat, table
+
+
+K = t.TypeVar("K")
+
+# An esum and the predicate mode its results were computed with.
+_ModeKey = t.Tuple[flat.Esum, bool]
+V = t.TypeVar("V")
+
+_MISSING = object()
+
+
+@dataclasses.dataclass(frozen=True)
+class CacheInfo:
+    hits: int
+    misses: int
+    size: int
+    maxsize: int
+
+
+class LRUCache(t.Generic[K, V]):
+    """
+    Mapping with a bounded number of entries. When full, the least recently
+    used entry is evicted. All operations are guarded by a lock, so a single
+    instance can be shared between threads.
+
+    Values are computed outside of the lock. Two threads that miss on the same
+    key at the same time both compute the value, the later one wins.
+    """
+
+    def __init__(self, maxsize: int = 128):
+        if maxsize < 0:
+            raise ValueError(f"maxsize has to be non-negative, got {maxsize}")
+
+        self._maxsize = maxsize
+        self._entries: t.OrderedDict[K, V] = collections.OrderedDict()
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, key: K, default=None):
+        with self._lock:
+            value = self._entries.get(key, _MISSING)
+            if value is _MISSING:
+                self._misses += 1
+                return default
+
+            self._hits += 1
+            self._entries.move_to_end(key)
+            return value
+
+    def put(self, key: K, value: V):
+        with self._lock:
+            if self._maxsize == 0:
+                return
+
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._maxsize:
+                self._entries.popitem(last=False)
+
+    def get_or_compute(self, key: K, compute: t.Callable[[K], V]) -> V:
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = compute(key)
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        """Removes all entries and resets the counters."""
+        with self._lock:
+            self._entries.clear()
+            self._hits = 0
+            self._misses = 0
+
+    def info(self) -> CacheInfo:
+        with self._lock:
+            return CacheInfo(
+                hits=self._hits,
+                misses=self._misses,
+                size=len(self._entries),
+                maxsize=self._maxsize,
+            )
+
+    def __contains__(self, key: K) -> bool:
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+class EsumMemo:
+    """
+    Caches boundaries, vertices and conjugates of esums. Every kind of result
+    has its own LRU, bounded by `maxsize` entries.
+    """
+
+    def __init__(self, maxsize: int = 128):
+        self.boundaries: LRUCache[_ModeKey, t.Tuple[flat.XSegment, ...]] = (
+            LRUCache(maxsize)
+        )
+        self.vertices: LRUCache[_ModeKey, t.Tuple[flat.X, ...]] = LRUCache(maxsize)
+        self.conjugates: LRUCache[flat.Esum, flat.Esum] = LRUCache(maxsize)
+
+    def detect_boundary(
+        self,
+        esum: t.Union[flat.Esum, flat.NotEsum],
+        vertices_finder: t.Callable[[flat.Esum], t.Sequence[flat.X]] = (
+            flat.find_vertices
+        ),
+    ) -> t.List[flat.XSegment]:
+        """Same as `flat.detect_boundary()`. The vertices are cached too.
+
+        The finder isn't a part of the key, all finders give the same vertices.
+        The predicate mode is.
+        """
+        if isinstance(esum, flat.NotEsum):
+            esum = esum.expand()
+
+        def _compute(key: _ModeKey):
+            def _find_vertices(esum: flat.Esum):
+                return self.find_vertices(esum, vertices_finder)
+
+            return tuple(flat.detect_boundary(key[0], vertices_finder=_find_vertices))
+
+        # Copy, so callers can't modify the cached result.
+        return list(self.boundaries.get_or_compute(_mode_key(esum), _compute))
+
+    def find_vertices(
+        self,
+        esum: flat.Esum,
+        vertices_finder: t.Callable[[flat.Esum], t.Sequence[flat.X]] = (
+            flat.find_vertices
+        ),
+    ) -> t.List[flat.X]:
+        def _compute(key: _ModeKey):
+            return tuple(vertices_finder(key[0]))
+
+        return list(self.vertices.get_or_compute(_mode_key(esum), _compute))
+
+    def conjugate(self, esum: flat.Esum) -> flat.Esum:
+        return self.conjugates.get_or_compute(esum, lambda esum: esum.conjugate)
+
+    def clear(self):
+        self.boundaries.clear()
+        self.vertices.clear()
+        self.conjugates.clear()
+
+    def info(self) -> t.Dict[str, CacheInfo]:
+        return {
+            "boundaries": self.boundaries.info(),
+            "vertices": self.vertices.info(),
+            "conjugates": self.conjugates.info(),
+        }
+
+
+def _mode_key(esum: flat.Esum) -> _ModeKey:
+    return (esum, core.settings.robust)
+
+
+# Bump when the on-disk format or the detection results change.
+_DISK_FORMAT_VERSION = 2
+
+CACHE_DIR_ENV = "HALFPLANE_CACHE_DIR"
+
+
+def _coord_token(coord) -> str:
+    # Hex keeps all bits of the float. `1`, `1.0` and `Fraction(1)` give the
+    # same token, the same way they compare equal in `Pt`. Anything a float
+    # can't hold is written exactly.
+    try:
+        as_float = float(coord)
+    except OverflowError:
+        as_float = None
+    if as_float == coord:
+        return as_float.hex()
+    fraction = Fraction(coord)
+    return f"{fraction.numerator}/{fraction.denominator}"
+
+
+def _hs_token(hs: flat.Hs) -> str:
+    coords = (hs.p1.x, hs.p1.y, hs.p2.x, hs.p2.y)
+    return type(hs).__name__ + ":" + ",".join(map(_coord_token, coords))
+
+
+def _is_float_coord(coord) -> bool:
+    if isinstance(coord, (float, np.floating)):
+        return True
+    return isinstance(coord, (int, np.integer)) and float(coord) == coord
+
+
+def _has_float_coords(esum: flat.Esum) -> bool:
+    """Whether float64 arrays hold the esum without changing its results.
+    `Fraction` coordinates would come back as floats, and with them the
+    exact cross points of the robust mode.
+    """
+    return all(
+        _is_float_coord(c)
+        for eterm in esum.eterms
+        for hs in eterm.hses
+        for c in (hs.p1.x, hs.p1.y, hs.p2.x, hs.p2.y)
+    )
+
+
+def canonical_hash(esum: flat.Esum, robust: t.Optional[bool] = None) -> str:
+    """sha256 of the esum's structure. Stable between processes and machines.
+    Doesn't depend on the order of eterms and halfspaces, nor on debug names.
+
+    Args:
+        robust: predicate mode of the results. Defaults to the current one.
+    """
+    if robust is None:
+        robust = core.settings.robust
+    eterm_tokens = sorted(
+        ";".join(sorted(_hs_token(hs) for hs in eterm.hses)) for eterm in esum.eterms
+    )
+    mode = "robust" if robust else "float"
+    text = f"v{_DISK_FORMAT_VERSION}|{mode}|" + "|".join(eterm_tokens)
+    return hashlib.sha256(text.encode("ascii")).hexdigest()
+
+
+def default_cache_dir() -> Path:
+    env_dir = os.environ.get(CACHE_DIR_ENV)
+    if env_dir:
+        return Path(env_dir)
+    return Path.home() / ".cache" / "halfplane"
+
+
+def cache_from_env() -> t.Optional["DiskCache"]:
+    """`DiskCache` in `$HALFPLANE_CACHE_DIR`, or None if the variable isn't set.
+    Meant for scripts that should only cache when asked to.
+    """
+    if not os.environ.get(CACHE_DIR_ENV):
+        return None
+    return DiskCache()
+
+
+# Pruning after a store goes down to this fraction of `max_bytes`, so the next
+# few stores don't have to prune again.
+_PRUNE_TARGET = 0.9
+
+
+@dataclasses.dataclass(frozen=True)
+class DiskCacheInfo:
+    hits: int
+    misses: int
+    n_entries: int
+    n_bytes: int
+    max_bytes: int
+
+
+class DiskCache:
+    """
+    Boundaries stored as `.npz` files, one per esum. When the directory grows
+    over `max_bytes`, the least recently used files are removed. Reading an
+    entry refreshes its mtime.
+
+    The directory is only scanned on the first store and when pruning. In
+    between, the size of the stored files is added up, so files written by
+    other processes are only noticed at the next scan.
+
+    Files are written to a temporary name and renamed, so several processes can
+    share one directory.
+
+    Coordinates are stored as float64. Esums with other coordinates, such as
+    `Fraction`s, are detected every time, so exact results stay exact.
+
+    Args:
+        path: cache directory. Defaults to `default_cache_dir()`.
+        max_bytes: size cap of the directory.
+        memo: optional in-process cache, checked before the disk.
+    """
+
+    def __init__(
+        self,
+        path: t.Optional[t.Union[str, Path]] = None,
+        max_bytes: int = 256 * 2**20,
+        memo: t.Optional[EsumMemo] = None,
+    ):
+        self.path = Path(path) if path is not None else default_cache_dir()
+        self.max_bytes = max_bytes
+        self.memo = memo
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        # Size of the directory, as of the last scan plus the files stored
+        # since. None until the first scan.
+        self._n_bytes: t.Optional[int] = None
+
+    def entry_path(self, esum: flat.Esum) -> Path:
+        return self.path / f"{canonical_hash(esum)}.npz"
+
+    def detect_boundary(
+        self,
+        esum: t.Union[flat.Esum, flat.NotEsum],
+        vertices_finder: t.Callable[[flat.Esum], t.Sequence[flat.X]] = (
+            flat.find_vertices
+        ),
+    ) -> t.List[flat.XSegment]:
+        """Same as `flat.detect_boundary()`."""
+        if isinstance(esum, flat.NotEsum):
+            esum = esum.expand()
+
+        if self.memo is None:
+            return self._load_or_detect(esum, vertices_finder)
+
+        def _compute(key: _ModeKey):
+            return tuple(self._load_or_detect(key[0], vertices_finder))
+
+        return list(self.memo.boundaries.get_or_compute(_mode_key(esum), _compute))
+
+    def _load_or_detect(self, esum: flat.Esum, vertices_finder):
+        if not _has_float_coords(esum):
+            return flat.detect_boundary(esum, vertices_finder=vertices_finder)
+
+        path = self.entry_path(esum)
+        segments = self._load(path)
+        with self._lock:
+            if segments is None:
+                self._misses += 1
+            else:
+                self._hits += 1
+        if segments is not None:
+            return segments
+
+        segments = flat.detect_boundary(esum, vertices_finder=vertices_finder)
+        size = self._store(path, segments)
+        with self._lock:
+            if self._n_bytes is not None:
+                self._n_bytes += size
+            needs_scan = self._n_bytes is None or self._n_bytes > self.max_bytes
+        if needs_scan:
+            self._prune(self.max_bytes, int(self.max_bytes * _PRUNE_TARGET))
+        return segments
+
+    def _load(self, path: Path) -> t.Optional[t.List[flat.XSegment]]:
+        try:
+            with np.load(path) as data:
+                segments = table.segments_from_arrays(
+                    data["endpoints"], data["closed"], data["segments"]
+                )
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, IndexError, zipfile.BadZipFile):
+            # Broken entry, e.g. a partial write from a killed process. It will
+            # be replaced.
+            path.unlink(missing_ok=True)
+            return None
+        return segments
+
+    def _store(self, path: Path, segments: t.Sequence[flat.XSegment]) -> int:
+        """Returns the size of the written file."""
+        self.path.mkdir(parents=True, exist_ok=True)
+        fd, tmp_name = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez_compressed(f, **table.segments_to_arrays(segments))
+                size = f.tell()
+            os.replace(tmp_name, path)
+        except BaseException:
+            Path(tmp_name).unlink(missing_ok=True)
+            raise
+        return size
+
+    def _entries(self) -> t.List[t.Tuple[float, int, Path]]:
+        entries = []
+        for path in self.path.glob("*.npz"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                # Removed by another process in the meantime.
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return entries
+
+    def prune(self):
+        """Removes least recently used entries until the size cap is met."""
+        self._prune(self.max_bytes, self.max_bytes)
+
+    def _prune(self, max_bytes: int, target_bytes: int):
+        """If the directory is larger than `max_bytes`, removes least recently
+        used entries until it's at most `target_bytes`.
+        """
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        if total > max_bytes:
+            for _, size, path in entries:
+                if total <= target_bytes:
+                    break
+                path.unlink(missing_ok=True)
+                total -= size
+        with self._lock:
+            self._n_bytes = total
+
+    def clear(self):
+        """Removes all entries and resets the counters."""
+        for _, _, path in self._entries():
+            path.unlink(missing_ok=True)
+        with self._lock:
+            self._hits = 0
+            self._misses = 0
+            self._n_bytes = None
+        if self.memo is not None:
+            self.memo.clear()
+
+    def info(self) -> DiskCacheInfo:
+        entries = self._entries()
+        with self._lock:
+            return DiskCacheInfo(
+                hits=self._hits,
+                misses=self._misses,
+                n_entries=len(entries),
+                n_bytes=sum(size for _, size, _ in entries),
+                max_bytes=self.max_bytes,
+            )
@@ -1,4 +1,53 @@
+import contextlib
+import contextvars
+import typing as t
 from dataclasses import dataclass
+from fractions import Fraction
 
 model = dataclass(frozen=True)
-Coord = float
+
+Coord = t.Union[float, int, Fraction]
+"""Point coordinate. `Fraction`s are kept exact by the robust predicates, other
+types are calculated with floats.
+"""
+
+
+_robust: contextvars.ContextVar[bool] = contextvars.ContextVar(
+    "halfplane_robust", default=False
+)
+
+
+class Settings:
+    """Library-wide switches. The values are context-local: every thread (and
+    asyncio task) starts with the defaults, and changing them doesn't affect
+    the others. Worker processes and threads don't inherit them either, code
+    that hands work over passes the values along explicitly.
+    """
+
+    @property
+    def robust(self) -> bool:
+        """Use `predicates` for containment checks and cross points. Signs are
+        exact, so the checks don't need an epsilon: the strict check is
+        `z > 0`, the loose one is `z >= 0`. Defaults to False.
+        """
+        return _robust.get()
+
+    @robust.setter
+    def robust(self, enabled: bool):
+        _robust.set(enabled)
+
+
+settings = Settings()
+
+
+@contextlib.contextmanager
+def robust_predicates(enabled: bool = True):
+    """Switches the predicate mode for the duration of the block, in the
+    current thread only. Cross points are cached in the `X` objects, so shapes
+    shouldn't be shared between modes.
+    """
+    token = _robust.set(enabled)
+    try:
+        yield
+    finally:
+        _robust.reset(token)
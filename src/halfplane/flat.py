@@ -7,6 +7,7 @@ from numbers import Number
 import more_itertools as mitt
 import numpy as np
 
+from . import core, predicates
 from .core import Coord
 from .generic_structs import FOSet
 
@@ -49,7 +50,7 @@ def lazy_prop(method):
         prop_name = method.__name__
         attr_name = f"_{prop_name}"
 
-        if getattr(self, attr_name) == EMPTY_PROP:
+        if getattr(self, attr_name) is EMPTY_PROP:
             val = method(self)
             object.__setattr__(self, attr_name, val)
 
@@ -91,6 +92,8 @@ class Hp(TodoMixin):
     debug_name: t.Optional[str] = debug_name_field
 
     def contains(self, point: Pt) -> bool:
+        if core.settings.robust:
+            return predicates.orient_hs(self, point) > 0
         return _z_factor(self, point) > 0
 
     @property
@@ -112,6 +115,8 @@ class Hpc(TodoMixin):
     debug_name: t.Optional[str] = debug_name_field
 
     def contains(self, point: Pt) -> bool:
+        if core.settings.robust:
+            return predicates.orient_hs(self, point) >= 0
         return _z_factor(self, point) >= 0
 
     @property
@@ -138,6 +143,54 @@ def _z_factor(half_space: Hs, point: Pt) -> float:
     return a1 * b2 - a2 * b1
 
 
+def _z_factors(endpoints: np.ndarray, points: np.ndarray) -> np.ndarray:
+    """Batched `_z_factor()`.
+
+    Args:
+        endpoints: [n_hses x 2 x 2] array of halfspace endpoints.
+        points: [n_points x 2] array of tested points.
+    Returns:
+        [n_hses x n_points] array of z factors.
+    """
+    a1 = endpoints[:, 1, 0] - endpoints[:, 0, 0]
+    a2 = endpoints[:, 1, 1] - endpoints[:, 0, 1]
+    b1 = points[None, :, 0] - endpoints[:, 0, 0, None]
+    b2 = points[None, :, 1] - endpoints[:, 0, 1, None]
+
+    return a1[:, None] * b2 - a2[:, None] * b1
+
+
+def _z_signs(endpoints: np.ndarray, points: np.ndarray) -> np.ndarray:
+    """Exact signs of `_z_factors()`, see `predicates.orient()`. Only the
+    entries too close to zero are recalculated exactly.
+    """
+    a1 = endpoints[:, 1, 0] - endpoints[:, 0, 0]
+    a2 = endpoints[:, 1, 1] - endpoints[:, 0, 1]
+    b1 = points[None, :, 0] - endpoints[:, 0, 0, None]
+    b2 = points[None, :, 1] - endpoints[:, 0, 1, None]
+    left = a1[:, None] * b2
+    right = a2[:, None] * b1
+    z = left - right
+
+    signs = np.sign(z).astype(np.int8)
+    ambiguous = np.abs(z) <= predicates.error_bound(3, np.abs(left) + np.abs(right))
+    for hs_i, pt_i in zip(*np.nonzero(ambiguous)):
+        (ax, ay), (bx, by) = endpoints[hs_i].tolist()
+        cx, cy = points[pt_i].tolist()
+        signs[hs_i, pt_i] = predicates.orient(ax, ay, bx, by, cx, cy)
+    return signs
+
+
+def _z_above(endpoints: np.ndarray, points: np.ndarray, threshold: float) -> np.ndarray:
+    """`_z_factors() > threshold`. In the robust mode, the threshold only
+    decides between the strict (`z > 0`) and the loose (`z >= 0`) check.
+    """
+    if core.settings.robust:
+        signs = _z_signs(endpoints, points)
+        return signs > 0 if threshold > 0 else signs >= 0
+    return _z_factors(endpoints, points) > threshold
+
+
 def _line_params(p1: Pt, p2: Pt) -> t.Optional[t.Tuple[Number, Number]]:
     dy = p2.y - p1.y
     dx = p2.x - p1.x
@@ -162,6 +215,10 @@ def _extrapolate_line(p1: Pt, p2: Pt, x: Number) -> t.Optional[Number]:
 
 
 def _intersection_point(hs1: Hs, hs2: Hs) -> t.Optional[Pt]:
+    if core.settings.robust:
+        coords = predicates.intersection(hs1, hs2)
+        return None if coords is None else Pt(*coords)
+
     # y = ax + b
     # a1 * x + b1 = a2 * x + b2
     # a1 * x - a2 * x + b1 = b2
@@ -274,6 +331,15 @@ class Box:
     max_y: Coord
 
 
+# Bounding box of an empty area. Doesn't collide with anything.
+EMPTY_BOX = Box(
+    min_x=math.inf,
+    min_y=math.inf,
+    max_x=-math.inf,
+    max_y=-math.inf,
+)
+
+
 def box_contains_pt(box: Box, pt: Pt, epsilon: float = 0.01):
     return (
         box.min_x - epsilon < pt.x < box.max_x + epsilon
@@ -289,10 +355,61 @@ class Eterm:
 
     hses: FOSet[Hs]
 
+    _endpoints: np.ndarray = dataclasses.field(
+        init=False,
+        repr=False,
+        hash=False,
+        compare=False,
+        default=EMPTY_PROP,
+    )
+    _bbox: t.Optional[Box] = dataclasses.field(
+        init=False,
+        repr=False,
+        hash=False,
+        compare=False,
+        default=EMPTY_PROP,
+    )
+    _bounded: bool = dataclasses.field(
+        init=False,
+        repr=False,
+        hash=False,
+        compare=False,
+        default=EMPTY_PROP,
+    )
+    _region_bbox: t.Optional[Box] = dataclasses.field(
+        init=False,
+        repr=False,
+        hash=False,
+        compare=False,
+        default=EMPTY_PROP,
+    )
+    _feasible: bool = dataclasses.field(
+        init=False,
+        repr=False,
+        hash=False,
+        compare=False,
+        default=EMPTY_PROP,
+    )
+    _reach_box: t.Optional[Box] = dataclasses.field(
+        init=False,
+        repr=False,
+        hash=False,
+        compare=False,
+        default=EMPTY_PROP,
+    )
+
     @classmethod
     def from_hses(cls, *args: Hs):
         return cls(hses=FOSet(args))
 
+    @property
+    @lazy_prop
+    def endpoints(self) -> np.ndarray:
+        """[n_hses x 2 x 2] read-only array of halfspace endpoints."""
+        endpoints = _hses_endpoints(self.hses)
+        endpoints.flags.writeable = False
+        return endpoints
+
     @property
     def xs(self) -> t.FrozenSet[X]:
         xs = find_all_xs(self.hses)
@@ -302,6 +419,7 @@ class Eterm:
         return xs
 
     @property
+    @lazy_prop
     def bbox(self) -> t.Optional[Box]:
         """
         Tight bounding box over this eterm's hs intersection points. None if
@@ -319,6 +437,315 @@ class Eterm:
 
         return points_bbox(map(lambda x: x.point, xs))
 
+    @property
+    @lazy_prop
+    def bounded(self) -> bool:
+        """
+        Whether the area covered by this eterm fits in a finite box. Empty
+        eterms are bounded.
+        """
+        return _hses_bounded(self.endpoints)
+
+    @property
+    @lazy_prop
+    def region_bbox(self) -> t.Optional[Box]:
+        """
+        Bounding box over the area covered by this eterm. Unlike `bbox`, it
+        only uses the crosses that are the eterm's vertices.
+
+        - None if the eterm is unbounded.
+        - `EMPTY_BOX` if no point is contained by all halfspaces.
+        """
+        if not self.bounded:
+            return None
+
+        vertices = _eterm_vertex_points(self.endpoints)
+        if len(vertices) == 0:
+            return EMPTY_BOX
+
+        min_x, min_y = vertices.min(axis=0).tolist()
+        max_x, max_y = vertices.max(axis=0).tolist()
+        return Box(min_x=min_x, min_y=min_y, max_x=max_x, max_y=max_y)
+
+    @property
+    @lazy_prop
+    def reach_box(self) -> t.Optional[Box]:
+        """
+        Bounding box over the points that pass the loose containment check.
+        See `_eterm_reach_box()`.
+
+        - None if the eterm is unbounded.
+        - `EMPTY_BOX` if no point passes the check.
+        """
+        return _eterm_reach_box(self.endpoints)
+
+    @property
+    @lazy_prop
+    def feasible(self) -> bool:
+        """
+        Whether there's any point contained by all the halfspaces, allowing
+        points on the boundary. Eterms that aren't feasible don't contribute
+        anything to an `Esum`.
+        """
+        return _hses_feasible(self.endpoints)
+
+    def minimized(self) -> t.Optional["Eterm"]:
+        """
+        Removes redundant halfspaces. The result keeps only the halfspaces
+        whose lines make up the edges of the covered area, in the original
+        order.
+
+        Returns None if the eterm isn't `feasible`. Eterms that cover a zero
+        size area (a line or a point) are returned unchanged.
+        """
+        if not self.feasible:
+            return None
+
+        strict = np.array([isinstance(hs, Hp) for hs in self.hses], dtype=bool)
+        facet_idx = _facet_hs_indices(self.endpoints, strict)
+        if facet_idx is None:
+            return self
+
+        return Eterm(
+            hses=FOSet(hs for hs_i, hs in enumerate(self.hses) if hs_i in facet_idx)
+        )
+
+
+def _hses_bounded(endpoints: np.ndarray) -> bool:
+    """Checks if an intersection of halfspaces is bounded.
+
+    The intersection is unbounded when there's a direction `d` that lies on
+    the left of every halfspace vector. It happens when all the halfspace
+    vectors fit in a half circle.
+    """
+    vecs = endpoints[:, 1, :] - endpoints[:, 0, :]
+    # Degenerate halfspaces don't constrain anything.
+    vecs = vecs[(vecs != 0).any(axis=1)]
+    if len(vecs) < 3:
+        return False
+
+    angles = np.sort(np.arctan2(vecs[:, 1], vecs[:, 0]))
+    gaps = np.diff(np.append(angles, angles[0] + 2 * math.pi))
+
+    # When in doubt, say it's unbounded. This is the conservative answer
+    # for culling.
+    return bool(gaps.max() < math.pi - 1e-9)
+
+
+def _hses_feasible(endpoints: np.ndarray, eps: float = 10e-7, seed: int = 0) -> bool:
+    """Checks if an intersection of halfspaces is non-empty. Uses the same
+    tolerance as `_hs_contains_pt_with_eps()`.
+
+    This is Seidel's randomized incremental 2D linear programming, with
+    an arbitrary objective. Runs in expected O(n) time. The search is
+    limited to a big box around the halfspace points, so that the LP is
+    always bounded.
+    """
+    # Halfspace contains `p` if `normal . p >= offset`.
+    vecs = endpoints[:, 1, :] - endpoints[:, 0, :]
+    normals = np.stack([-vecs[:, 1], vecs[:, 0]], axis=1)
+    offsets = (normals * endpoints[:, 0, :]).sum(axis=1) - eps
+
+    lengths = np.hypot(normals[:, 0], normals[:, 1])
+    # Degenerate halfspaces contain everything.
+    valid = lengths > 0
+    normals = normals[valid] / lengths[valid, None]
+    offsets = offsets[valid] / lengths[valid]
+
+    if len(normals) == 0:
+        return True
+
+    bound = 1e6 * (1.0 + np.abs(endpoints).max())
+    box_normals = np.array([[-1.0, 0.0], [0.0, -1.0], [1.0, 0.0], [0.0, 1.0]])
+    box_offsets = np.full(4, -bound)
+
+    order = np.random.default_rng(seed).permutation(len(normals))
+    normals = np.vstack([box_normals, normals[order]]).tolist()
+    offsets = np.concatenate([box_offsets, offsets[order]]).tolist()
+
+    objective = (1.0, 0.5)
+    # Optimum of the box alone.
+    opt_x, opt_y = bound, bound
+
+    for i in range(4, len(normals)):
+        (n_x, n_y), offset = normals[i], offsets[i]
+        tol = 1e-12 * bound
+        if n_x * opt_x + n_y * opt_y >= offset - tol:
+            continue
+
+        # The new optimum lies on the constraint's line. Solve a 1D LP along
+        # it: `p = base + t * dir`.
+        base_x, base_y = n_x * offset, n_y * offset
+        dir_x, dir_y = -n_y, n_x
+        lower, upper = -math.inf, math.inf
+        for (m_x, m_y), m_offset in zip(normals[:i], offsets[:i]):
+            slope = m_x * dir_x + m_y * dir_y
+            gap = m_offset - (m_x * base_x + m_y * base_y)
+            if abs(slope) < 1e-12:
+                if gap > tol:
+                    return False
+            elif slope > 0:
+                lower = max(lower, gap / slope)
+            else:
+                upper = min(upper, gap / slope)
+
+        if lower > upper + tol:
+            return False
+
+        if objective[0] * dir_x + objective[1] * dir_y > 0:
+            t_opt = upper
+        else:
+            t_opt = lower
+        opt_x, opt_y = base_x + t_opt * dir_x, base_y + t_opt * dir_y
+
+    return True
+
+
+def _facet_hs_indices(
+    endpoints: np.ndarray, strict: np.ndarray
+) -> t.Optional[t.Set[int]]:
+    """Finds halfspaces that form the edges of the area covered by all of
+    them. Assumes the area isn't empty.
+
+    Uses the O(n log n) halfplane intersection: halfplanes are sorted by
+    angle and pushed through a deque, popping the ones that get covered by
+    the newcomers. A big box is added to make unbounded areas bounded, and
+    dropped from the result.
+
+    Returns:
+        Indices of the edge halfspaces, or None if the area has zero size or
+        can't be resolved numerically.
+    """
+    bound = 1e6 * (1.0 + (np.abs(endpoints).max() if len(endpoints) else 0.0))
+    box = np.array(
+        [
+            [[-bound, -bound], [bound, -bound]],
+            [[bound, -bound], [bound, bound]],
+            [[bound, bound], [-bound, bound]],
+            [[-bound, bound], [-bound, -bound]],
+        ]
+    )
+    all_ends = np.concatenate([endpoints.reshape(-1, 2, 2), box])
+    all_strict = np.concatenate([strict, np.zeros(4, dtype=bool)])
+    # Box halfspaces get negative indices.
+    all_idx = np.concatenate([np.arange(len(endpoints)), -np.arange(1, 5)])
+
+    pts = all_ends[:, 0, :]
+    vecs = all_ends[:, 1, :] - all_ends[:, 0, :]
+    lengths = np.hypot(vecs[:, 0], vecs[:, 1])
+    valid = lengths > 0
+    pts, vecs, lengths = pts[valid], vecs[valid] / lengths[valid, None], lengths[valid]
+    all_strict, all_idx = all_strict[valid], all_idx[valid]
+
+    angles = np.arctan2(vecs[:, 1], vecs[:, 0])
+    # -pi and pi are the same direction.
+    angles[angles <= -math.pi + 1e-12] += 2 * math.pi
+    # The more points are cut off by a halfspace, the bigger this is.
+    restriction = vecs[:, 0] * pts[:, 1] - vecs[:, 1] * pts[:, 0]
+
+    tol = 1e-9 * bound
+
+    def _cross_pt(i, j):
+        denom = vecs[i, 0] * vecs[j, 1] - vecs[i, 1] * vecs[j, 0]
+        if abs(denom) < 1e-12:
+            return None
+        d = pts[j] - pts[i]
+        along = (d[0] * vecs[j, 1] - d[1] * vecs[j, 0]) / denom
+        return pts[i] + along * vecs[i]
+
+    def _strictly_inside(i, pt):
+        d = pt - pts[i]
+        return vecs[i, 0] * d[1] - vecs[i, 1] * d[0] > tol
+
+    # Sort by angle. Among parallel halfspaces, keep only the most restrictive
+    # one, preferring `Hp` over `Hpc`.
+    unique = []
+    for i in np.argsort(angles, kind="stable").tolist():
+        if unique and abs(angles[i] - angles[unique[-1]]) < 1e-12:
+            kept = unique[-1]
+            if restriction[i] > restriction[kept] + tol or (
+                abs(restriction[i] - restriction[kept]) <= tol
+                and all_strict[i]
+                and not all_strict[kept]
+            ):
+                unique[-1] = i
+            continue
+        unique.append(i)
+
+    dq = []
+    for i in unique:
+        while len(dq) >= 2:
+            pt = _cross_pt(dq[-1], dq[-2])
+            if pt is None:
+                return None
+            if _strictly_inside(i, pt):
+                break
+            dq.pop()
+        while len(dq) >= 2:
+            pt = _cross_pt(dq[0], dq[1])
+            if pt is None:
+                return None
+            if _strictly_inside(i, pt):
+                break
+            dq.pop(0)
+        dq.append(i)
+
+    while len(dq) >= 3:
+        pt = _cross_pt(dq[-1], dq[-2])
+        if pt is None:
+            return None
+        if _strictly_inside(dq[0], pt):
+            break
+        dq.pop()
+    while len(dq) >= 3:
+        pt = _cross_pt(dq[0], dq[1])
+        if pt is None:
+            return None
+        if _strictly_inside(dq[-1], pt):
+            break
+        dq.pop(0)
+
+    if len(dq) < 3:
+        return None
+
+    corners = [_cross_pt(dq[k - 1], dq[k]) for k in range(len(dq))]
+    if any(corner is None for corner in corners):
+        return None
+    corners = np.array(corners)
+    area = 0.5 * np.sum(
+        corners[:, 0] * np.roll(corners[:, 1], -1)
+        - np.roll(corners[:, 0], -1) * corners[:, 1]
+    )
+    if area <= tol:
+        return None
+
+    return {int(all_idx[i]) for i in dq if all_idx[i] >= 0}
+
+
+def _eterm_vertex_points(endpoints: np.ndarray, eps: float = 10e-7) -> np.ndarray:
+    """Cross points of the eterm's halfspaces that are contained by the eterm.
+    Uses the same rules as `_esum_contains_x_with_eps()`.
+
+    Returns:
+        [n_vertices x 2] array.
+    """
+    i1, i2 = np.triu_indices(len(endpoints), k=1)
+    homo = np.concatenate([endpoints, np.ones(endpoints.shape[:2] + (1,))], axis=2)
+    lines = np.cross(homo[:, 0, :], homo[:, 1, :])
+    crosses = np.cross(lines[i1], lines[i2])
+
+    crossing = crosses[:, 2] != 0
+    i1, i2, crosses = i1[crossing], i2[crossing], crosses[crossing]
+    pts = crosses[:, :2] / crosses[:, 2:]
+
+    z = _z_factors(endpoints, pts)
+    # Halfspaces that make up the cross always contain it.
+    z[i1, np.arange(len(pts))] = np.inf
+    z[i2, np.arange(len(pts))] = np.inf
+
+    inside = (z > -eps).all(axis=0) & np.isfinite(pts).all(axis=1)
+    return pts[inside]
+
 
 def points_bbox(pts: t.Iterable[Pt]) -> Box:
     # 1. Get all hs crosses
@@ -365,6 +792,21 @@ class Esum(TodoMixin):
     name: t.Optional[str] = None
     debug_name: t.Optional[str] = debug_name_field
 
+    _index: t.Optional["EtermIndex"] = dataclasses.field(
+        init=False,
+        repr=False,
+        hash=False,
+        compare=False,
+        default=EMPTY_PROP,
+    )
+    _table: t.Optional["table.HsTable"] = dataclasses.field(
+        init=False,
+        repr=False,
+        hash=False,
+        compare=False,
+        default=EMPTY_PROP,
+    )
+
     @classmethod
     def from_terms(cls, *args: Eterm, debug_name: t.Optional[str] = None):
         return cls(eterms=FOSet(args), debug_name=debug_name)
@@ -377,15 +819,70 @@ class Esum(TodoMixin):
     def union(self, other: "Esum") -> "Esum":
         return Esum(self.eterms | other.eterms)
 
-    def intersection(self, other: "Esum") -> "Esum":
-        return _esum_intersect_esum(self, other)
+    def intersection(self, other: "Esum", prune: bool = False) -> "Esum":
+        """
+        Args:
+            prune: if True, removes eterms that can't contain any point. See
+                `pruned()`.
+        """
+        intersected = _esum_intersect_esum(self, other)
+        if prune:
+            return intersected.pruned()
+        else:
+            return intersected
 
     def difference(self, other: "Esum") -> "Esum":
-        return self.intersection(other.conjugate)
+        """Same points as `self.intersection(other.conjugate)`. The conjugate
+        of `other` isn't materialized, partial products are pruned as soon as
+        they become empty. See `NotEsum.expand()`.
+        """
+        return other.lazy_conjugate.expand(within=self)
+
+    def pruned(self) -> "Esum":
+        """Removes eterms whose halfspaces have an empty intersection. Doesn't
+        change which points are contained.
+        """
+        return dataclasses.replace(
+            self,
+            eterms=FOSet(eterm for eterm in self.eterms if eterm.feasible),
+        )
+
+    def minimized(self) -> "Esum":
+        """Removes redundant halfspaces from every eterm, and eterms that
+        can't contain any point. See `Eterm.minimized()`.
+        """
+        minimized_terms = (eterm.minimized() for eterm in self.eterms)
+        return dataclasses.replace(
+            self,
+            eterms=FOSet(eterm for eterm in minimized_terms if eterm is not None),
+        )
 
     def contains(self, point: Pt) -> bool:
         return _esum_contains_pt_strict(self, point)
 
+    def contains_many(self, points: np.ndarray, with_eps: bool = False) -> np.ndarray:
+        """Batched `contains()`.
+
+        Args:
+            points: [n_points x 2] array.
+            with_eps: if True, points lying on the boundary are included as
+                well, like in `_esum_contains_pt_with_eps()`.
+        Returns:
+            [n_points] bool array.
+        """
+        if with_eps:
+            return _esum_contains_pts_with_eps(self, points)
+        else:
+            return _esum_contains_pts_strict(self, points)
+
+    def compile(self, with_eps: bool = False) -> "bsp.CompiledEsum":
+        """Builds a BSP tree for fast containment queries of single points.
+        See `bsp.compile_esum()`.
+        """
+        from . import bsp
+
+        return bsp.compile_esum(self, with_eps=with_eps)
+
     @property
     def conjugate(self) -> "Esum":
         # I think the general pattern is like this:
@@ -407,6 +904,27 @@ class Esum(TodoMixin):
 
         return Esum(eterms=FOSet(conjugate_terms))
 
+    @property
+    @lazy_prop
+    def table(self) -> "table.HsTable":
+        """Array form of the eterms, see `table.HsTable`. Built on the first
+        access.
+        """
+        from . import table
+
+        return table.HsTable.from_esum(self)
+
+    @property
+    @lazy_prop
+    def index(self) -> "EtermIndex":
+        """Spatial index over the eterms. Built on the first access."""
+        return EtermIndex.from_esum(self)
+
+    @property
+    def lazy_conjugate(self) -> "NotEsum":
+        """Same shape as `conjugate`, without generating the eterms."""
+        return NotEsum(self)
+
     # def contains_x(self, x: "X") -> bool:
     #     """Checks if cross point `x` is a member of this Esum. This includes
     #     crosspoints lying on the boundary, regardless of Hp/Hpc strictness.
@@ -417,15 +935,345 @@ class Esum(TodoMixin):
     #     )
 
 
+@frozen_model
+class NotEsum(TodoMixin):
+    """Lazy complement of an `Esum`.
+
+    `Esum.conjugate` generates a Cartesian product of the eterms' halfspaces,
+    which grows exponentially with the number of eterms. This node keeps the
+    original `Esum` around and answers containment queries using De Morgan's
+    laws instead: a point is outside of the `Esum` when every eterm has at
+    least one halfspace that doesn't contain it.
+
+    Like `Esum.conjugate`, the complement of an `Esum` without eterms is
+    empty.
+    """
+
+    esum: Esum
+    debug_name: t.Optional[str] = debug_name_field
+
+    @property
+    def conjugate(self) -> Esum:
+        return self.esum
+
+    def contains(self, point: Pt) -> bool:
+        return _not_esum_contains_pt_strict(self, point)
+
+    def contains_many(self, points: np.ndarray, with_eps: bool = False) -> np.ndarray:
+        """Batched `contains()`. See `Esum.contains_many()`."""
+        if with_eps:
+            return _not_esum_contains_pts(self, points, threshold=-10e-7)
+        else:
+            return _not_esum_contains_pts(self, points, threshold=10e-7)
+
+    def expand(self, within: t.Optional[Esum] = None) -> Esum:
+        """Generates the eterms of the complement, skipping the ones that are
+        empty. Same as `esum.conjugate.pruned()`, or
+        `within.intersection(esum.conjugate).pruned()`.
+
+        The product is built depth-first, one eterm of `esum` at a time.
+        Partial products that are already empty aren't extended any further,
+        so most of the exponential blow-up never gets generated.
+        """
+        conjugate_hses = [
+            [hs.conjugate for hs in term.hses] for term in self.esum.eterms
+        ]
+        if len(conjugate_hses) == 0:
+            return Esum.empty
+
+        if within is None:
+            starts = [()]
+        else:
+            starts = [tuple(term.hses) for term in within.eterms]
+
+        new_terms = []
+        for start in starts:
+            stack = [(start, 0)]
+            while stack:
+                hses, depth = stack.pop()
+                if not _hses_feasible(_hses_endpoints(hses)):
+                    continue
+
+                if depth == len(conjugate_hses):
+                    new_terms.append(Eterm(hses=FOSet(hses)))
+                    continue
+
+                # Reversed, so that the terms are popped in the product order.
+                for hs in reversed(conjugate_hses[depth]):
+                    stack.append(((*hses, hs), depth + 1))
+
+        return Esum(eterms=FOSet(new_terms))
+
+
+def _not_esum_contains_pt_strict(not_esum: NotEsum, pt: Pt) -> bool:
+    """Numerical check. Same as `_esum_contains_pt_strict()` on the
+    conjugate.
+    """
+    if len(not_esum.esum.eterms) == 0:
+        return False
+
+    return all(
+        any(_hs_contains_pt_strict(hs.conjugate, pt) for hs in term.hses)
+        for term in not_esum.esum.eterms
+    )
+
+
+def _not_esum_contains_pts(
+    not_esum: NotEsum, points: np.ndarray, threshold: float
+) -> np.ndarray:
+    """Batched De Morgan check, see `table.complement_contains_pts()`."""
+    from . import table
+
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    if len(not_esum.esum.eterms) == 0:
+        return np.zeros(len(points), dtype=bool)
+
+    ends, offsets = not_esum.esum.table.eterm_arrays()
+    return table.complement_contains_pts(ends, offsets, points, threshold)
+
+
+@frozen_model
+class EtermIndex:
+    """Uniform grid over the eterms' bounding boxes. Finds eterms that might
+    contain a point, so containment checks don't have to scan the whole
+    `Esum`.
+
+    The boxes cover every point that passes the loose containment check, so
+    the candidates are a superset of the eterms that contain a point, with
+    either of the numerical checks.
+    """
+
+    eterms: t.Tuple[Eterm, ...]
+
+    global_eterms: t.Tuple[int, ...]
+    "Indices of eterms that aren't in the grid, like the unbounded ones."
+
+    cells: t.Tuple[t.Tuple[int, ...], ...]
+    "Eterm indices for each cell. Cells are stored row by row, `y` major."
+
+    grid_box: Box
+    "Area covered by the grid cells. Points outside only get the global eterms."
+
+    cell_w: float
+    cell_h: float
+    n_cols: int
+    n_rows: int
+
+    @classmethod
+    def from_esum(cls, esum: Esum) -> "EtermIndex":
+        eterms = tuple(esum.eterms)
+        boxes = {}
+        global_eterms = []
+        for eterm_i, eterm in enumerate(eterms):
+            box = eterm.reach_box
+            if box is None:
+                global_eterms.append(eterm_i)
+            elif box is not EMPTY_BOX:
+                boxes[eterm_i] = box
+
+        if len(boxes) == 0:
+            return cls(
+                eterms=eterms,
+                global_eterms=tuple(global_eterms),
+                cells=(),
+                grid_box=EMPTY_BOX,
+                cell_w=1.0,
+                cell_h=1.0,
+                n_cols=0,
+                n_rows=0,
+            )
+
+        grid_box = Box(
+            min_x=min(box.min_x for box in boxes.values()),
+            min_y=min(box.min_y for box in boxes.values()),
+            max_x=max(box.max_x for box in boxes.values()),
+            max_y=max(box.max_y for box in boxes.values()),
+        )
+
+        # Roughly one eterm per cell, assuming they're spread evenly.
+        n_cols = n_rows = min(_INDEX_MAX_CELLS, math.ceil(math.sqrt(len(boxes))))
+        cell_w = (grid_box.max_x - grid_box.min_x) / n_cols or 1.0
+        cell_h = (grid_box.max_y - grid_box.min_y) / n_rows or 1.0
+
+        cells = [[] for _ in range(n_cols * n_rows)]
+        # Eterms spanning many cells would bloat the grid. Checking them for
+        # every query is cheaper.
+        max_eterm_cells = max(16, len(cells) // 8)
+        for eterm_i, box in boxes.items():
+            col1 = min(math.floor((box.min_x - grid_box.min_x) / cell_w), n_cols - 1)
+            row1 = min(math.floor((box.min_y - grid_box.min_y) / cell_h), n_rows - 1)
+            col2 = min(math.floor((box.max_x - grid_box.min_x) / cell_w), n_cols - 1)
+            row2 = min(math.floor((box.max_y - grid_box.min_y) / cell_h), n_rows - 1)
+
+            if (col2 - col1 + 1) * (row2 - row1 + 1) > max_eterm_cells:
+                global_eterms.append(eterm_i)
+                continue
+
+            for row in range(row1, row2 + 1):
+                for col in range(col1, col2 + 1):
+                    cells[row * n_cols + col].append(eterm_i)
+
+        return cls(
+            eterms=eterms,
+            global_eterms=tuple(sorted(global_eterms)),
+            cells=tuple(map(tuple, cells)),
+            grid_box=grid_box,
+            cell_w=cell_w,
+            cell_h=cell_h,
+            n_cols=n_cols,
+            n_rows=n_rows,
+        )
+
+    def candidate_indices(self, x: float, y: float) -> t.Sequence[int]:
+        """Indices of eterms that might contain the point."""
+        box = self.grid_box
+        # Also false for NaNs.
+        if not (box.min_x <= x <= box.max_x and box.min_y <= y <= box.max_y):
+            return self.global_eterms
+
+        # Points lying on the outer edge belong to the last cell.
+        col = min(math.floor((x - box.min_x) / self.cell_w), self.n_cols - 1)
+        row = min(math.floor((y - box.min_y) / self.cell_h), self.n_rows - 1)
+        return self.global_eterms + self.cells[row * self.n_cols + col]
+
+    def candidates(self, pt: Pt) -> t.Sequence[Eterm]:
+        """Eterms that might contain the point."""
+        return [self.eterms[i] for i in self.candidate_indices(pt.x, pt.y)]
+
+    def groups(
+        self, points: np.ndarray
+    ) -> t.Iterator[t.Tuple[np.ndarray, t.Sequence[Eterm]]]:
+        """Splits the points by grid cells.
+
+        Args:
+            points: [n_points x 2] array.
+        Yields:
+            Indices of points in a cell, and eterms that might contain them.
+            Points without any candidate eterms are skipped.
+        """
+        for pt_indices, eterm_indices in self.index_groups(points):
+            yield pt_indices, [self.eterms[i] for i in eterm_indices]
+
+    def index_groups(
+        self, points: np.ndarray
+    ) -> t.Iterator[t.Tuple[np.ndarray, t.Sequence[int]]]:
+        """Same as `groups()`, with indices of the eterms. These are also rows
+        of `Esum.table`.
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        if len(points) == 0:
+            return
+
+        box = self.grid_box
+        xs = points[:, 0]
+        ys = points[:, 1]
+        # Also false for NaNs.
+        in_grid = (box.min_x <= xs) & (xs <= box.max_x)
+        in_grid &= (box.min_y <= ys) & (ys <= box.max_y)
+        # Same rounding as in `candidate_indices()`. Points lying on the outer
+        # edge belong to the last cell.
+        cols = np.floor((xs[in_grid] - box.min_x) / self.cell_w)
+        rows = np.floor((ys[in_grid] - box.min_y) / self.cell_h)
+        cols = np.minimum(cols, self.n_cols - 1)
+        rows = np.minimum(rows, self.n_rows - 1)
+        cell_ids = np.full(len(points), -1, dtype=np.int64)
+        cell_ids[in_grid] = rows.astype(np.int64) * self.n_cols + cols.astype(np.int64)
+
+        order = np.argsort(cell_ids, kind="stable")
+        sorted_ids = cell_ids[order]
+        starts = np.flatnonzero(np.diff(sorted_ids, prepend=sorted_ids[0] - 1))
+        ends = np.append(starts[1:], len(order))
+        for start, end in zip(starts.tolist(), ends.tolist()):
+            cell_i = int(sorted_ids[start])
+            if cell_i < 0:
+                eterm_indices = self.global_eterms
+            else:
+                eterm_indices = self.global_eterms + self.cells[cell_i]
+
+            if len(eterm_indices) == 0:
+                continue
+
+            yield order[start:end], eterm_indices
+
+
+# Upper bound for the number of grid columns and rows.
+_INDEX_MAX_CELLS = 512
+
+# Smaller `Esum`s are scanned directly. Building the index doesn't pay off.
+_INDEX_MIN_ETERMS = 16
+
+
+def _eterm_reach_box(endpoints: np.ndarray, eps: float = 10e-7) -> t.Optional[Box]:
+    """Bounding box over the points that pass the loose containment check.
+    That's a bit more than `Eterm.region_bbox`. Each halfspace is moved
+    outwards so that the points with z factor equal to `-eps` lie on its
+    line.
+
+    - None if the eterm is unbounded.
+    - `EMPTY_BOX` if no point passes the check.
+    """
+    if not _hses_bounded(endpoints):
+        return None
+
+    vecs = endpoints[:, 1, :] - endpoints[:, 0, :]
+    sq_lengths = (vecs**2).sum(axis=1)
+    # Degenerate halfspaces contain every point with the loose check.
+    shifts = np.divide(
+        eps, sq_lengths, out=np.zeros_like(sq_lengths), where=sq_lengths != 0
+    )
+    # The inside is on the left of the halfspace vector. Move towards the
+    # right-hand normal.
+    normals = np.stack([vecs[:, 1], -vecs[:, 0]], axis=1)
+    moved = endpoints + (shifts[:, None] * normals)[:, None, :]
+
+    vertices = np.concatenate(
+        [_eterm_vertex_points(moved, eps), _eterm_vertex_points(endpoints, eps)]
+    )
+    if len(vertices) == 0:
+        return EMPTY_BOX
+
+    (min_x, min_y), (max_x, max_y) = vertices.min(axis=0), vertices.max(axis=0)
+    # Keeps rounding errors of the cross points and z factors on the safe side.
+    margin = 1e-6 * (1 + np.abs(vertices).max())
+    return Box(
+        min_x=float(min_x - margin),
+        min_y=float(min_y - margin),
+        max_x=float(max_x + margin),
+        max_y=float(max_y + margin),
+    )
+
+
+def _eterms_near(esum: Esum, pt: Pt) -> t.Iterable[Eterm]:
+    """Eterms that might contain the point. Uses `Esum.index` for big
+    `Esum`s.
+    """
+    if len(esum.eterms) < _INDEX_MIN_ETERMS:
+        return esum.eterms
+    else:
+        return esum.index.candidates(pt)
+
+
+def _eterm_groups(
+    esum: Esum, points: np.ndarray
+) -> t.Iterable[t.Tuple[np.ndarray, t.Optional[t.Sequence[int]]]]:
+    """Batched `_eterms_near()`. See `EtermIndex.index_groups()`. None stands
+    for all eterms.
+    """
+    if len(esum.eterms) < _INDEX_MIN_ETERMS:
+        return [(np.arange(len(points)), None)]
+    else:
+        return esum.index.index_groups(points)
+
+
 # ------- esum ^ esum ---------
 def _esum_intersect_esum(e1: Esum, e2: Esum) -> Esum:
     new_terms = []
     for self_term in e1.eterms:
         for other_term in e2.eterms:
             # Check bounding box collision
-            bbox1 = self_term.bbox
-            bbox2 = other_term.bbox
-            # ...but only if both terms have enough xs.
+            bbox1 = self_term.region_bbox
+            bbox2 = other_term.region_bbox
+            # ...but only if both terms are bounded.
             if bbox1 is not None and bbox2 is not None:
                 if not _boxes_collide(bbox1, bbox2):
                     continue
@@ -438,8 +1286,15 @@ def _esum_intersect_esum(e1: Esum, e2: Esum) -> Esum:
 
 
 def _boxes_collide(box1: Box, box2: Box, eps: float = 0.1) -> bool:
-    # TODO
-    return True
+    """Checks if two boxes overlap. Boxes that are closer than `eps` are
+    considered overlapping. `EMPTY_BOX` doesn't collide with anything.
+    """
+    return (
+        box1.min_x - eps <= box2.max_x
+        and box2.min_x - eps <= box1.max_x
+        and box1.min_y - eps <= box2.max_y
+        and box2.min_y - eps <= box1.max_y
+    )
 
 
 def find_all_xs(hses: t.Iterable[Hs]) -> t.Set[X]:
@@ -456,7 +1311,8 @@ def find_all_xs(hses: t.Iterable[Hs]) -> t.Set[X]:
 def _esum_contains_pt_strict(esum: Esum, pt: Pt) -> bool:
     """Numerical check."""
     return any(
-        all(_hs_contains_pt_strict(hs, pt) for hs in term.hses) for term in esum.eterms
+        all(_hs_contains_pt_strict(hs, pt) for hs in term.hses)
+        for term in _eterms_near(esum, pt)
     )
 
 
@@ -464,27 +1320,112 @@ def _esum_contains_pt_with_eps(esum: Esum, pt: Pt) -> bool:
     """Numerical check."""
     return any(
         all(_hs_contains_pt_with_eps(hs, pt) for hs in term.hses)
-        for term in esum.eterms
+        for term in _eterms_near(esum, pt)
     )
 
 
+def _esum_contains_pts(esum: Esum, points: np.ndarray, threshold: float) -> np.ndarray:
+    """Checks if every z factor of any eterm is above the threshold. Runs
+    `table.contains_pts()` on `Esum.table`, one index cell at a time.
+    """
+    from . import table
+
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    result = np.zeros(len(points), dtype=bool)
+
+    for undecided, eterm_ids in _eterm_groups(esum, points):
+        ends, offsets = esum.table.eterm_arrays(eterm_ids)
+        result[undecided] = table.contains_pts(
+            ends, offsets, points[undecided], threshold
+        )
+
+    return result
+
+
+def _esum_contains_pts_strict(
+    esum: Esum, points: np.ndarray, eps: float = 10e-7
+) -> np.ndarray:
+    """Batched `_esum_contains_pt_strict()`."""
+    return _esum_contains_pts(esum, points, threshold=eps)
+
+
+def _esum_contains_pts_with_eps(
+    esum: Esum, points: np.ndarray, eps: float = 10e-7
+) -> np.ndarray:
+    """Batched `_esum_contains_pt_with_eps()`."""
+    return _esum_contains_pts(esum, points, threshold=-eps)
+
+
+def _esum_classify_pts(
+    esum: Esum, points: np.ndarray, eps: float = 10e-7
+) -> t.Tuple[np.ndarray, np.ndarray]:
+    """Batched `_esum_contains_pt_with_eps()` and `_esum_contains_pt_strict()`
+    in a single pass, see `table.classify_pts()`.
+
+    Returns:
+        - [n_points] bool array, loose check
+        - [n_points] bool array, strict check
+    """
+    from . import table
+
+    points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+    with_eps = np.zeros(len(points), dtype=bool)
+    strict = np.zeros(len(points), dtype=bool)
+
+    for undecided, eterm_ids in _eterm_groups(esum, points):
+        ends, offsets = esum.table.eterm_arrays(eterm_ids)
+        with_eps[undecided], strict[undecided] = table.classify_pts(
+            ends, offsets, points[undecided], eps
+        )
+
+    return with_eps, strict
+
+
+def _classify_pts(
+    groups: t.Iterable[t.Tuple[np.ndarray, t.Sequence[Eterm]]],
+    points: np.ndarray,
+    eps: float = 10e-7,
+) -> t.Tuple[np.ndarray, np.ndarray]:
+    """`_esum_classify_pts()` with the eterms grouped by the caller, like
+    `EtermIndex.groups()` does.
+    """
+    from . import table
+
+    with_eps = np.zeros(len(points), dtype=bool)
+    strict = np.zeros(len(points), dtype=bool)
+
+    for undecided, eterms in groups:
+        ends = np.concatenate([term.endpoints for term in eterms])
+        offsets = np.cumsum([0, *(len(term.hses) for term in eterms)])
+        with_eps[undecided], strict[undecided] = table.classify_pts(
+            ends, offsets, points[undecided], eps
+        )
+
+    return with_eps, strict
+
+
 # ----- esum-seg ------
 
 
-def _esum_contains_seg_with_eps(esum: Esum, segment: "XSegment") -> bool:
+def _segment_mid_pt(segment: "XSegment") -> Pt:
     p1 = segment.x1.point
     p2 = segment.x2.point
-    mid_pt = Pt(
+    return Pt(
         x=(p1.x + p2.x) / 2,
         y=(p1.y + p2.y) / 2,
     )
-    for eterm in esum.eterms:
+
+
+def _esum_contains_seg_with_eps(esum: Esum, segment: "XSegment") -> bool:
+    mid_pt = _segment_mid_pt(segment)
+    for eterm in _eterms_near(esum, mid_pt):
         # NOTE: we could add a symbolic/lazy check here, but we need an
         # additional assumption. If we assume that:
         # - every `eterm` is a convex polygon
         # - that every `eterm` consists only of non-redundant halfspaces
         # this means that every halfspace in the `eterm` is a part of the
         # eterm's boundary. This would allow us to compare halfspaces directly.
+        # `Esum.minimized()` gives us the second assumption.
 
         # numerical check
         if _eterm_contains_pt_with_eps(eterm, mid_pt):
@@ -494,14 +1435,9 @@ def _esum_contains_seg_with_eps(esum: Esum, segment: "XSegment") -> bool:
 
 
 def _esum_contains_seg_strict(esum: Esum, segment: "XSegment") -> bool:
-    p1 = segment.x1.point
-    p2 = segment.x2.point
-    mid_pt = Pt(
-        x=(p1.x + p2.x) / 2,
-        y=(p1.y + p2.y) / 2,
-    )
+    mid_pt = _segment_mid_pt(segment)
 
-    for eterm in esum.eterms:
+    for eterm in _eterms_near(esum, mid_pt):
         # NOTE: we could add a symbolic/lazy check here, but we need an
         # additional assumption. If we assume that:
         # - every `eterm` is a convex polygon
@@ -533,9 +1469,12 @@ def _eterm_contains_pt_strict(eterm: Eterm, pt: Pt) -> bool:
 
 
 def _esum_contains_x_with_eps(esum: Esum, x: X):
+    return _eterms_contain_x_with_eps(_eterms_near(esum, x.point), x)
+
+
+def _eterms_contain_x_with_eps(eterms: t.Iterable[Eterm], x: X):
     return any(
-        all(_hs_contains_x_with_eps(hs, x) for hs in eterm.hses)
-        for eterm in esum.eterms
+        all(_hs_contains_x_with_eps(hs, x) for hs in eterm.hses) for eterm in eterms
     )
 
 
@@ -548,6 +1487,10 @@ def _hs_contains_x_with_eps(hs: Hs, x: X):
     if hs in {x.hs1, x.hs2}:
         return True
 
+    if core.settings.robust:
+        sign = predicates.orient_x(hs, x)
+        return sign is not None and sign >= 0
+
     # Check 2: see if a `hs` contains the cross point. Allow points on
     # boundaries, even for `Hp`.
     return _hs_contains_pt_with_eps(hs, x.point)
@@ -558,11 +1501,15 @@ def _hs_contains_x_with_eps(hs: Hs, x: X):
 
 def _hs_contains_pt_strict(hs: Hs, pt: Pt, eps: float = 10e-7) -> bool:
     """Numerical check. The strict one."""
+    if core.settings.robust:
+        return predicates.orient_hs(hs, pt) > 0
     return _z_factor(hs, pt) > eps
 
 
 def _hs_contains_pt_with_eps(hs: Hs, pt: Pt, eps: float = 10e-7) -> bool:
     """Numerical check. The loose one."""
+    if core.settings.robust:
+        return predicates.orient_hs(hs, pt) >= 0
     return _z_factor(hs, pt) > -eps
 
 
@@ -576,6 +1523,139 @@ def find_vertices(esum: Esum) -> t.Set[X]:
     return collapsed
 
 
+def _hses_endpoints(hses: t.Iterable[Hs]) -> np.ndarray:
+    """[n_hses x 2 x 2] array of halfspace endpoints. Axis 1 picks p1 or p2,
+    axis 2 picks the x or y coordinate.
+    """
+    return np.array(
+        [[[hs.p1.x, hs.p1.y], [hs.p2.x, hs.p2.y]] for hs in hses],
+        dtype=np.float64,
+    ).reshape(-1, 2, 2)
+
+
+def _lines_reaching_eterm(
+    lines: np.ndarray,
+    line_ids: np.ndarray,
+    term_ends: np.ndarray,
+    term_ids: np.ndarray,
+    eps: float = 10e-7,
+) -> np.ndarray:
+    """Checks which lines have at least one point inside the eterm.
+
+    Each line is clipped by every halfspace of the eterm, apart from the line
+    itself. The check is loose: it uses the same epsilon as
+    `_hs_contains_pt_with_eps()` and widens the clipped interval a bit to
+    account for rounding. This makes it a superset of the lines that can hold
+    a vertex inside the eterm.
+
+    Args:
+        lines: [n_lines x 2 x 2] array of line endpoints.
+        line_ids: [n_lines] array of ids of the lines' halfspaces.
+        term_ends: [n_term_hses x 2 x 2] array of the eterm's halfspaces.
+        term_ids: [n_term_hses] array of ids of the eterm's halfspaces.
+    Returns:
+        [n_lines] boolean mask.
+    """
+    lower, upper, outside = _reach_bounds(lines, line_ids, term_ends, term_ids, eps)
+    return _reach_intervals_overlap(
+        lower.max(axis=1, initial=-np.inf),
+        upper.min(axis=1, initial=np.inf),
+        outside.any(axis=1),
+    )
+
+
+def _reach_bounds(
+    lines: np.ndarray,
+    line_ids: np.ndarray,
+    term_ends: np.ndarray,
+    term_ids: np.ndarray,
+    eps: float = 10e-7,
+) -> t.Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Clips each line by each halfspace. See `_lines_reaching_eterm()`.
+
+    Returns:
+        [n_lines x n_term_hses] arrays:
+        - lower bounds of the line parameter `t`
+        - upper bounds of the line parameter `t`
+        - whether the line is parallel to the halfspace and lies outside of it
+    """
+    # Line i is parametrized as `a_i + t * d_i`.
+    a = lines[:, 0, :]
+    d = lines[:, 1, :] - lines[:, 0, :]
+    # Halfspace k contains point p if `v_k x (p - p1_k) > -eps`.
+    p1 = term_ends[:, 0, :]
+    v = term_ends[:, 1, :] - term_ends[:, 0, :]
+
+    rel = a[:, None, :] - p1[None, :, :]
+    # z factor at t=0 and its derivative over t. Both are [n_lines x n_term_hses].
+    z0 = v[None, :, 0] * rel[..., 1] - v[None, :, 1] * rel[..., 0]
+    dz = v[None, :, 0] * d[:, None, 1] - v[None, :, 1] * d[:, None, 0]
+
+    # The numbers can get big, so the tolerance needs to be relative.
+    tol = eps + 1e-9 * (np.abs(z0) + np.abs(dz))
+    is_self = line_ids[:, None] == term_ids[None, :]
+    is_parallel = np.abs(dz) <= 1e-12 * np.abs(v).sum(axis=1)[None, :] * np.abs(
+        d
+    ).sum(axis=1)[:, None]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        bound = (-tol - z0) / dz
+
+    lower = np.where(~is_self & ~is_parallel & (dz > 0), bound, -np.inf)
+    upper = np.where(~is_self & ~is_parallel & (dz < 0), bound, np.inf)
+    outside = ~is_self & is_parallel & (z0 <= -tol)
+    return lower, upper, outside
+
+
+def _reach_intervals_overlap(
+    lower: np.ndarray, upper: np.ndarray, outside: np.ndarray
+) -> np.ndarray:
+    """Checks if the clipped line intervals are non-empty, with some slack for
+    rounding.
+    """
+    slack = 1e-9 * (1 + np.abs(np.where(np.isfinite(lower), lower, 0.0)))
+    return (lower <= upper + slack) & ~outside
+
+
+def find_vertices_clipped(esum: Esum, eps: float = 10e-7) -> t.Sequence[X]:
+    """Same vertices as `find_vertices()`, but skips most crosses that can't
+    become vertices.
+
+    A vertex needs to lie inside at least one eterm, so both of its
+    halfspaces have to reach that eterm. Instead of crossing every pair of
+    halfspaces, we only cross pairs that reach a common eterm. For shapes
+    built from many small, mostly disjoint eterms this is much less than
+    O(H^2).
+    """
+    hses = list(mitt.unique_everseen(hs for term in esum.eterms for hs in term.hses))
+    if len(hses) < 2:
+        return []
+
+    hs_ids = {hs: hs_i for hs_i, hs in enumerate(hses)}
+    lines = _hses_endpoints(hses)
+    line_ids = np.arange(len(hses))
+
+    pairs = set()
+    for term in esum.eterms:
+        if len(term.hses) == 0:
+            reaching = line_ids
+        else:
+            term_ids = np.array([hs_ids[hs] for hs in term.hses])
+            mask = _lines_reaching_eterm(
+                lines, line_ids, _hses_endpoints(term.hses), term_ids, eps=eps
+            )
+            (reaching,) = np.nonzero(mask)
+
+        pairs.update(itertools.combinations(reaching.tolist(), 2))
+
+    crosses = (X(hses[hs1_i], hses[hs2_i]) for hs1_i, hs2_i in sorted(pairs))
+    inside = filter(
+        lambda x: x.point is not None and _esum_contains_x_with_eps(esum, x),
+        crosses,
+    )
+    return collapse_xs(inside)
+
+
 def query_xs(xs: t.Iterable[X], poi: Pt, eps: float = 0.1) -> t.Iterable[X]:
     """Select cross points that are epsilon-close to the point-of-interest."""
     return [x for x in xs if x.point.distance(poi) < eps]
@@ -595,6 +1675,24 @@ class XSegment(TodoMixin):
     hs3: Hs
     debug_name: t.Optional[str] = debug_name_field
 
+    # Endpoint crosses. Cached, so the intersection points are calculated at
+    # most once per segment. `from_xs()` fills them with the crosses it was
+    # given.
+    _x1: t.Optional[X] = dataclasses.field(
+        init=False,
+        repr=False,
+        hash=False,
+        compare=False,
+        default=EMPTY_PROP,
+    )
+    _x2: t.Optional[X] = dataclasses.field(
+        init=False,
+        repr=False,
+        hash=False,
+        compare=False,
+        default=EMPTY_PROP,
+    )
+
     @classmethod
     def from_xs(cls, x1: X, x2: X) -> "XSegment":
         x1_hses = set(x1.halfspaces)
@@ -608,13 +1706,32 @@ class XSegment(TodoMixin):
         (common_hs,) = common_hses
         (hs3,) = x2_hses.difference(common_hses)
 
-        return XSegment(hs1, common_hs, hs3)
+        # `x1` and `x2` have a fixed halfspace order. The crosses we got are
+        # reused only if they match it, because the calculated point depends
+        # on the order.
+        segment = XSegment(hs1, common_hs, hs3)
+        if x1 == X(hs1, common_hs):
+            object.__setattr__(segment, "_x1", x1)
+        if x2 == X(common_hs, hs3):
+            object.__setattr__(segment, "_x2", x2)
+        return segment
+
+    def renamed(self, debug_name: t.Optional[str]) -> "XSegment":
+        """Same segment with another debug name. Unlike
+        `dataclasses.replace()`, keeps the cached crosses.
+        """
+        segment = dataclasses.replace(self, debug_name=debug_name)
+        object.__setattr__(segment, "_x1", self._x1)
+        object.__setattr__(segment, "_x2", self._x2)
+        return segment
 
     @property
+    @lazy_prop
     def x1(self) -> X:
         return X(self.hs1, self.common_hs)
 
     @property
+    @lazy_prop
     def x2(self) -> X:
         return X(self.common_hs, self.hs3)
 
@@ -651,27 +1768,65 @@ def hs_xs_index(xs: t.Iterable[X]) -> t.Dict[Hs, t.Set[X]]:
 
 
 def find_segments(xs: t.Iterable[X]) -> t.Sequence[XSegment]:
-    cross_index = hs_xs_index(xs)
+    """Cuts every halfspace into the smallest segments between its cross
+    points.
+
+    Each halfspace's cross points are sorted exactly once.
+    """
+    xs = list(xs)
+    coords = _xs_coords(xs)
+    x_indices = {cross: x_i for x_i, cross in enumerate(xs)}
 
     all_segments = []
-    for x_i, x_of_interest in enumerate(xs):
-        for hs in x_of_interest.halfspaces:
-            # 1. get neighbors for p1.hs1, p1.hs2
-            # We need to retain order.
-            xs_on_this_hs = list(cross_index[hs])
-            if len(xs_on_this_hs) <= 1:
-                continue
+    # Dicts retain insertion order, so halfspaces are visited in the order of
+    # their first appearance in `xs`.
+    for hs, xs_on_this_hs in hs_xs_index(xs).items():
+        if len(xs_on_this_hs) <= 1:
+            continue
 
-            segments = infer_smallest_segments(xs_on_this_hs, hs)
-            all_segments.extend(segments)
+        # We need to retain order.
+        xs_on_this_hs = list(xs_on_this_hs)
+        sorted_indices = _sort_along_hs(
+            coords[[x_indices[cross] for cross in xs_on_this_hs]], hs
+        )
+        all_segments.extend(
+            XSegment.from_xs(xs_on_this_hs[i1], xs_on_this_hs[i2])
+            for i1, i2 in mitt.pairwise(sorted_indices.tolist())
+        )
 
     named_segments = [
-        dataclasses.replace(seg, debug_name=f"{seg_i}")
+        seg.renamed(f"{seg_i}")
         for seg_i, seg in enumerate(mitt.unique_everseen(all_segments))
     ]
     return named_segments
 
 
+def _xs_coords(xs: t.Sequence[X]) -> np.ndarray:
+    """[n_xs x 2] array of cross point coordinates."""
+    coords = np.empty((len(xs), 2), dtype=np.float64)
+    for x_i, cross in enumerate(xs):
+        pt = cross.point
+        coords[x_i, 0] = pt.x
+        coords[x_i, 1] = pt.y
+    return coords
+
+
+def _sort_along_hs(coords: np.ndarray, hs: Hs) -> np.ndarray:
+    """Indices that sort `coords` along the direction of `hs`. Stable, so
+    coincident points keep their relative order.
+    """
+    # Project each point onto the halfspace's direction vector (AB), using
+    # one of the halfspace's points as the coordinate origin (A). The stencil
+    # vector is non-zero as long as the user defines a non-degenerate
+    # halfspace.
+    stencil_x = hs.p2.x - hs.p1.x
+    stencil_y = hs.p2.y - hs.p1.y
+    ax_x = coords[:, 0] - hs.p1.x
+    ax_y = coords[:, 1] - hs.p1.y
+    projections = ax_x * stencil_x + ax_y * stencil_y
+    return np.argsort(projections, kind="stable")
+
+
 def infer_smallest_segments(xs: t.Sequence[X], hs: Hs) -> t.Sequence[XSegment]:
     """
     Args:
@@ -683,51 +1838,141 @@ def infer_smallest_segments(xs: t.Sequence[X], hs: Hs) -> t.Sequence[XSegment]:
             be never an element of `xs` that's in the middle of an inferred
             segment.
     """
-    # 1. Get a "stencil" vector from the halfspace points we're considering
-    #     (AB). We need this vector to be non-zero. It will be true as long as
-    #     the user defines a non-degenerate halfspace.
-    # 2. Pick one of the halfspace's points as the coordinate origin (A).
-    # 3. For each X, make a vector AX.
-    # 4. Sort xs by the value of "AX . AB".
-    # 5. Construct segments by a rolling window over sorted xs.
+    xs = list(xs)
+    sorted_indices = _sort_along_hs(_xs_coords(xs), hs)
+
+    # Connect subsequent pairs to get the smallest segments
+    return [
+        XSegment.from_xs(xs[i1], xs[i2])
+        for i1, i2 in mitt.pairwise(sorted_indices.tolist())
+    ]
+
+
+def segment_on_boundary(esum: Esum, segment: XSegment, eps: float = 10e-7) -> bool:
+    """Checks if the segment's midpoint is inside `esum` with the loose check,
+    but not with the strict one. Same as combining
+    `_esum_contains_seg_with_eps()` and `_esum_contains_seg_strict()`, but
+    every z factor is calculated only once.
+    """
+    if core.settings.robust:
+        return _segment_on_boundary_robust(esum, segment)
+
+    mid_pt = _segment_mid_pt(segment)
 
-    # 1. Get stencil vector
-    stencil_vec = hs.p2.position2d - hs.p1.position2d
+    inside_with_eps = False
+    for eterm in _eterms_near(esum, mid_pt):
+        eterm_with_eps = True
+        eterm_strict = True
+        for hs in eterm.hses:
+            z = _z_factor(hs, mid_pt)
+            if z <= -eps:
+                eterm_with_eps = False
+                break
+            if z <= eps:
+                eterm_strict = False
 
-    # 2. Coordinate origin
-    coord_origin = hs.p1.position2d
+        if eterm_with_eps and eterm_strict:
+            # Strictly inside means it's not on the boundary.
+            return False
 
-    def _comparator(x: X):
-        # 3. Get the AX vector
-        ax_vec = x.point.position2d - coord_origin
+        inside_with_eps = inside_with_eps or eterm_with_eps
 
-        # 4. Sort by the dot product
-        return np.dot(stencil_vec, ax_vec)
+    return inside_with_eps
 
-    xs_sorted = sorted(xs, key=_comparator)
 
-    # 5. Connect subsequent pairs to get the smallest segments
-    segments = [XSegment.from_xs(x1, x2) for x1, x2 in mitt.windowed(xs_sorted, n=2)]
-    return segments
+def _segment_on_boundary_robust(esum: Esum, segment: XSegment) -> bool:
+    """`segment_on_boundary()` with exact signs. The midpoint isn't rounded,
+    see `predicates.orient_mid()`.
+    """
+    inside_with_eps = False
+    for eterm in _eterms_near(esum, _segment_mid_pt(segment)):
+        eterm_with_eps = True
+        eterm_strict = True
+        for hs in eterm.hses:
+            # The midpoint lies on the segment's own line.
+            if hs == segment.common_hs:
+                sign = 0
+            else:
+                sign = predicates.orient_mid(hs, segment.x1, segment.x2)
+            if sign is None or sign < 0:
+                eterm_with_eps = False
+                break
+            if sign == 0:
+                eterm_strict = False
+
+        if eterm_with_eps and eterm_strict:
+            return False
+
+        inside_with_eps = inside_with_eps or eterm_with_eps
+
+    return inside_with_eps
+
+
+def _filter_segments_robust(esum: Esum, segments: t.Sequence[XSegment]):
+    """Batched `_segment_on_boundary_robust()`. Signs are calculated with
+    floats for all segments at once, only the ambiguous ones are recalculated
+    exactly.
+    """
+    from . import table
 
+    mid_pts = np.array(
+        [[pt.x, pt.y] for pt in map(_segment_mid_pt, segments)], dtype=np.float64
+    )
+    hs1_ends = _hses_endpoints(seg.hs1 for seg in segments)
+    common_ends = _hses_endpoints(seg.common_hs for seg in segments)
+    hs3_ends = _hses_endpoints(seg.hs3 for seg in segments)
+    x1_ends = np.stack([hs1_ends, common_ends], axis=1)
+    x2_ends = np.stack([common_ends, hs3_ends], axis=1)
+
+    hs_ids: t.Dict[Hs, int] = {}
+    common_ids = np.array(
+        [hs_ids.setdefault(seg.common_hs, len(hs_ids)) for seg in segments]
+    )
 
-def segment_on_boundary(esum: Esum, segment: XSegment) -> bool:
-    # FIXME
-    # pt1 = segment.x1.point
-    # pt2 = segment.x2.point
-    # mid_pt = Pt((pt1.x + pt2.x) / 2, (pt1.y + pt2.y) / 2)
+    hs_table = esum.table
+    # Rows of the table as objects. The exact fallback needs the original
+    # coordinates, the table has them rounded to floats.
+    table_hses = [hs for eterm in esum.eterms for hs in eterm.hses]
+    table_ids = np.array([hs_ids.get(hs, -1) for hs in table_hses], dtype=np.int64)
+
+    with_eps = np.zeros(len(segments), dtype=bool)
+    strict = np.zeros(len(segments), dtype=bool)
+    for undecided, eterm_ids in _eterm_groups(esum, mid_pts):
+        if eterm_ids is None:
+            rows, offsets = np.arange(hs_table.n_hses), hs_table.eterm_offsets
+        else:
+            rows, offsets = hs_table.hs_rows(eterm_ids)
 
-    # e = _esum_contains_pt_with_epsilon(esum, mid_pt)
-    # s = _esum_contains_pt_strict(esum, mid_pt)
+        signs, ambiguous = predicates.orient_mid_batch(
+            hs_table.endpoints[rows], x1_ends[undecided], x2_ends[undecided]
+        )
+        # The midpoint lies on the segment's own line.
+        own_line = table_ids[rows][:, None] == common_ids[None, undecided]
+        signs[own_line] = 0
+        for row_i, seg_i in zip(*np.nonzero(ambiguous & ~own_line)):
+            seg = segments[undecided[seg_i]]
+            sign = predicates.orient_mid(table_hses[rows[row_i]], seg.x1, seg.x2)
+            signs[row_i, seg_i] = -1 if sign is None else sign
 
-    e = _esum_contains_seg_with_eps(esum, segment)
-    s = _esum_contains_seg_strict(esum, segment)
+        with_eps[undecided] = table.all_per_eterm(signs >= 0, offsets).any(axis=0)
+        strict[undecided] = table.all_per_eterm(signs > 0, offsets).any(axis=0)
 
-    return e and not s
+    return [seg for seg, on in zip(segments, with_eps & ~strict) if on]
 
 
 def filter_segments(esum, segments):
-    return [s for s in segments if segment_on_boundary(esum, s)]
+    """Batched `segment_on_boundary()`."""
+    if len(segments) == 0:
+        return []
+    if core.settings.robust:
+        return _filter_segments_robust(esum, segments)
+
+    mid_pts = np.array(
+        [[pt.x, pt.y] for pt in map(_segment_mid_pt, segments)], dtype=np.float64
+    )
+    with_eps, strict = _esum_classify_pts(esum, mid_pts)
+    on_boundary = with_eps & ~strict
+    return [seg for seg, is_boundary in zip(segments, on_boundary) if is_boundary]
 
 
 def collapse_xs(xs: t.Iterable[X]) -> t.Sequence[X]:
@@ -784,9 +2029,76 @@ def named_esum(esum: Esum) -> Esum:
     )
 
 
-def detect_boundary(esum: Esum):
-    """Run full algorithm."""
-    vertices = find_vertices(esum=esum)
+def detect_boundary(
+    esum: t.Union[Esum, NotEsum],
+    vertices_finder: t.Optional[t.Callable[[Esum], t.Sequence[X]]] = None,
+    cache=None,
+    tiles: t.Optional[t.Union[int, t.Tuple[int, int]]] = None,
+    workers: t.Optional[int] = None,
+):
+    """Run full algorithm.
+
+    Args:
+        esum: the shape. `NotEsum`s are expanded first.
+        vertices_finder: vertex discovery engine. Either `find_vertices` (the
+            default) or `find_vertices_clipped`. Both give the same vertices.
+        cache: optional `cache.EsumMemo`. Results are looked up there first.
+        tiles: if set, the plane is split into a grid of tiles that are
+            processed by `workers` processes. See `tiled.detect_boundary_tiled()`.
+            Can't be combined with `cache` or `vertices_finder`, tiles find
+            their vertices themselves.
+    """
+    if tiles is not None:
+        if cache is not None:
+            raise ValueError("Tiled detection can't be combined with a cache")
+        if vertices_finder is not None:
+            raise ValueError("Tiled detection can't use a custom vertices_finder")
+
+        from . import tiled
+
+        return tiled.detect_boundary_tiled(esum, tiles=tiles, workers=workers)
+
+    if vertices_finder is None:
+        vertices_finder = find_vertices
+
+    if cache is not None:
+        return cache.detect_boundary(esum, vertices_finder=vertices_finder)
+
+    if isinstance(esum, NotEsum):
+        esum = esum.expand()
+
+    vertices = vertices_finder(esum)
     segment_candidates = find_segments(vertices)
     boundary_segments = filter_segments(esum, segment_candidates)
     return boundary_segments
+
+
+def iter_boundary(esum: t.Union[Esum, NotEsum]) -> t.Iterator[XSegment]:
+    """Yields the same segments as `detect_boundary()`, one halfspace at a time.
+
+    Each halfspace is crossed with all the others, and the segments between its
+    vertices are classified right away. Only a single halfspace's crosses and
+    segments are kept in memory. The price is that every vertex is checked
+    twice, once for each of its halfspaces.
+    """
+    if isinstance(esum, NotEsum):
+        esum = esum.expand()
+
+    hses = list(mitt.unique_everseen(hs for term in esum.eterms for hs in term.hses))
+    for hs_i, hs in enumerate(hses):
+        # Same cross orientation as `find_all_xs()`, so the points are
+        # calculated the same way.
+        crosses = (
+            X(hs, other) if hs_i < other_i else X(other, hs)
+            for other_i, other in enumerate(hses)
+            if other_i != hs_i
+        )
+        vertices = [
+            cross
+            for cross in crosses
+            if cross.point is not None and _esum_contains_x_with_eps(esum, cross)
+        ]
+        if len(vertices) <= 1:
+            continue
+
+        yield from filter_segments(esum, infer_smallest_segments(vertices, hs))
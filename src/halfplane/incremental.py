@@ -0,0 +1,930 @@
+"""
+Incremental boundary detection. Keeps the results of `flat.detect_boundary()`
+up to date while eterms are added to and removed from the shape, without
+redoing the whole pipeline after every edit.
+
+An edited eterm can only change things close to it:
+- crosses that start or stop being vertices lie inside the eterm
+- segments that change their classification have midpoints inside the eterm
+
+Lines of a new eterm are an exception, they cross the whole plane. Their
+crosses are only looked for inside the eterms that the new lines reach.
+
+Each line keeps its vertices sorted, like `flat.find_segments()` does, so a
+vertex can be inserted or removed by splitting or merging a single segment.
+
+The line endpoints, the containment index and the index of lines by direction
+are updated in place as well. The lines and eterms that an edit looks at are
+found through the indexes, so the cost of an edit depends on what the edited
+eterm and its lines reach, not on the size of the whole shape.
+"""
+
+import bisect
+import dataclasses
+import itertools
+import math
+import typing as t
+
+import numpy as np
+
+from . import flat
+from .generic_structs import FOSet
+
+
+# Relative slack for comparing line parameters against the clipped intervals.
+# The parameters are calculated differently than the cross points, so they
+# need some room for rounding errors.
+_PARAM_SLACK = 1e-7
+
+# Eterms spanning more grid cells are checked for every point instead.
+_GRID_MAX_ETERM_CELLS = 64
+
+# The grid's cell size is picked again whenever the number of eterms doubles.
+_GRID_MIN_ETERMS = 16
+
+# Lines are grouped into this many buckets by their direction. Bucket `i`
+# holds the lines with normals closest to the angle `i * pi / _N_DIRECTIONS`.
+_N_DIRECTIONS = 64
+
+_BUCKET_NORMALS = np.stack(
+    [
+        np.cos(np.arange(_N_DIRECTIONS) * np.pi / _N_DIRECTIONS),
+        np.sin(np.arange(_N_DIRECTIONS) * np.pi / _N_DIRECTIONS),
+    ],
+    axis=1,
+)
+# Exact normals for the axis-aligned lines, so their buckets have no spread.
+_BUCKET_NORMALS[np.abs(_BUCKET_NORMALS) < 1e-12] = 0.0
+
+
+@dataclasses.dataclass
+class _LineState:
+    """Vertices on a single line, sorted along the line's direction."""
+
+    hs: flat.Hs
+    keys: t.List[float] = dataclasses.field(default_factory=list)
+    "Projections of the vertices onto the line's direction. Sorted."
+
+    xs: t.List[flat.X] = dataclasses.field(default_factory=list)
+
+    segments: t.List[flat.XSegment] = dataclasses.field(default_factory=list)
+    "Segments between subsequent vertices. One less than `xs`."
+
+    on_boundary: t.List[t.Optional[bool]] = dataclasses.field(default_factory=list)
+    "Classification of `segments`. None if it needs to be recalculated."
+
+    @property
+    def sq_length(self) -> float:
+        dx = self.hs.p2.x - self.hs.p1.x
+        dy = self.hs.p2.y - self.hs.p1.y
+        return dx * dx + dy * dy
+
+    def key(self, cross: flat.X) -> float:
+        """Same projection as in `flat._sort_along_hs()`."""
+        hs = self.hs
+        pt = cross.point
+        return (pt.x - hs.p1.x) * (hs.p2.x - hs.p1.x) + (pt.y - hs.p1.y) * (
+            hs.p2.y - hs.p1.y
+        )
+
+    def segment_range(self, lower: float, upper: float) -> range:
+        """Indices of segments that overlap the line parameter interval."""
+        sq_length = self.sq_length
+        slack = _PARAM_SLACK * (1 + max(abs(lower), abs(upper)))
+        lower_key = (lower - slack) * sq_length
+        upper_key = (upper + slack) * sq_length
+
+        first = max(bisect.bisect_left(self.keys, lower_key) - 1, 0)
+        last = min(bisect.bisect_right(self.keys, upper_key), len(self.segments))
+        return range(first, last)
+
+
+class _Rows:
+    """Growable array, rows are appended in amortized O(1)."""
+
+    def __init__(self, row_shape: t.Tuple[int, ...], dtype: t.Any):
+        self.data = np.zeros((16,) + row_shape, dtype=dtype)
+        self.n = 0
+
+    @property
+    def view(self) -> np.ndarray:
+        return self.data[: self.n]
+
+    def append(self, rows: np.ndarray):
+        stop = self.n + len(rows)
+        if stop > len(self.data):
+            grown = np.zeros(
+                (max(stop, 2 * len(self.data)),) + self.data.shape[1:],
+                dtype=self.data.dtype,
+            )
+            grown[: self.n] = self.view
+            self.data = grown
+        self.data[self.n : stop] = rows
+        self.n = stop
+
+
+class _LineTable:
+    """Endpoints of the lines, one row per line. Rows of removed lines are
+    reused, so the row of a line doesn't change while it's a part of the shape.
+    """
+
+    def __init__(self):
+        self.rows: t.Dict[flat.Hs, int] = {}
+        self.states: t.List[t.Optional[_LineState]] = []
+        # Crosses are oriented by the order in which their lines appeared, the
+        # same as in `flat.find_vertices()`.
+        self.order: t.List[int] = []
+        self.ends = _Rows((2, 2), np.float64)
+        self.alive = _Rows((), bool)
+        self._free: t.List[int] = []
+        self._order_counter = itertools.count()
+
+    def add(self, hs: flat.Hs) -> _LineState:
+        state = _LineState(hs)
+        ends = flat._hses_endpoints([hs])
+        if self._free:
+            row = self._free.pop()
+            self.states[row] = state
+            self.order[row] = next(self._order_counter)
+            self.ends.data[row] = ends[0]
+            self.alive.data[row] = True
+        else:
+            row = len(self.states)
+            self.states.append(state)
+            self.order.append(next(self._order_counter))
+            self.ends.append(ends)
+            self.alive.append(np.ones(1, dtype=bool))
+        self.rows[hs] = row
+        return state
+
+    def remove(self, hs: flat.Hs) -> _LineState:
+        row = self.rows.pop(hs)
+        state = self.states[row]
+        self.states[row] = None
+        self.alive.data[row] = False
+        self._free.append(row)
+        return state
+
+    def hs(self, row: int) -> flat.Hs:
+        return self.states[row].hs
+
+    def cross(self, row1: int, row2: int) -> flat.X:
+        if self.order[row1] < self.order[row2]:
+            return flat.X(self.hs(row1), self.hs(row2))
+        else:
+            return flat.X(self.hs(row2), self.hs(row1))
+
+
+@dataclasses.dataclass
+class _Direction:
+    """Lines and reach boxes in a single bucket of `_LineIndex`, as offsets
+    along the bucket's normal.
+    """
+
+    normal: np.ndarray
+
+    spread: float = 0.0
+    "Largest distance between `normal` and the unit normal of any added line."
+
+    line_offsets: t.List[float] = dataclasses.field(default_factory=list)
+    "Sorted."
+
+    rows: t.List[int] = dataclasses.field(default_factory=list)
+    "`_LineTable` rows of the lines, in the order of `line_offsets`."
+
+    box_lows: t.List[float] = dataclasses.field(default_factory=list)
+    "Sorted."
+
+    box_highs: t.List[float] = dataclasses.field(default_factory=list)
+    eterms: t.List[flat.Eterm] = dataclasses.field(default_factory=list)
+    max_box_width: float = 0.0
+
+    def add_box(self, eterm: flat.Eterm, corners: np.ndarray):
+        low, high = self.box_range(corners)
+        box_i = bisect.bisect_right(self.box_lows, low)
+        self.box_lows.insert(box_i, low)
+        self.box_highs.insert(box_i, high)
+        self.eterms.insert(box_i, eterm)
+        self.max_box_width = max(self.max_box_width, high - low)
+
+    def remove_box(self, eterm: flat.Eterm, corners: np.ndarray):
+        low, _ = self.box_range(corners)
+        box_i = bisect.bisect_left(self.box_lows, low)
+        while self.eterms[box_i] != eterm:
+            box_i += 1
+        del self.box_lows[box_i]
+        del self.box_highs[box_i]
+        del self.eterms[box_i]
+
+    def box_range(self, corners: np.ndarray) -> t.Tuple[float, float]:
+        offsets = corners @ self.normal
+        return float(offsets.min()), float(offsets.max())
+
+
+class _LineIndex:
+    """Lines grouped by direction and sorted by their offsets, along with the
+    eterms' reach boxes. Finds the lines that cross a box, and the eterms a
+    line might reach, by bisecting the offsets instead of checking every line
+    and eterm of the shape.
+
+    Offsets are measured from `origin` along the normal of the bucket. Lines
+    in a bucket aren't exactly parallel, so the searched ranges are widened by
+    the bucket's spread times the distance from the origin. The buckets of
+    axis-aligned lines have no spread at all.
+    """
+
+    def __init__(self):
+        self.origin: t.Optional[np.ndarray] = None
+        self.directions: t.Dict[int, _Direction] = {}
+        # Bucket, offset and spread of each line.
+        self.line_keys: t.Dict[int, t.Tuple[int, float, float]] = {}
+        # Lines without a direction. They cross every box.
+        self.loose_rows: t.Dict[int, None] = {}
+        # Corners of the eterms' reach boxes, relative to `origin`.
+        self.corners: t.Dict[flat.Eterm, np.ndarray] = {}
+        # Unbounded eterms. Every line might reach them.
+        self.unbounded: t.Dict[flat.Eterm, None] = {}
+        self.max_radius = 0.0
+
+    @classmethod
+    def from_lines(
+        cls, lines: _LineTable, eterms: t.Iterable[flat.Eterm]
+    ) -> "_LineIndex":
+        index = cls()
+        for eterm in eterms:
+            index.add_eterm(eterm)
+
+        for row in lines.rows.values():
+            key = index._line_key(lines.ends.data[row])
+            if key is None:
+                index.loose_rows[row] = None
+            else:
+                index.line_keys[row] = key
+
+        # Appending in the order of offsets keeps every bucket sorted.
+        for row, (bucket, offset, spread) in sorted(
+            index.line_keys.items(), key=_offset
+        ):
+            direction = index._direction(bucket)
+            direction.spread = max(direction.spread, spread)
+            direction.line_offsets.append(offset)
+            direction.rows.append(row)
+        return index
+
+    def add_line(self, row: int, ends: np.ndarray):
+        key = self._line_key(ends)
+        if key is None:
+            self.loose_rows[row] = None
+            return
+
+        bucket, offset, spread = key
+        direction = self._direction(bucket)
+        direction.spread = max(direction.spread, spread)
+        line_i = bisect.bisect_right(direction.line_offsets, offset)
+        direction.line_offsets.insert(line_i, offset)
+        direction.rows.insert(line_i, row)
+        self.line_keys[row] = key
+
+    def remove_line(self, row: int):
+        if row in self.loose_rows:
+            del self.loose_rows[row]
+            return
+
+        bucket, offset, _ = self.line_keys.pop(row)
+        direction = self.directions[bucket]
+        line_i = bisect.bisect_left(direction.line_offsets, offset)
+        while direction.rows[line_i] != row:
+            line_i += 1
+        del direction.line_offsets[line_i]
+        del direction.rows[line_i]
+
+    def add_eterm(self, eterm: flat.Eterm):
+        box = eterm.reach_box
+        if box is None:
+            self.unbounded[eterm] = None
+            return
+        if box is flat.EMPTY_BOX:
+            return
+
+        corners = self._relative(_box_corners(box))
+        self.corners[eterm] = corners
+        self.max_radius = max(self.max_radius, _radius(corners))
+        for direction in self.directions.values():
+            direction.add_box(eterm, corners)
+
+    def remove_eterm(self, eterm: flat.Eterm):
+        if eterm in self.unbounded:
+            del self.unbounded[eterm]
+            return
+
+        corners = self.corners.pop(eterm, None)
+        if corners is None:
+            return
+        for direction in self.directions.values():
+            direction.remove_box(eterm, corners)
+
+    def lines_through(self, box: flat.Box) -> np.ndarray:
+        """Rows of the lines that might cross the box. Sorted."""
+        if box is flat.EMPTY_BOX:
+            return np.zeros(0, dtype=np.int64)
+
+        corners = self._relative(_box_corners(box))
+        radius = _radius(corners)
+        slack = 1e-9 * (1 + radius)
+        rows = list(self.loose_rows)
+        for direction in self.directions.values():
+            low, high = direction.box_range(corners)
+            widening = direction.spread * radius + slack
+            first = bisect.bisect_left(direction.line_offsets, low - widening)
+            last = bisect.bisect_right(direction.line_offsets, high + widening)
+            rows.extend(direction.rows[first:last])
+        return np.sort(np.array(rows, dtype=np.int64))
+
+    def eterms_crossed_by(self, row: int) -> t.List[flat.Eterm]:
+        """Eterms that the line might reach."""
+        crossed = list(self.unbounded)
+        if row in self.loose_rows:
+            return crossed + list(self.corners)
+
+        bucket, offset, spread = self.line_keys[row]
+        direction = self.directions[bucket]
+        widening = spread * self.max_radius + 1e-9 * (1 + self.max_radius)
+        first = bisect.bisect_left(
+            direction.box_lows, offset - direction.max_box_width - widening
+        )
+        last = bisect.bisect_right(direction.box_lows, offset + widening)
+        crossed.extend(
+            eterm
+            for eterm, high in zip(
+                direction.eterms[first:last], direction.box_highs[first:last]
+            )
+            if high >= offset - widening
+        )
+        return crossed
+
+    def _direction(self, bucket: int) -> _Direction:
+        direction = self.directions.get(bucket)
+        if direction is None:
+            direction = _Direction(_BUCKET_NORMALS[bucket])
+            boxes = sorted(
+                (
+                    (direction.box_range(corners), eterm)
+                    for eterm, corners in self.corners.items()
+                ),
+                key=_key,
+            )
+            direction.box_lows = [low for (low, _), _ in boxes]
+            direction.box_highs = [high for (_, high), _ in boxes]
+            direction.eterms = [eterm for _, eterm in boxes]
+            direction.max_box_width = max(
+                (high - low for (low, high), _ in boxes), default=0.0
+            )
+            self.directions[bucket] = direction
+        return direction
+
+    def _line_key(self, ends: np.ndarray) -> t.Optional[t.Tuple[int, float, float]]:
+        """Bucket, offset and spread of the line. None if it has no direction."""
+        vec = ends[1] - ends[0]
+        length = math.hypot(vec[0], vec[1])
+        if not (length > 0 and np.isfinite(ends).all()):
+            return None
+
+        normal = np.array([-vec[1], vec[0]]) / length
+        angle = math.atan2(normal[1], normal[0]) % math.pi
+        bucket = round(angle / math.pi * _N_DIRECTIONS) % _N_DIRECTIONS
+        bucket_normal = _BUCKET_NORMALS[bucket]
+        if normal @ bucket_normal < 0:
+            normal = -normal
+
+        # The line's closest point to the origin is `distance * normal`.
+        distance = float(self._relative(ends[0]) @ normal)
+        offset = distance * float(normal @ bucket_normal)
+        spread = float(np.hypot(*(normal - bucket_normal)))
+        return bucket, offset, spread
+
+    def _relative(self, points: np.ndarray) -> np.ndarray:
+        if self.origin is None:
+            self.origin = np.array(points, dtype=np.float64).reshape(-1, 2)[0]
+        return points - self.origin
+
+
+class _EtermGrid:
+    """Hash grid over the eterms' reach boxes. Finds candidates for
+    containment checks, like `flat.EtermIndex`, but eterms can be added and
+    removed. The cells are squares of a fixed size, so the grid doesn't need
+    to know the area it covers.
+    """
+
+    def __init__(self, cell_size: float):
+        self.cell_size = cell_size
+        self.cells: t.Dict[t.Tuple[int, int], t.Dict[flat.Eterm, None]] = {}
+        self.global_eterms: t.Dict[flat.Eterm, None] = {}
+
+    @classmethod
+    def from_eterms(cls, eterms: t.Collection[flat.Eterm]) -> "_EtermGrid":
+        # Roughly one eterm per cell, for eterms of similar sizes.
+        sizes = [
+            max(box.max_x - box.min_x, box.max_y - box.min_y)
+            for box in (eterm.reach_box for eterm in eterms)
+            if box is not None and box is not flat.EMPTY_BOX
+        ]
+        grid = cls(float(np.median(sizes)) if sizes else 1.0)
+        if not grid.cell_size > 0:
+            grid.cell_size = 1.0
+        for eterm in eterms:
+            grid.add(eterm)
+        return grid
+
+    def add(self, eterm: flat.Eterm):
+        box = eterm.reach_box
+        if box is flat.EMPTY_BOX:
+            return
+        keys = self._cell_keys(box)
+        if keys is None:
+            self.global_eterms[eterm] = None
+            return
+        for key in keys:
+            self.cells.setdefault(key, {})[eterm] = None
+
+    def remove(self, eterm: flat.Eterm):
+        box = eterm.reach_box
+        if box is flat.EMPTY_BOX:
+            return
+        keys = self._cell_keys(box)
+        if keys is None:
+            del self.global_eterms[eterm]
+            return
+        for key in keys:
+            cell = self.cells[key]
+            del cell[eterm]
+            if not cell:
+                del self.cells[key]
+
+    def _cell_keys(
+        self, box: t.Optional[flat.Box]
+    ) -> t.Optional[t.List[t.Tuple[int, int]]]:
+        """Cells overlapping the box. None if it's better kept global."""
+        if box is None:
+            return None
+
+        size = self.cell_size
+        col1, row1 = math.floor(box.min_x / size), math.floor(box.min_y / size)
+        col2, row2 = math.floor(box.max_x / size), math.floor(box.max_y / size)
+        if (col2 - col1 + 1) * (row2 - row1 + 1) > _GRID_MAX_ETERM_CELLS:
+            return None
+        return [
+            (col, row)
+            for col in range(col1, col2 + 1)
+            for row in range(row1, row2 + 1)
+        ]
+
+    def candidates(self, pt: flat.Pt) -> t.List[flat.Eterm]:
+        """Eterms that might contain the point."""
+        candidates = list(self.global_eterms)
+        x = float(pt.x) / self.cell_size
+        y = float(pt.y) / self.cell_size
+        if math.isfinite(x) and math.isfinite(y):
+            candidates.extend(self.cells.get((math.floor(x), math.floor(y)), ()))
+        return candidates
+
+    def groups(
+        self, points: np.ndarray
+    ) -> t.Iterator[t.Tuple[np.ndarray, t.Sequence[flat.Eterm]]]:
+        """Same as `flat.EtermIndex.groups()`."""
+        keys = np.floor(points / self.cell_size)
+        finite = np.isfinite(keys).all(axis=1)
+
+        groups: t.Dict[t.Optional[t.Tuple[int, int]], t.List[int]] = {}
+        for pt_i, (col, row), is_finite in zip(
+            itertools.count(), keys.tolist(), finite.tolist()
+        ):
+            key = (int(col), int(row)) if is_finite else None
+            groups.setdefault(key, []).append(pt_i)
+
+        for key, indices in groups.items():
+            eterms = list(self.global_eterms)
+            if key is not None:
+                eterms.extend(self.cells.get(key, ()))
+            if eterms:
+                yield np.array(indices), eterms
+
+
+class IncrementalBoundary:
+    """Vertices, segments and the halfspace-to-crosses index of a shape that
+    changes one eterm at a time.
+
+    `segments` gives the same boundary as `flat.detect_boundary()` on
+    `esum`. The exception are coincident vertices on a line, which can be
+    sorted in a different order. Segments touching them can then name
+    different halfspaces.
+    """
+
+    def __init__(self, esum: t.Optional[flat.Esum] = None):
+        self._eterms: t.Dict[flat.Eterm, None] = {}
+        # Number of eterms that use each halfspace.
+        self._hs_refs: t.Dict[flat.Hs, int] = {}
+        self._lines: t.Dict[flat.Hs, _LineState] = {}
+        self._line_table = _LineTable()
+        self._line_index = _LineIndex()
+        self._grid = _EtermGrid(1.0)
+        self._grid_n_eterms = 0
+        self._vertices: t.Set[flat.X] = set()
+        # Lines with segments that need to be classified at the end of an edit.
+        # Keyed by `id()`, hashing halfspaces over and over is slow.
+        self._pending_lines: t.Dict[int, _LineState] = {}
+        # Built on first access after an edit.
+        self._esum: t.Optional[flat.Esum] = flat.Esum.empty
+
+        if esum is not None:
+            self._rebuild(esum)
+
+    @property
+    def esum(self) -> flat.Esum:
+        if self._esum is None:
+            self._esum = flat.Esum(eterms=FOSet(self._eterms))
+        return self._esum
+
+    @property
+    def vertices(self) -> t.AbstractSet[flat.X]:
+        return self._vertices
+
+    @property
+    def hs_xs_index(self) -> t.Dict[flat.Hs, t.Set[flat.X]]:
+        """Vertices on each line. See `flat.hs_xs_index()`."""
+        return {hs: set(line.xs) for hs, line in self._lines.items() if line.xs}
+
+    @property
+    def segments(self) -> t.Sequence[flat.XSegment]:
+        return [
+            seg
+            for line in self._lines.values()
+            for seg, on_boundary in zip(line.segments, line.on_boundary)
+            if on_boundary
+        ]
+
+    def add_eterm(self, eterm: flat.Eterm):
+        if eterm in self._eterms:
+            return
+
+        self._eterms[eterm] = None
+        self._esum = None
+        new_lines = self._add_refs(eterm)
+        for hs in new_lines:
+            row = self._line_table.rows[hs]
+            self._line_index.add_line(row, self._line_table.ends.data[row])
+        self._line_index.add_eterm(eterm)
+        self._index_eterm(eterm)
+
+        reaching, lower, upper = self._lines_reaching(eterm)
+
+        # Adding an eterm only makes more crosses contained. They need to lie
+        # inside the new eterm, unless they're on a new line.
+        candidates = self._crosses_within(reaching, lower, upper)
+        for hs in new_lines:
+            candidates.update(self._crosses_on_new_line(self._line_table.rows[hs]))
+
+        for row1, row2 in candidates:
+            cross = self._line_table.cross(row1, row2)
+            if cross in self._vertices or cross.point is None:
+                continue
+            if self._contains_x(cross):
+                self._insert_vertex(cross)
+
+        self._reclassify(self._line_states(reaching), lower, upper)
+
+    def remove_eterm(self, eterm: flat.Eterm):
+        """Raises `KeyError` if the eterm isn't a part of the shape."""
+        if eterm not in self._eterms:
+            raise KeyError(eterm)
+
+        reaching, lower, upper = self._lines_reaching(eterm)
+        reaching_lines = self._line_states(reaching)
+
+        del self._eterms[eterm]
+        self._esum = None
+        self._grid.remove(eterm)
+        self._line_index.remove_eterm(eterm)
+
+        for hs in self._remove_refs(eterm):
+            for cross in list(self._lines[hs].xs):
+                self._delete_vertex(cross)
+            self._pending_lines.pop(id(self._lines.pop(hs)), None)
+            self._line_index.remove_line(self._line_table.rows[hs])
+            self._line_table.remove(hs)
+
+        # Removing an eterm only makes less crosses contained. They need to
+        # lie inside the removed eterm.
+        reaching_hses = {line.hs for line in reaching_lines}
+        rechecked = set()
+        for line, line_lower, line_upper in zip(
+            reaching_lines, lower.tolist(), upper.tolist()
+        ):
+            if line.hs not in self._lines:
+                continue
+            seg_range = line.segment_range(line_lower, line_upper)
+            rechecked.update(
+                cross
+                for cross in line.xs[seg_range.start : seg_range.stop + 1]
+                if cross.hs1 in reaching_hses and cross.hs2 in reaching_hses
+            )
+
+        for cross in rechecked:
+            if not self._contains_x(cross):
+                self._delete_vertex(cross)
+
+        self._reclassify(reaching_lines, lower, upper)
+
+    def _rebuild(self, esum: flat.Esum):
+        for eterm in esum.eterms:
+            self._eterms[eterm] = None
+            self._add_refs(eterm)
+        self._esum = flat.Esum(eterms=FOSet(self._eterms))
+        self._line_index = _LineIndex.from_lines(self._line_table, self._eterms)
+        self._grid = _EtermGrid.from_eterms(self._eterms)
+        self._grid_n_eterms = len(self._eterms)
+
+        vertices = flat.find_vertices_clipped(self._esum)
+        for cross in vertices:
+            self._vertices.add(cross)
+
+        for hs, xs_on_line in flat.hs_xs_index(vertices).items():
+            line = self._lines[hs]
+            keyed = sorted(((line.key(cross), cross) for cross in xs_on_line), key=_key)
+            line.keys = [key for key, _ in keyed]
+            line.xs = [cross for _, cross in keyed]
+            line.segments = [
+                flat.XSegment.from_xs(x1, x2) for x1, x2 in zip(line.xs, line.xs[1:])
+            ]
+            line.on_boundary = [None] * len(line.segments)
+            self._pending_lines[id(line)] = line
+
+        self._classify_pending()
+
+    def _add_refs(self, eterm: flat.Eterm) -> t.List[flat.Hs]:
+        """Returns lines that weren't used before."""
+        added = []
+        for hs in eterm.hses:
+            if hs not in self._hs_refs:
+                self._hs_refs[hs] = 0
+                self._lines[hs] = self._line_table.add(hs)
+                added.append(hs)
+            self._hs_refs[hs] += 1
+        return added
+
+    def _remove_refs(self, eterm: flat.Eterm) -> t.List[flat.Hs]:
+        """Returns lines that aren't used anymore."""
+        removed = []
+        for hs in eterm.hses:
+            self._hs_refs[hs] -= 1
+            if self._hs_refs[hs] == 0:
+                del self._hs_refs[hs]
+                removed.append(hs)
+        return removed
+
+    def _index_eterm(self, eterm: flat.Eterm):
+        # The cell size fits the eterms seen so far. Picking it again once in a
+        # while keeps the cost of the rebuilds amortized O(1) per edit.
+        if len(self._eterms) >= max(2 * self._grid_n_eterms, _GRID_MIN_ETERMS):
+            self._grid = _EtermGrid.from_eterms(self._eterms)
+            self._grid_n_eterms = len(self._eterms)
+        else:
+            self._grid.add(eterm)
+
+    def _contains_x(self, cross: flat.X) -> bool:
+        candidates = self._grid.candidates(cross.point)
+        return flat._eterms_contain_x_with_eps(candidates, cross)
+
+    # ----- vertices and segments ------
+
+    def _insert_vertex(self, cross: flat.X):
+        self._vertices.add(cross)
+        for hs in cross.halfspaces:
+            line = self._lines[hs]
+            key = line.key(cross)
+            x_i = bisect.bisect_right(line.keys, key)
+            line.keys.insert(x_i, key)
+            line.xs.insert(x_i, cross)
+
+            # Split the segment that contained the new vertex, or extend the
+            # line's segments at one of the ends.
+            new_segments = []
+            if x_i > 0:
+                new_segments.append(flat.XSegment.from_xs(line.xs[x_i - 1], cross))
+            if x_i < len(line.xs) - 1:
+                new_segments.append(flat.XSegment.from_xs(cross, line.xs[x_i + 1]))
+
+            first = max(x_i - 1, 0)
+            n_replaced = 1 if 0 < x_i < len(line.xs) - 1 else 0
+            line.segments[first : first + n_replaced] = new_segments
+            line.on_boundary[first : first + n_replaced] = [None] * len(new_segments)
+            self._pending_lines[id(line)] = line
+
+    def _delete_vertex(self, cross: flat.X):
+        self._vertices.discard(cross)
+        for hs in cross.halfspaces:
+            line = self._lines.get(hs)
+            if line is None:
+                continue
+
+            key = line.key(cross)
+            x_i = bisect.bisect_left(line.keys, key)
+            while line.xs[x_i] != cross:
+                x_i += 1
+            del line.keys[x_i]
+            del line.xs[x_i]
+
+            # Merge the segments around the removed vertex.
+            first = max(x_i - 1, 0)
+            if 0 < x_i < len(line.xs):
+                merged = flat.XSegment.from_xs(line.xs[x_i - 1], line.xs[x_i])
+                line.segments[first : x_i + 1] = [merged]
+                line.on_boundary[first : x_i + 1] = [None]
+                self._pending_lines[id(line)] = line
+            else:
+                del line.segments[first : x_i + 1]
+                del line.on_boundary[first : x_i + 1]
+
+    def _reclassify(
+        self,
+        reaching_lines: t.Sequence[_LineState],
+        lower: np.ndarray,
+        upper: np.ndarray,
+    ):
+        """Classifies new segments and the ones inside the edited eterm."""
+        for line, line_lower, line_upper in zip(
+            reaching_lines, lower.tolist(), upper.tolist()
+        ):
+            if line.hs not in self._lines:
+                continue
+            seg_range = line.segment_range(line_lower, line_upper)
+            line.on_boundary[seg_range.start : seg_range.stop] = [None] * len(seg_range)
+            self._pending_lines[id(line)] = line
+
+        self._classify_pending()
+
+    def _classify_pending(self):
+        pending = [
+            (line, seg_i)
+            for line in self._pending_lines.values()
+            for seg_i, on_boundary in enumerate(line.on_boundary)
+            if on_boundary is None
+        ]
+        self._pending_lines.clear()
+        if len(pending) == 0:
+            return
+
+        mid_pts = [flat._segment_mid_pt(line.segments[i]) for line, i in pending]
+        mid_pts = np.array([[pt.x, pt.y] for pt in mid_pts], dtype=np.float64)
+        with_eps, strict = flat._classify_pts(self._grid.groups(mid_pts), mid_pts)
+        for (line, seg_i), on_boundary in zip(pending, (with_eps & ~strict).tolist()):
+            line.on_boundary[seg_i] = on_boundary
+
+    # ----- candidate crosses ------
+
+    def _line_states(self, rows: np.ndarray) -> t.List[_LineState]:
+        return [self._line_table.states[row] for row in rows.tolist()]
+
+    def _lines_reaching(
+        self, eterm: flat.Eterm
+    ) -> t.Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Lines that have a point inside the eterm.
+
+        Returns:
+            - rows of the lines
+            - lower bounds of the line parameter inside the eterm
+            - upper bounds of the line parameter inside the eterm
+        """
+        lines = self._line_table
+        if len(eterm.hses) == 0:
+            rows = np.flatnonzero(lines.alive.view)
+            return (
+                rows,
+                np.full(len(rows), -np.inf),
+                np.full(len(rows), np.inf),
+            )
+
+        # Only lines that cross the reach box can reach the eterm.
+        box = eterm.reach_box
+        if box is None:
+            rows = np.flatnonzero(lines.alive.view)
+        else:
+            rows = self._line_index.lines_through(box)
+
+        term_rows = np.array([lines.rows[hs] for hs in eterm.hses])
+        lower, upper, outside = flat._reach_bounds(
+            lines.ends.data[rows], rows, eterm.endpoints, term_rows
+        )
+        lower = lower.max(axis=1, initial=-np.inf)
+        upper = upper.min(axis=1, initial=np.inf)
+        mask = flat._reach_intervals_overlap(lower, upper, outside.any(axis=1))
+
+        return rows[mask], lower[mask], upper[mask]
+
+    def _crosses_within(
+        self,
+        rows: np.ndarray,
+        lower: np.ndarray,
+        upper: np.ndarray,
+    ) -> t.Set[t.Tuple[int, int]]:
+        """Pairs of lines that cross within the given parameter intervals of
+        both lines.
+        """
+        if len(rows) < 2:
+            return set()
+
+        line_ends = self._line_table.ends.data[rows]
+        params, unstable = _cross_params(line_ends, line_ends)
+        slack = _PARAM_SLACK * (1 + np.maximum(np.abs(lower), np.abs(upper)))
+        within = (params >= (lower - slack)[:, None]) & (
+            params <= (upper + slack)[:, None]
+        )
+        within |= unstable
+        both = within & within.T
+        i1, i2 = np.nonzero(np.triu(both, k=1))
+        return set(zip(rows[i1].tolist(), rows[i2].tolist()))
+
+    def _crosses_on_new_line(self, row: int) -> t.Set[t.Tuple[int, int]]:
+        """Pairs of a new line and lines that cross it inside any eterm.
+
+        Both lines of a vertex reach the eterm that contains it, same as in
+        `flat.find_vertices_clipped()`. So only lines reaching the eterms
+        that the new line reaches are crossed with it.
+        """
+        line = self._line_table.ends.data[row]
+        candidates = set()
+        for eterm in self._line_index.eterms_crossed_by(row):
+            others, lower, upper = self._lines_reaching(eterm)
+            (at,) = np.nonzero(others == row)
+            if len(at) == 0:
+                # The new line crosses the reach box, but not the eterm.
+                continue
+
+            params, unstable = _cross_params(
+                line[None], self._line_table.ends.data[others]
+            )
+            line_lower, line_upper = float(lower[at[0]]), float(upper[at[0]])
+            slack = _PARAM_SLACK * (1 + max(abs(line_lower), abs(line_upper)))
+            within = (params[0] >= line_lower - slack) & (
+                params[0] <= line_upper + slack
+            )
+            within |= unstable[0]
+            candidates.update(
+                (min(row, other), max(row, other))
+                for other in others[within].tolist()
+                if other != row
+            )
+        return candidates
+
+
+def _key(keyed: t.Tuple[t.Any, t.Any]) -> t.Any:
+    return keyed[0]
+
+
+def _offset(keyed_line: t.Tuple[int, t.Tuple[int, float, float]]) -> float:
+    return keyed_line[1][1]
+
+
+def _box_corners(box: flat.Box) -> np.ndarray:
+    return np.array(
+        [
+            [box.min_x, box.min_y],
+            [box.min_x, box.max_y],
+            [box.max_x, box.min_y],
+            [box.max_x, box.max_y],
+        ],
+        dtype=np.float64,
+    )
+
+
+def _radius(points: np.ndarray) -> float:
+    return float(np.hypot(points[:, 0], points[:, 1]).max())
+
+
+def _cross_params(
+    lines: np.ndarray, others: np.ndarray
+) -> t.Tuple[np.ndarray, np.ndarray]:
+    """Parameters `t` of the points where `lines` cross `others`. Line `i` is
+    parametrized as `p1_i + t * (p2_i - p1_i)`.
+
+    Returns:
+        [n_lines x n_others] arrays:
+        - the parameters
+        - whether the lines are almost parallel, so the parameter can't be
+          trusted
+    """
+    a = lines[:, 0, :]
+    d = lines[:, 1, :] - lines[:, 0, :]
+    q = others[:, 0, :]
+    e = others[:, 1, :] - others[:, 0, :]
+
+    rel = a[:, None, :] - q[None, :, :]
+    # Z factor of the other halfspace at t=0, and its derivative over t.
+    z0 = e[None, :, 0] * rel[..., 1] - e[None, :, 1] * rel[..., 0]
+    dz = e[None, :, 0] * d[:, None, 1] - e[None, :, 1] * d[:, None, 0]
+
+    lengths = np.hypot(d[:, 0], d[:, 1])[:, None] * np.hypot(e[:, 0], e[:, 1])[None]
+    unstable = np.abs(dz) <= 1e-6 * lengths
+    with np.errstate(divide="ignore", invalid="ignore"):
+        params = -z0 / dz
+
+    return params, unstable
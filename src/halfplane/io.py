@@ -1,33 +1,295 @@
+"""
+JSON serialization of shapes.
+
+Formats:
+- a single JSON document with the eterms and, optionally, the vertices. See
+  `dump_shape()` and `load_shape()`.
+- line-delimited JSON, one eterm per line after a header line. See
+  `dump_shape_lines()` and `iter_eterms()`. Files are read one line at a time,
+  so huge dumps can be processed without loading them whole.
+- binary `.npz`, see `dump_shape_npz()` and `load_shape_npz()`.
+
+In JSON, halfspaces are stored as
+`{"p1": {"x": .., "y": ..}, "p2": .., "type": "Hp"}`. Coordinates are numbers,
+except `Fraction`s, which are kept exact as `"numerator/denominator"` strings.
+"""
+
+import dataclasses
 import io
 import json
 import typing as t
+from fractions import Fraction
+
+import numpy as np
+
+from . import core, flat, table
+
+
+_HS_TYPES: t.Dict[str, t.Type[flat.Hs]] = {"Hp": flat.Hp, "Hpc": flat.Hpc}
+
+LINES_FORMAT = "halfplane-esum-lines"
+LINES_VERSION = 1
+
+
+def _coord_to_json(coord: core.Coord) -> t.Union[int, float, str]:
+    if isinstance(coord, Fraction):
+        return f"{coord.numerator}/{coord.denominator}"
+    return coord
+
+
+def _coord_from_json(obj) -> core.Coord:
+    if isinstance(obj, str):
+        return Fraction(obj)
+    return obj
+
+
+def _pt_to_json(pt: flat.Pt) -> t.Dict[str, t.Union[int, float, str]]:
+    return {"x": _coord_to_json(pt.x), "y": _coord_to_json(pt.y)}
 
-from . import flat
-
-
-def dump_shape(esum: flat.Esum, vertices: t.Sequence[flat.X], f):
-    json.dump(
-        {
-            "esum": [
-                [
-                    {
-                        "p1": hs.p1._asdict(),
-                        "p2": hs.p2._asdict(),
-                        "type": type(hs).__name__,
-                    }
-                    for hs in term.hses
-                ]
-                for term in esum.eterms
-            ],
-            "vertices": [v.point._asdict() for v in vertices],
-        },
-        f,
-        indent=2,
-    )
 
+def _pt_from_json(obj) -> flat.Pt:
+    return flat.Pt(_coord_from_json(obj["x"]), _coord_from_json(obj["y"]))
 
-def dumps_shape(esum: flat.Esum, vertices: t.Sequence[flat.X]):
+
+def _hs_to_json(hs: flat.Hs) -> t.Dict[str, t.Any]:
+    return {
+        "p1": _pt_to_json(hs.p1),
+        "p2": _pt_to_json(hs.p2),
+        "type": type(hs).__name__,
+    }
+
+
+def _hs_from_json(obj) -> flat.Hs:
+    try:
+        hs_type = _HS_TYPES[obj["type"]]
+    except KeyError:
+        raise ValueError(f"Unknown halfspace type: {obj.get('type')!r}")
+    return hs_type(_pt_from_json(obj["p1"]), _pt_from_json(obj["p2"]))
+
+
+def _eterm_to_json(eterm: flat.Eterm) -> t.List[t.Dict[str, t.Any]]:
+    return [_hs_to_json(hs) for hs in eterm.hses]
+
+
+def _eterm_from_json(obj) -> flat.Eterm:
+    return flat.Eterm.from_hses(*map(_hs_from_json, obj))
+
+
+def dump_shape(esum: flat.Esum, vertices: t.Optional[t.Sequence[flat.X]], f):
+    """Writes the shape as a single JSON document. `f` is a text file."""
+    doc: t.Dict[str, t.Any] = {
+        "esum": [_eterm_to_json(term) for term in esum.eterms],
+    }
+    if esum.name is not None:
+        doc["name"] = esum.name
+    if vertices is not None:
+        doc["vertices"] = [_pt_to_json(v.point) for v in vertices]
+    json.dump(doc, f, indent=2)
+
+
+def dumps_shape(
+    esum: flat.Esum, vertices: t.Optional[t.Sequence[flat.X]] = None
+) -> str:
     buf = io.StringIO()
     dump_shape(esum, vertices, buf)
     buf.seek(0)
     return buf.read()
+
+
+def load_shape(f) -> t.Tuple[flat.Esum, t.List[flat.Pt]]:
+    """Reads a document written by `dump_shape()`.
+
+    Returns:
+        The esum and the vertex points. Vertices are only stored as points, so
+        they can't be turned back into `X`s. Empty if they weren't dumped.
+    """
+    doc = json.load(f)
+    esum = flat.Esum(
+        eterms=flat.FOSet(map(_eterm_from_json, doc["esum"])), name=doc.get("name")
+    )
+    return esum, [_pt_from_json(obj) for obj in doc.get("vertices", [])]
+
+
+def loads_shape(text: str) -> t.Tuple[flat.Esum, t.List[flat.Pt]]:
+    return load_shape(io.StringIO(text))
+
+
+def dump_shape_lines(esum: flat.Esum, f):
+    """Writes the shape as line-delimited JSON. The first line is a header,
+    each following line is a single eterm.
+    """
+    header = {"format": LINES_FORMAT, "version": LINES_VERSION, "name": esum.name}
+    f.write(json.dumps(header) + "\n")
+    for term in esum.eterms:
+        f.write(json.dumps(_eterm_to_json(term)) + "\n")
+
+
+def _read_lines_header(f) -> t.Dict[str, t.Any]:
+    header = json.loads(f.readline() or "null")
+    if not isinstance(header, dict) or header.get("format") != LINES_FORMAT:
+        raise ValueError("Not a line-delimited halfplane shape")
+    if header.get("version") != LINES_VERSION:
+        raise ValueError(f"Unsupported format version: {header.get('version')}")
+    return header
+
+
+def _iter_eterm_lines(f) -> t.Iterator[flat.Eterm]:
+    # The header is line 1.
+    for line_i, line in enumerate(f, start=2):
+        if not line.strip():
+            continue
+        try:
+            obj = json.loads(line)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Broken eterm on line {line_i}: {e}") from e
+        yield _eterm_from_json(obj)
+
+
+def iter_eterms(f) -> t.Iterator[flat.Eterm]:
+    """Yields eterms of a file written by `dump_shape_lines()`, one at a time.
+    Only the current line is kept in memory.
+    """
+    _read_lines_header(f)
+    yield from _iter_eterm_lines(f)
+
+
+def load_shape_lines(f) -> flat.Esum:
+    """Reads a whole file written by `dump_shape_lines()`."""
+    header = _read_lines_header(f)
+    return flat.Esum(eterms=flat.FOSet(_iter_eterm_lines(f)), name=header.get("name"))
+
+
+NPZ_VERSION = 1
+
+
+@dataclasses.dataclass(frozen=True, eq=False)
+class ShapeArrays(table.HsTable):
+    """Array form of a shape. The esum's `table.HsTable`, vertices and
+    segments refer to its rows by index.
+    """
+
+    vertices: t.Optional[np.ndarray] = None
+    "[n_vertices x 2] int32 array of halfspace indices, `X(hs1, hs2)`."
+
+    segments: t.Optional[np.ndarray] = None
+    "[n_segments x 3] int32 array of halfspace indices, `XSegment(hs1, common, hs3)`."
+
+    @classmethod
+    def from_esum(
+        cls,
+        esum: flat.Esum,
+        vertices: t.Optional[t.Sequence[flat.X]] = None,
+        segments: t.Optional[t.Sequence[flat.XSegment]] = None,
+    ) -> "ShapeArrays":
+        """Raises ValueError if a vertex or segment uses a halfspace that isn't
+        a part of the esum.
+        """
+        hs_ids: t.Dict[flat.Hs, int] = {}
+        for hs_i, hs in enumerate(hs for eterm in esum.eterms for hs in eterm.hses):
+            hs_ids.setdefault(hs, hs_i)
+
+        def _ids(hses: t.Iterable[flat.Hs]) -> t.List[int]:
+            try:
+                return [hs_ids[hs] for hs in hses]
+            except KeyError as e:
+                raise ValueError(f"Halfspace isn't a part of the esum: {e}") from e
+
+        hs_table = table.HsTable.from_esum(esum)
+        return cls(
+            endpoints=hs_table.endpoints,
+            closed=hs_table.closed,
+            eterm_offsets=hs_table.eterm_offsets,
+            name=hs_table.name,
+            vertices=None
+            if vertices is None
+            else np.array(
+                [_ids((x.hs1, x.hs2)) for x in vertices], dtype=np.int32
+            ).reshape(-1, 2),
+            segments=None
+            if segments is None
+            else np.array(
+                [_ids((seg.hs1, seg.common_hs, seg.hs3)) for seg in segments],
+                dtype=np.int32,
+            ).reshape(-1, 3),
+        )
+
+    def to_objects(
+        self,
+    ) -> t.Tuple[
+        flat.Esum, t.Optional[t.List[flat.X]], t.Optional[t.List[flat.XSegment]]
+    ]:
+        """The esum, the vertices and the segments. They share halfspace
+        objects. Vertices and segments are None if they weren't stored.
+        """
+        hses = self.hses()
+        esum = flat.Esum(eterms=flat.FOSet(self._split_eterms(hses)), name=self.name)
+        vertices = (
+            None
+            if self.vertices is None
+            else [flat.X(hses[i], hses[j]) for i, j in self.vertices.tolist()]
+        )
+        segments = (
+            None
+            if self.segments is None
+            else [
+                flat.XSegment(*(hses[i] for i in ids))
+                for ids in self.segments.tolist()
+            ]
+        )
+        return esum, vertices, segments
+
+
+def dump_shape_npz(
+    esum: flat.Esum,
+    vertices: t.Optional[t.Sequence[flat.X]],
+    segments: t.Optional[t.Sequence[flat.XSegment]],
+    f,
+    compress: bool = False,
+):
+    """Writes the shape as `.npz`. Coordinates are stored as float64, so
+    `Fraction`s are rounded.
+
+    Args:
+        vertices: e.g. the result of `flat.find_vertices()`.
+        segments: e.g. the result of `flat.detect_boundary()`.
+        f: path or binary file.
+    """
+    shape = ShapeArrays.from_esum(esum, vertices=vertices, segments=segments)
+    arrays = {
+        "version": np.array(NPZ_VERSION),
+        "endpoints": shape.endpoints,
+        "closed": shape.closed,
+        "offsets": shape.eterm_offsets,
+    }
+    if shape.name is not None:
+        arrays["name"] = np.array(shape.name)
+    if shape.vertices is not None:
+        arrays["vertices"] = shape.vertices
+    if shape.segments is not None:
+        arrays["segments"] = shape.segments
+    (np.savez_compressed if compress else np.savez)(f, **arrays)
+
+
+def load_shape_npz(f) -> ShapeArrays:
+    """Reads a file written by `dump_shape_npz()`. Only the arrays are read,
+    use `ShapeArrays.to_objects()` to get the esum.
+    """
+    with np.load(f, allow_pickle=False) as data:
+        if "version" not in data.files:
+            raise ValueError("Not a halfplane shape file")
+        version = int(data["version"])
+        if version != NPZ_VERSION:
+            raise ValueError(f"Unsupported format version: {version}")
+
+        def _optional(key):
+            return data[key] if key in data.files else None
+
+        name = _optional("name")
+        return ShapeArrays(
+            endpoints=data["endpoints"],
+            closed=data["closed"],
+            eterm_offsets=data["offsets"],
+            vertices=_optional("vertices"),
+            segments=_optional("segments"),
+            name=None if name is None else str(name),
+        )
@@ -0,0 +1,252 @@
+"""
+Boundary detection of many independent shapes, spread over worker processes.
+
+Shapes don't travel to the workers as pickled object graphs. All esums are
+packed into a single shared memory block, one `table.HsTable` plus offsets of
+each esum's eterms (see `SharedEsums`). Workers attach to it and only
+receive its name and the range of esums to process. The detected boundaries
+come back as flat numpy arrays. Names and debug names are not transferred.
+"""
+
+import concurrent.futures
+import contextlib
+import dataclasses
+import math
+import os
+import typing as t
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from . import core, flat, table
+
+
+@dataclasses.dataclass(frozen=True)
+class SharedEsumsHandle:
+    """Everything needed to attach to a `SharedEsums` block. Cheap to pickle."""
+
+    name: str
+    n_hses: int
+    n_eterms: int
+    n_esums: int
+
+
+def _block_layout(
+    n_hses: int, n_eterms: int, n_esums: int
+) -> t.Dict[str, t.Tuple[int, np.dtype, t.Tuple[int, ...]]]:
+    """Offset, dtype and shape of each array in the block. 8-byte arrays go
+    first, so all of them are aligned.
+    """
+    arrays = [
+        ("endpoints", np.dtype(np.float64), (n_hses, 2, 2)),
+        ("eterm_offsets", np.dtype(np.int64), (n_eterms + 1,)),
+        ("esum_offsets", np.dtype(np.int64), (n_esums + 1,)),
+        ("closed", np.dtype(bool), (n_hses,)),
+    ]
+    layout = {}
+    offset = 0
+    for name, dtype, shape in arrays:
+        layout[name] = (offset, dtype, shape)
+        offset += dtype.itemsize * math.prod(shape)
+    return layout
+
+
+def _block_views(
+    buf: memoryview, handle: SharedEsumsHandle
+) -> t.Dict[str, np.ndarray]:
+    return {
+        name: np.ndarray(shape, dtype=dtype, buffer=buf, offset=offset)
+        for name, (offset, dtype, shape) in _block_layout(
+            handle.n_hses, handle.n_eterms, handle.n_esums
+        ).items()
+    }
+
+
+class SharedEsumsView:
+    """Esums of an attached block. The arrays point into the shared memory, so
+    they are only valid until the block is detached.
+    """
+
+    def __init__(self, arrays: t.Dict[str, np.ndarray]):
+        self._arrays: t.Optional[t.Dict[str, np.ndarray]] = arrays
+
+    def __len__(self) -> int:
+        return len(self._arrays["esum_offsets"]) - 1
+
+    def table(self, esum_i: int) -> table.HsTable:
+        """Same as `Esum.table` of the esum, without the name. The halfspace
+        arrays are views, not copies.
+        """
+        esum_offsets = self._arrays["esum_offsets"]
+        eterm_offsets = self._arrays["eterm_offsets"]
+        first, last = esum_offsets[esum_i], esum_offsets[esum_i + 1]
+        offsets = eterm_offsets[first : last + 1]
+        start, stop = offsets[0], offsets[-1]
+        return table.HsTable(
+            endpoints=self._arrays["endpoints"][start:stop],
+            closed=self._arrays["closed"][start:stop],
+            eterm_offsets=offsets - start,
+        )
+
+    def esum(self, esum_i: int) -> flat.Esum:
+        return self.table(esum_i).to_esum()
+
+    def _release(self):
+        self._arrays = None
+
+
+class SharedEsums:
+    """
+    Esums packed into one `multiprocessing.shared_memory` block. The creating
+    process owns the block and removes it in `close()`, other processes use
+    `attach()` with the `handle`.
+
+    Usage:
+        with SharedEsums(esums) as shared:
+            executor.submit(work, shared.handle, range(10, 20))
+
+        def work(handle, esum_ids):
+            with attach(handle) as view:
+                esums = [view.esum(i) for i in esum_ids]
+    """
+
+    def __init__(self, esums: t.Sequence[flat.Esum]):
+        packed = table.HsTable.from_eterms(
+            eterm for esum in esums for eterm in esum.eterms
+        )
+        esum_offsets = np.cumsum(
+            [0, *(len(esum.eterms) for esum in esums)], dtype=np.int64
+        )
+        layout = _block_layout(packed.n_hses, packed.n_eterms, len(esums))
+        size = max(
+            offset + dtype.itemsize * math.prod(shape)
+            for offset, dtype, shape in layout.values()
+        )
+
+        # Zero-size blocks aren't allowed.
+        shm = shared_memory.SharedMemory(create=True, size=max(size, 1))
+        try:
+            self.handle = SharedEsumsHandle(
+                name=shm.name,
+                n_hses=packed.n_hses,
+                n_eterms=packed.n_eterms,
+                n_esums=len(esums),
+            )
+            views = _block_views(shm.buf, self.handle)
+            views["endpoints"][:] = packed.endpoints
+            views["closed"][:] = packed.closed
+            views["eterm_offsets"][:] = packed.eterm_offsets
+            views["esum_offsets"][:] = esum_offsets
+            del views
+        except BaseException:
+            # Nobody else knows the name yet, so the block would never be
+            # removed.
+            views = None
+            shm.close()
+            shm.unlink()
+            raise
+        self._shm = shm
+
+    def close(self):
+        """Detaches and removes the block. Attached processes keep their
+        mappings until they detach.
+        """
+        if self._shm is None:
+            return
+        self._shm.close()
+        self._shm.unlink()
+        self._shm = None
+
+    def __enter__(self) -> "SharedEsums":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+@contextlib.contextmanager
+def attach(handle: SharedEsumsHandle) -> t.Iterator[SharedEsumsView]:
+    """Maps the block of a `SharedEsums` without copying it."""
+    shm = shared_memory.SharedMemory(name=handle.name)
+    view = SharedEsumsView(_block_views(shm.buf, handle))
+    try:
+        yield view
+    finally:
+        # Views into the buffer have to be gone before it can be closed.
+        view._release()
+        del view
+        shm.close()
+
+
+def _detect_chunk(
+    handle: SharedEsumsHandle, esum_ids: range, robust: bool
+) -> t.List[t.Dict[str, np.ndarray]]:
+    with attach(handle) as view:
+        esums = [view.esum(esum_i) for esum_i in esum_ids]
+    # Workers don't inherit the caller's predicate mode.
+    with core.robust_predicates(robust):
+        return [table.segments_to_arrays(flat.detect_boundary(esum)) for esum in esums]
+
+
+def _chunk_ranges(n: int, chunksize: int) -> t.List[range]:
+    return [range(start, min(start + chunksize, n)) for start in range(0, n, chunksize)]
+
+
+def iter_detect_boundary_many(
+    esums: t.Iterable[flat.Esum],
+    workers: t.Optional[int] = None,
+    chunksize: t.Optional[int] = None,
+) -> t.Iterator[t.Tuple[int, t.List[flat.XSegment]]]:
+    """Yields `(esum_index, segments)` pairs, in the order the chunks complete.
+
+    Args:
+        esums: shapes to process. `NotEsum`s are expanded first.
+        workers: number of processes. Defaults to the number of CPUs. With 1,
+            everything runs in the calling process.
+        chunksize: number of esums sent to a worker at once. Defaults to about
+            4 chunks per worker, so a few slow shapes don't leave workers idle.
+    """
+    esums = [
+        esum.expand() if isinstance(esum, flat.NotEsum) else esum for esum in esums
+    ]
+    workers = workers or os.cpu_count() or 1
+
+    if workers == 1:
+        for esum_i, esum in enumerate(esums):
+            yield esum_i, flat.detect_boundary(esum)
+        return
+
+    if chunksize is None:
+        chunksize = max(1, math.ceil(len(esums) / (workers * 4)))
+    chunks = _chunk_ranges(len(esums), chunksize)
+
+    with SharedEsums(esums) as shared, concurrent.futures.ProcessPoolExecutor(
+        max_workers=workers
+    ) as executor:
+        futures = {
+            executor.submit(
+                _detect_chunk, shared.handle, chunk, core.settings.robust
+            ): chunk
+            for chunk in chunks
+        }
+        for future in concurrent.futures.as_completed(futures):
+            for esum_i, segment_arrays in zip(futures[future], future.result()):
+                yield esum_i, table.segments_from_arrays(**segment_arrays)
+
+
+def detect_boundary_many(
+    esums: t.Iterable[flat.Esum],
+    workers: t.Optional[int] = None,
+    chunksize: t.Optional[int] = None,
+) -> t.List[t.List[flat.XSegment]]:
+    """`flat.detect_boundary()` for every esum. Results are in input order.
+
+    See `iter_detect_boundary_many()` for the arguments.
+    """
+    esums = list(esums)
+    results: t.List[t.Optional[t.List[flat.XSegment]]] = [None] * len(esums)
+    for esum_i, segments in iter_detect_boundary_many(
+        esums, workers=workers, chunksize=chunksize
+    ):
+        results[esum_i] = segments
+    return results
@@ -17,7 +17,9 @@ def _datapoints(esum: Esum, x_iter, y_iter) -> np.ndarray:
     - col 1: y coordinate
     - col 2: inside esum or not (bool)
     """
-    return np.array([[x, y, esum.contains(Pt(x, y))] for x in x_iter for y in y_iter])
+    xs, ys = np.meshgrid(np.asarray(x_iter), np.asarray(y_iter), indexing="ij")
+    pts = np.stack([xs.ravel(), ys.ravel()], axis=1).astype(np.float64)
+    return np.hstack([pts, esum.contains_many(pts)[:, None]])
 
 
 @functools.singledispatch
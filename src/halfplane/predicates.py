@@ -0,0 +1,272 @@
+"""
+Robust geometric predicates, used by `flat` when `core.settings.robust` is set.
+
+Every predicate is evaluated in floating point first, together with a bound
+on the rounding error. Only when the result is too close to zero to trust its
+sign, it is evaluated again exactly. Inputs with `Fraction` coordinates always
+take the exact path. `int`s are treated as floats, so they need to fit in the
+53 bits of a float mantissa. NumPy scalars are converted to Python numbers
+first.
+
+The exact path scales all coordinates to integers with a common denominator
+and uses Python ints, which is a lot faster than `Fraction` arithmetic. The
+predicates are homogeneous polynomials, so scaling doesn't change their signs.
+
+Cross points don't need to be calculated to be tested. A cross of lines
+`p + t * u` and `q + s * v` is at `p + u * tn / d`, where
+`d = u x v` and `tn = (q - p) x v`. The orientation of a halfspace `h + r * w`
+at the cross is `(c1 * d + c2 * tn) / d`, with `c1 = w x (p - h)` and
+`c2 = w x u`. The signs of both polynomials give the exact answer.
+"""
+
+import math
+import typing as t
+from fractions import Fraction
+
+import numpy as np
+
+from .core import Coord
+
+
+_EPS = 2.0**-53
+
+
+def error_bound(depth: int, magnitude: float) -> float:
+    """Bound on the rounding error of a float polynomial. `magnitude` is the
+    same polynomial evaluated with absolute values of all terms, `depth` is
+    the longest chain of operations. Twice the textbook `depth * eps`.
+    """
+    return 2 * depth * _EPS * magnitude
+
+
+def _sign(value) -> int:
+    return (value > 0) - (value < 0)
+
+
+_FLOAT_TYPES = {float, int}
+
+
+def _plain(coords: t.Iterable[Coord]) -> t.List[Coord]:
+    """NumPy scalars as Python numbers, so fixed-width ints can't overflow and
+    both ints and floats have `as_integer_ratio()`.
+    """
+    return [c.item() if isinstance(c, np.generic) else c for c in coords]
+
+
+def _is_exact(coords: t.Iterable[Coord]) -> bool:
+    return not {type(c) for c in coords} <= _FLOAT_TYPES
+
+
+def _scaled_ints(coords: t.Sequence[Coord]) -> t.List[int]:
+    """Coordinates multiplied by their common denominator."""
+    ratios = [c.as_integer_ratio() for c in coords]
+    denominator = math.lcm(*(den for _, den in ratios))
+    return [num * (denominator // den) for num, den in ratios]
+
+
+def orient(ax: Coord, ay: Coord, bx: Coord, by: Coord, cx: Coord, cy: Coord) -> int:
+    """Sign of `(b - a) x (c - a)`. Positive if `c` is on the left of `a -> b`."""
+    ax, ay, bx, by, cx, cy = _plain((ax, ay, bx, by, cx, cy))
+    if not _is_exact((ax, ay, bx, by, cx, cy)):
+        left = (bx - ax) * (cy - ay)
+        right = (by - ay) * (cx - ax)
+        det = left - right
+        if abs(det) > error_bound(3, abs(left) + abs(right)):
+            return _sign(det)
+
+    ax, ay, bx, by, cx, cy = _scaled_ints((ax, ay, bx, by, cx, cy))
+    return _sign((bx - ax) * (cy - ay) - (by - ay) * (cx - ax))
+
+
+def orient_hs(hs, pt) -> int:
+    """Sign of the z factor of the point. See `flat._z_factor()`."""
+    return orient(hs.p1.x, hs.p1.y, hs.p2.x, hs.p2.y, pt.x, pt.y)
+
+
+def _x_orient_terms_float(
+    coords: t.Sequence[Coord],
+) -> t.Tuple[float, float, float, float]:
+    """`(n, n_magnitude, d, d_magnitude)`. The orientation is `sign(n * d)`.
+
+    Args:
+        coords: coordinates of the tested halfspace and the cross' halfspaces,
+            see `_hs_coords()`.
+    """
+    hx, hy, h2x, h2y, px, py, p2x, p2y, qx, qy, q2x, q2y = coords
+    ux, uy = p2x - px, p2y - py
+    vx, vy = q2x - qx, q2y - qy
+    qpx, qpy = qx - px, qy - py
+    wx, wy = h2x - hx, h2y - hy
+    phx, phy = px - hx, py - hy
+
+    d_l, d_r = ux * vy, uy * vx
+    tn_l, tn_r = qpx * vy, qpy * vx
+    c1_l, c1_r = wx * phy, wy * phx
+    c2_l, c2_r = wx * uy, wy * ux
+    d, tn, c1, c2 = d_l - d_r, tn_l - tn_r, c1_l - c1_r, c2_l - c2_r
+
+    d_mag = abs(d_l) + abs(d_r)
+    n_mag = (abs(c1_l) + abs(c1_r)) * d_mag + (abs(c2_l) + abs(c2_r)) * (
+        abs(tn_l) + abs(tn_r)
+    )
+    return c1 * d + c2 * tn, n_mag, d, d_mag
+
+
+def _x_orient_terms_exact(
+    coords: t.Sequence[int],
+) -> t.Tuple[int, int]:
+    """`(n, d)`, exact. The orientation is `sign(n * d)`.
+
+    Args:
+        coords: scaled coordinates of the tested halfspace and the cross'
+            halfspaces, see `_hs_coords()`.
+    """
+    hx, hy, h2x, h2y, px, py, p2x, p2y, qx, qy, q2x, q2y = coords
+    ux, uy = p2x - px, p2y - py
+    vx, vy = q2x - qx, q2y - qy
+    wx, wy = h2x - hx, h2y - hy
+    d = ux * vy - uy * vx
+    tn = (qx - px) * vy - (qy - py) * vx
+    c1 = wx * (py - hy) - wy * (px - hx)
+    c2 = wx * uy - wy * ux
+    return c1 * d + c2 * tn, d
+
+
+def _hs_coords(*hses) -> t.List[Coord]:
+    return _plain(c for hs in hses for pt in (hs.p1, hs.p2) for c in (pt.x, pt.y))
+
+
+def orient_x(hs, x) -> t.Optional[int]:
+    """Sign of the z factor of the cross point, without rounding the point.
+    None if the cross' halfspaces are parallel.
+    """
+    coords = _hs_coords(hs, x.hs1, x.hs2)
+    if not _is_exact(coords):
+        n, n_mag, d, d_mag = _x_orient_terms_float(coords)
+        if abs(d) > error_bound(3, d_mag) and abs(n) > error_bound(6, n_mag):
+            return _sign(n) * _sign(d)
+
+    n, d = _x_orient_terms_exact(_scaled_ints(coords))
+    if d == 0:
+        return None
+    return _sign(n) * _sign(d)
+
+
+def orient_mid(hs, x1, x2) -> t.Optional[int]:
+    """Sign of the z factor of the midpoint between two cross points. None if
+    either cross is made of parallel halfspaces.
+
+    With `n_i / d_i` being the orientation at each cross, the orientation at
+    the midpoint is `(n1 * d2 + n2 * d1) / (2 * d1 * d2)`.
+    """
+    coords = _hs_coords(hs, x1.hs1, x1.hs2, hs, x2.hs1, x2.hs2)
+    if not _is_exact(coords):
+        n1, n1_mag, d1, d1_mag = _x_orient_terms_float(coords[:12])
+        n2, n2_mag, d2, d2_mag = _x_orient_terms_float(coords[12:])
+        n = n1 * d2 + n2 * d1
+        n_mag = n1_mag * d2_mag + n2_mag * d1_mag
+        if (
+            abs(d1) > error_bound(3, d1_mag)
+            and abs(d2) > error_bound(3, d2_mag)
+            and abs(n) > error_bound(9, n_mag)
+        ):
+            return _sign(n) * _sign(d1) * _sign(d2)
+
+    coords = _scaled_ints(coords)
+    n1, d1 = _x_orient_terms_exact(coords[:12])
+    n2, d2 = _x_orient_terms_exact(coords[12:])
+    if d1 == 0 or d2 == 0:
+        return None
+    return _sign(n1 * d2 + n2 * d1) * _sign(d1) * _sign(d2)
+
+
+def _x_orient_terms_batch(
+    hs_ends: np.ndarray, x_ends: np.ndarray
+) -> t.Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Batched `_x_orient_terms_float()`.
+
+    Args:
+        hs_ends: [n_hses x 2 x 2] array of the tested halfspaces.
+        x_ends: [n_xs x 2 x 2 x 2] array. Both halfspaces of each cross.
+    Returns:
+        `n` and `n_magnitude` as [n_hses x n_xs] arrays, `d` and `d_magnitude`
+        as [n_xs] arrays.
+    """
+    p = x_ends[:, 0, 0]
+    u = x_ends[:, 0, 1] - p
+    v = x_ends[:, 1, 1] - x_ends[:, 1, 0]
+    qp = x_ends[:, 1, 0] - p
+    h = hs_ends[:, 0]
+    w = hs_ends[:, 1] - h
+    ph = p[None, :, :] - h[:, None, :]
+
+    d_l, d_r = u[:, 0] * v[:, 1], u[:, 1] * v[:, 0]
+    tn_l, tn_r = qp[:, 0] * v[:, 1], qp[:, 1] * v[:, 0]
+    c1_l, c1_r = w[:, None, 0] * ph[..., 1], w[:, None, 1] * ph[..., 0]
+    c2_l, c2_r = w[:, None, 0] * u[None, :, 1], w[:, None, 1] * u[None, :, 0]
+    d, tn, c1, c2 = d_l - d_r, tn_l - tn_r, c1_l - c1_r, c2_l - c2_r
+
+    d_mag = np.abs(d_l) + np.abs(d_r)
+    n_mag = (np.abs(c1_l) + np.abs(c1_r)) * d_mag + (np.abs(c2_l) + np.abs(c2_r)) * (
+        np.abs(tn_l) + np.abs(tn_r)
+    )
+    return c1 * d + c2 * tn, n_mag, d, d_mag
+
+
+def orient_mid_batch(
+    hs_ends: np.ndarray, x1_ends: np.ndarray, x2_ends: np.ndarray
+) -> t.Tuple[np.ndarray, np.ndarray]:
+    """Float part of `orient_mid()` for many halfspaces and segments.
+
+    Args:
+        hs_ends: [n_hses x 2 x 2] array of the tested halfspaces.
+        x1_ends, x2_ends: [n_segments x 2 x 2 x 2] arrays. Halfspaces of the
+            segments' endpoint crosses.
+    Returns:
+        [n_hses x n_segments] arrays:
+        - signs, valid where not ambiguous
+        - ambiguous entries, these need `orient_mid()`
+    """
+    n1, n1_mag, d1, d1_mag = _x_orient_terms_batch(hs_ends, x1_ends)
+    n2, n2_mag, d2, d2_mag = _x_orient_terms_batch(hs_ends, x2_ends)
+    n = n1 * d2[None, :] + n2 * d1[None, :]
+    n_mag = n1_mag * d2_mag[None, :] + n2_mag * d1_mag[None, :]
+
+    signs = (np.sign(n) * np.sign(d1 * d2)[None, :]).astype(np.int8)
+    ambiguous = (
+        (np.abs(n) <= error_bound(9, n_mag))
+        | (np.abs(d1) <= error_bound(3, d1_mag))[None, :]
+        | (np.abs(d2) <= error_bound(3, d2_mag))[None, :]
+    )
+    return signs, ambiguous
+
+
+def intersection(hs1, hs2) -> t.Optional[t.Tuple[Coord, Coord]]:
+    """Cross point of the halfspaces' lines, None if they are parallel.
+
+    Uses the parametric form instead of slope and intercept, so it's as precise
+    for vertical lines as for any other. Exact for `Fraction` coordinates.
+    """
+    coords = _hs_coords(hs1, hs2)
+    exact = _is_exact(coords)
+    if not exact:
+        px, py, p2x, p2y, qx, qy, q2x, q2y = coords
+        ux, uy = p2x - px, p2y - py
+        vx, vy = q2x - qx, q2y - qy
+        d_l, d_r = ux * vy, uy * vx
+        d = d_l - d_r
+        if abs(d) > error_bound(3, abs(d_l) + abs(d_r)):
+            tn = (qx - px) * vy - (qy - py) * vx
+            return px + ux * (tn / d), py + uy * (tn / d)
+
+    # Parallel or almost parallel. Only the exact determinant can tell.
+    px, py, p2x, p2y, qx, qy, q2x, q2y = map(Fraction, coords)
+    ux, uy = p2x - px, p2y - py
+    vx, vy = q2x - qx, q2y - qy
+    d = ux * vy - uy * vx
+    if d == 0:
+        return None
+
+    tn = (qx - px) * vy - (qy - py) * vx
+    x, y = px + ux * tn / d, py + uy * tn / d
+    return (x, y) if exact else (float(x), float(y))
@@ -0,0 +1,264 @@
+"""
+Links boundary segments into closed rings.
+
+Segments are joined through their shared `X` endpoints, so no coordinate
+matching is needed. Each segment is oriented with the shape on its left:
+outer rings go counter-clockwise, holes go clockwise.
+
+Special cases:
+- more than two lines crossing at a single point give several coincident
+  vertices. They are linked by zero-length boundary segments, and treated as
+  a single ring vertex.
+- segments with the shape on both sides, e.g. where two eterms share an
+  edge, are dropped.
+- lines shared by several halfspaces give duplicate segments. Only one of
+  them is kept.
+- where rings touch at a single vertex, the ring walk takes the leftmost
+  turn, which keeps the rings apart.
+"""
+
+import dataclasses
+import math
+import typing as t
+
+import numpy as np
+
+from . import core, flat, predicates
+
+
+@dataclasses.dataclass(frozen=True, eq=False)
+class Rings:
+    coords: np.ndarray
+    "[n_points x 2] float64 array. Vertices of all rings, one ring after another."
+
+    offsets: np.ndarray
+    "[n_rings + 1] int64 array. Ring i is `coords[offsets[i]:offsets[i + 1]]`."
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def ring(self, ring_i: int) -> np.ndarray:
+        return self.coords[self.offsets[ring_i] : self.offsets[ring_i + 1]]
+
+    def _next_coords(self) -> np.ndarray:
+        """Coordinates of the following vertex, wrapping around within rings."""
+        next_i = np.arange(1, len(self.coords) + 1)
+        next_i[self.offsets[1:] - 1] = self.offsets[:-1]
+        return self.coords[next_i]
+
+    def signed_areas(self) -> np.ndarray:
+        """[n_rings] array. Positive for outer rings, negative for holes."""
+        if len(self) == 0:
+            return np.zeros(0)
+        nxt = self._next_coords()
+        cross = self.coords[:, 0] * nxt[:, 1] - nxt[:, 0] * self.coords[:, 1]
+        return np.add.reduceat(cross, self.offsets[:-1]) / 2
+
+    @property
+    def is_hole(self) -> np.ndarray:
+        return self.signed_areas() < 0
+
+    def area(self) -> float:
+        return float(self.signed_areas().sum())
+
+    def perimeter(self) -> float:
+        if len(self) == 0:
+            return 0.0
+        return float(np.hypot(*(self._next_coords() - self.coords).T).sum())
+
+
+class _NodeIds:
+    """Union-find over the halfspace pairs of the vertices."""
+
+    def __init__(self):
+        self._parents: t.Dict[t.FrozenSet[flat.Hs], t.FrozenSet[flat.Hs]] = {}
+
+    def find(self, key):
+        root = key
+        while (parent := self._parents.setdefault(root, root)) != root:
+            root = parent
+        while key != root:
+            key, self._parents[key] = self._parents[key], root
+        return root
+
+    def union(self, key1, key2):
+        self._parents[self.find(key1)] = self.find(key2)
+
+
+@dataclasses.dataclass(frozen=True)
+class _Edge:
+    start: t.FrozenSet[flat.Hs]
+    end: t.FrozenSet[flat.Hs]
+    start_pt: flat.Pt
+    end_pt: flat.Pt
+
+    @property
+    def direction(self) -> t.Tuple[float, float]:
+        return self.end_pt.x - self.start_pt.x, self.end_pt.y - self.start_pt.y
+
+
+def _is_zero_length(pt1: flat.Pt, pt2: flat.Pt) -> bool:
+    scale = 1 + max(abs(pt1.x), abs(pt1.y), abs(pt2.x), abs(pt2.y))
+    return pt1.distance(pt2) <= 1e-9 * scale
+
+
+def _inside_side(esum: flat.Esum, seg: flat.XSegment, eps: float = 10e-7) -> int:
+    """Which side of the directed segment `x1 -> x2` the shape is on.
+
+    Looks at the eterms that contain the segment's midpoint with the loose
+    check. Their halfspaces that pass through the midpoint run along the
+    segment, and the eterm is on the inner side of them.
+
+    Returns:
+        1 if the shape is on the left, -1 if it's on the right, 0 if it's on
+        both sides or on neither.
+    """
+    pt1, pt2 = seg.x1.point, seg.x2.point
+    mid_pt = flat.Pt((pt1.x + pt2.x) / 2, (pt1.y + pt2.y) / 2)
+    dx, dy = pt2.x - pt1.x, pt2.y - pt1.y
+
+    on_left = on_right = False
+    for eterm in flat._eterms_near(esum, mid_pt):
+        on_line = _hses_through_mid(eterm, seg, mid_pt, eps)
+        if on_line is None:
+            continue
+
+        dots = [
+            (hs.p2.x - hs.p1.x) * dx + (hs.p2.y - hs.p1.y) * dy
+            for hs, through_mid in zip(eterm.hses, on_line)
+            if through_mid
+        ]
+        if len(dots) == 0:
+            # Strictly inside, the segment isn't a boundary at all.
+            return 0
+        if all(dot > 0 for dot in dots):
+            on_left = True
+        elif all(dot < 0 for dot in dots):
+            on_right = True
+
+    return int(on_left) - int(on_right)
+
+
+def _hses_through_mid(
+    eterm: flat.Eterm, seg: flat.XSegment, mid_pt: flat.Pt, eps: float
+) -> t.Optional[t.List[bool]]:
+    """Which of the eterm's halfspaces pass through the segment's midpoint.
+    None if the eterm doesn't contain the midpoint even with the loose check.
+
+    In the robust mode, the midpoint isn't rounded, see
+    `predicates.orient_mid()`.
+    """
+    if core.settings.robust:
+        signs = [
+            # The midpoint lies on the segment's own line.
+            0 if hs == seg.common_hs else predicates.orient_mid(hs, seg.x1, seg.x2)
+            for hs in eterm.hses
+        ]
+        if any(sign is None or sign < 0 for sign in signs):
+            return None
+        return [sign == 0 for sign in signs]
+
+    zs = [flat._z_factor(hs, mid_pt) for hs in eterm.hses]
+    if any(z <= -eps for z in zs):
+        return None
+    return [z <= eps for z in zs]
+
+
+def _turn_angle(incoming: _Edge, outgoing: _Edge) -> float:
+    ux, uy = incoming.direction
+    wx, wy = outgoing.direction
+    return math.atan2(ux * wy - uy * wx, ux * wx + uy * wy)
+
+
+def _is_straight(incoming: _Edge, outgoing: _Edge) -> bool:
+    ux, uy = incoming.direction
+    wx, wy = outgoing.direction
+    cross = ux * wy - uy * wx
+    return abs(cross) <= 1e-12 * math.hypot(ux, uy) * math.hypot(wx, wy) and (
+        ux * wx + uy * wy > 0
+    )
+
+
+def boundary_rings(
+    esum: t.Union[flat.Esum, flat.NotEsum],
+    segments: t.Optional[t.Sequence[flat.XSegment]] = None,
+    eps: float = 10e-7,
+) -> Rings:
+    """Links the boundary into closed rings. Collinear points are dropped.
+
+    Args:
+        esum: the shape. Used to tell the inner side of each segment.
+        segments: result of `flat.detect_boundary()` for `esum`. Calculated if
+            not given.
+    Raises:
+        ValueError: if the segments don't form closed rings. That's always the
+            case for unbounded shapes.
+    """
+    if isinstance(esum, flat.NotEsum):
+        esum = esum.expand()
+    if segments is None:
+        segments = flat.detect_boundary(esum)
+
+    node_ids = _NodeIds()
+    edges = []
+    for seg in segments:
+        key1, key2 = frozenset(seg.x1.halfspaces), frozenset(seg.x2.halfspaces)
+        pt1, pt2 = seg.x1.point, seg.x2.point
+        if _is_zero_length(pt1, pt2):
+            node_ids.union(key1, key2)
+            continue
+
+        side = _inside_side(esum, seg, eps)
+        if side > 0:
+            edges.append(_Edge(key1, key2, pt1, pt2))
+        elif side < 0:
+            edges.append(_Edge(key2, key1, pt2, pt1))
+
+    # Coincident vertices are known only after all segments were seen. Lines
+    # shared by several halfspaces give the same edge once per halfspace.
+    edges = list(
+        {
+            (start, end): dataclasses.replace(edge, start=start, end=end)
+            for edge in edges
+            for start, end in [(node_ids.find(edge.start), node_ids.find(edge.end))]
+        }.values()
+    )
+    outgoing: t.Dict[t.FrozenSet[flat.Hs], t.List[int]] = {}
+    for edge_i, edge in enumerate(edges):
+        outgoing.setdefault(edge.start, []).append(edge_i)
+
+    used = [False] * len(edges)
+    ring_coords = []
+    offsets = [0]
+    for first_i in range(len(edges)):
+        if used[first_i]:
+            continue
+
+        ring_edges = []
+        edge_i = first_i
+        while True:
+            used[edge_i] = True
+            ring_edges.append(edges[edge_i])
+            edge = edges[edge_i]
+            if edge.end == edges[first_i].start:
+                break
+
+            candidates = [i for i in outgoing.get(edge.end, []) if not used[i]]
+            if len(candidates) == 0:
+                raise ValueError(
+                    f"Boundary segments don't form a closed ring at {edge.end_pt}"
+                )
+            edge_i = max(candidates, key=lambda i: _turn_angle(edge, edges[i]))
+
+        points = [
+            (edge.start_pt.x, edge.start_pt.y)
+            for prev_edge, edge in zip(ring_edges[-1:] + ring_edges[:-1], ring_edges)
+            if not _is_straight(prev_edge, edge)
+        ]
+        ring_coords.extend(points)
+        offsets.append(len(ring_coords))
+
+    return Rings(
+        coords=np.array(ring_coords, dtype=np.float64).reshape(-1, 2),
+        offsets=np.array(offsets, dtype=np.int64),
+    )
@@ -1,3 +1,4 @@
+import dataclasses
 from pathlib import Path
 
 from .. import common_shapes, flat, io, plots
@@ -9,10 +10,10 @@ def _make_basic_shapes():
     return [
         triangle,
         rect,
-        rect.difference(triangle)._replace(name="rect \\ triangle"),
-        triangle.difference(rect)._replace(name="triagle \\ rect"),
-        rect.union(triangle)._replace(name="rect | triangle"),
-        rect.intersection(triangle)._replace(name="rect ^ triangle"),
+        dataclasses.replace(rect.difference(triangle), name="rect \\ triangle"),
+        dataclasses.replace(triangle.difference(rect), name="triagle \\ rect"),
+        dataclasses.replace(rect.union(triangle), name="rect | triangle"),
+        dataclasses.replace(rect.intersection(triangle), name="rect ^ triangle"),
     ]
 
 
@@ -34,15 +35,13 @@ def _plot(esum, vertices, path, name):
 def main():
     RESULTS_PATH.mkdir(exist_ok=True)
 
-    for shape_i, (esum, name) in enumerate(
-        [*_make_basic_shapes(), common_shapes.letter_c()]
-    ):
+    for shape_i, esum in enumerate([*_make_basic_shapes(), common_shapes.letter_c()]):
         vertices = flat.find_vertices(esum=esum)
 
         with open(RESULTS_PATH / f"shape_{shape_i}.json", "w") as f:
             io.dump_shape(esum=esum, vertices=vertices, f=f)
 
-        _plot(esum, vertices, RESULTS_PATH / f"shape_{shape_i}.png", name)
+        _plot(esum, vertices, RESULTS_PATH / f"shape_{shape_i}.png", esum.name)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,61 @@
+"""
+Hit-test benchmark. Compares a compiled BSP tree against evaluating the
+`Esum` term by term, one point at a time. Batches of points aren't timed,
+`CompiledEsum.contains_many()` runs `Esum.contains_many()`.
+
+Running:
+python -m halfplane.run.perf.bench_bsp 100
+"""
+import time
+from argparse import ArgumentParser
+
+import numpy as np
+
+from halfplane import flat, shape_gen
+
+
+def _timed(fn):
+    start_t = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start_t
+
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument("n", type=int, help="Size of the rect chain")
+    parser.add_argument("--n-points", type=int, default=100_000)
+    parser.add_argument("--n-scalar", type=int, default=10_000)
+    args = parser.parse_args()
+
+    esum = shape_gen.rect_union_chain(n=args.n)
+    compiled, compile_t = _timed(esum.compile)
+    print(
+        f"Compiled {len(esum.eterms)} eterms into {compiled.n_nodes} nodes, "
+        f"depth {compiled.depth}, in {compile_t:.3f}s"
+    )
+
+    rng = np.random.default_rng(0)
+    points = rng.uniform(-1.0, args.n + 5.0, size=(args.n_points, 2))
+    scalar_pts = [flat.Pt(x, y) for x, y in points[: args.n_scalar].tolist()]
+
+    ref_scalar, ref_scalar_t = _timed(
+        lambda: [flat._esum_contains_pt_strict(esum, pt) for pt in scalar_pts]
+    )
+    bsp_scalar, bsp_scalar_t = _timed(
+        lambda: [compiled.contains(pt) for pt in scalar_pts]
+    )
+    assert ref_scalar == bsp_scalar
+
+    assert (esum.contains_many(points) == compiled.contains_many(points)).all()
+
+    ref_us = ref_scalar_t / len(scalar_pts) * 1e6
+    bsp_us = bsp_scalar_t / len(scalar_pts) * 1e6
+    print(f"{'':>10} {'esum':>12} {'bsp':>12} {'speedup':>8}")
+    print(
+        f"{'scalar':>10} {ref_us:>9.3f} us {bsp_us:>9.3f} us "
+        f"{ref_scalar_t / bsp_scalar_t:>7.1f}x"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,6 @@
 from pathlib import Path
 
-from .. import common_shapes, flat, plots, shape_gen
+from .. import cache, common_shapes, flat, plots, shape_gen
 
 RESULTS_PATH = Path("./data/segments")
 
@@ -22,6 +22,7 @@ def _plot(esum, vertices, segments, path, name):
 
 def main():
     RESULTS_PATH.mkdir(exist_ok=True, parents=True)
+    disk_cache = cache.cache_from_env()
 
     for shape_i, esum in enumerate(
         [
@@ -35,8 +36,7 @@ def main():
         ]
     ):
         vertices = flat.find_vertices(esum=esum)
-        segments = flat.find_segments(vertices)
-        boundary_segments = flat.filter_segments(esum, segments)
+        boundary_segments = flat.detect_boundary(esum, cache=disk_cache)
 
         _plot(
             esum=esum,
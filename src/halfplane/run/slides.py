@@ -2,7 +2,7 @@ from pathlib import Path
 
 import matplotlib.pyplot as plt
 
-from .. import common_shapes, plots, flat
+from .. import cache, common_shapes, plots, flat
 
 RESULTS_PATH = Path("./data/slides")
 
@@ -43,6 +43,7 @@ def _plot_segments(esum, segments, path, name):
 
 def main():
     RESULTS_PATH.mkdir(exist_ok=True, parents=True)
+    disk_cache = cache.cache_from_env()
 
     for shape_i, esum in enumerate(
         [
@@ -59,7 +60,7 @@ def main():
             name=esum.name,
         )
 
-        segments = flat.detect_boundary(esum)
+        segments = flat.detect_boundary(esum, cache=disk_cache)
 
         _plot_segments(
             esum=esum,
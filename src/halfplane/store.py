@@ -0,0 +1,376 @@
+"""
+Shapes kept on disk and memory-mapped, for scenes that don't fit in RAM.
+
+A store is a directory with the raw little-endian arrays of a
+`table.HsTable`, plus the reach box of every eterm:
+- `endpoints.f64`: [n_hses x 2 x 2] halfspace endpoints
+- `closed.u1`: [n_hses] `Hpc` flags
+- `offsets.i64`: [n_eterms + 1] eterm offsets
+- `reach_boxes.f64`: [n_eterms x 4] `(min_x, min_y, max_x, max_y)` of each
+  eterm's `reach_box`. Unbounded eterms have infinite boxes.
+- `meta.json`: sizes, format version and the name. Written last.
+
+Queries first cull eterms with the reach boxes, which are small. Only the
+halfspace rows of the remaining eterms are read, so only their pages are
+loaded. A `ShapeStore` pickles as its path: every worker process maps the
+same files read-only, and the OS shares the pages between them.
+
+Usage:
+    store = ShapeStore.create("scene.store", io.iter_eterms(f))
+    inside = store.contains_many(points, tiles=16)
+    segments = store.detect_boundary(tiles=32)
+"""
+
+import concurrent.futures
+import itertools
+import json
+import math
+import os
+import typing as t
+from pathlib import Path
+
+import numpy as np
+
+from . import core, flat, table, tiled
+
+
+FORMAT = "halfplane-store"
+VERSION = 1
+
+_ENDPOINTS = ("endpoints.f64", np.dtype("<f8"), (2, 2))
+# Bytes of 0 or 1, same as numpy's bool.
+_CLOSED = ("closed.u1", np.dtype(bool), ())
+_OFFSETS = ("offsets.i64", np.dtype("<i8"), ())
+_REACH_BOXES = ("reach_boxes.f64", np.dtype("<f8"), (4,))
+
+
+def _box_row(box: t.Optional[flat.Box]) -> t.Tuple[float, float, float, float]:
+    if box is None:
+        return (-math.inf, -math.inf, math.inf, math.inf)
+    return (box.min_x, box.min_y, box.max_x, box.max_y)
+
+
+def _map_array(path: Path, dtype: np.dtype, row_shape: t.Tuple[int, ...], n: int):
+    if n == 0:
+        # Empty files can't be mapped.
+        return np.zeros((0, *row_shape), dtype=dtype)
+    return np.memmap(path, dtype=dtype, mode="r", shape=(n, *row_shape))
+
+
+class ShapeStore:
+    """Read-only, memory-mapped esum. See the module docs.
+
+    Args:
+        path: directory written by `ShapeStore.create()`.
+    """
+
+    def __init__(self, path: t.Union[str, Path]):
+        self.path = Path(path)
+        meta = json.loads((self.path / "meta.json").read_text())
+        if meta.get("format") != FORMAT:
+            raise ValueError(f"Not a shape store: {self.path}")
+        if meta.get("version") != VERSION:
+            raise ValueError(f"Unsupported store version: {meta.get('version')}")
+
+        n_hses, n_eterms = meta["n_hses"], meta["n_eterms"]
+        self.table = table.HsTable(
+            endpoints=_map_array(self.path / _ENDPOINTS[0], *_ENDPOINTS[1:], n_hses),
+            closed=_map_array(self.path / _CLOSED[0], *_CLOSED[1:], n_hses),
+            eterm_offsets=_map_array(
+                self.path / _OFFSETS[0], *_OFFSETS[1:], n_eterms + 1
+            ),
+            name=meta["name"],
+        )
+        self.reach_boxes = _map_array(
+            self.path / _REACH_BOXES[0], *_REACH_BOXES[1:], n_eterms
+        )
+
+    def __reduce__(self):
+        return (ShapeStore, (self.path,))
+
+    def __len__(self) -> int:
+        return len(self.reach_boxes)
+
+    @property
+    def name(self) -> t.Optional[str]:
+        return self.table.name
+
+    @classmethod
+    def create(
+        cls,
+        path: t.Union[str, Path],
+        eterms: t.Union[flat.Esum, t.Iterable[flat.Eterm]],
+        name: t.Optional[str] = None,
+        chunksize: int = 4096,
+    ) -> "ShapeStore":
+        """Writes a store. Eterms are consumed in chunks, so they can come from
+        a generator like `io.iter_eterms()` without being held in memory.
+
+        Args:
+            path: directory. Created if needed, existing files are replaced.
+            eterms: an esum or its eterms.
+            name: defaults to the esum's name.
+            chunksize: number of eterms processed at once.
+        """
+        if isinstance(eterms, flat.Esum):
+            name = name if name is not None else eterms.name
+            eterms = eterms.eterms
+
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        (path / "meta.json").unlink(missing_ok=True)
+
+        n_hses = n_eterms = 0
+        with open(path / _ENDPOINTS[0], "wb") as endpoints_f, open(
+            path / _CLOSED[0], "wb"
+        ) as closed_f, open(path / _OFFSETS[0], "wb") as offsets_f, open(
+            path / _REACH_BOXES[0], "wb"
+        ) as boxes_f:
+            offsets_f.write(np.zeros(1, dtype=_OFFSETS[1]).tobytes())
+            for chunk in _chunked(eterms, chunksize):
+                chunk_table = table.HsTable.from_eterms(chunk)
+                endpoints_f.write(chunk_table.endpoints.astype(_ENDPOINTS[1]).tobytes())
+                closed_f.write(chunk_table.closed.astype(_CLOSED[1]).tobytes())
+                offsets_f.write(
+                    (n_hses + chunk_table.eterm_offsets[1:])
+                    .astype(_OFFSETS[1])
+                    .tobytes()
+                )
+                boxes = [
+                    _box_row(
+                        flat._eterm_reach_box(
+                            chunk_table.endpoints[chunk_table.eterm_slice(eterm_i)]
+                        )
+                    )
+                    for eterm_i in range(chunk_table.n_eterms)
+                ]
+                boxes_f.write(np.array(boxes, dtype=_REACH_BOXES[1]).tobytes())
+                n_hses += chunk_table.n_hses
+                n_eterms += chunk_table.n_eterms
+
+        meta = {
+            "format": FORMAT,
+            "version": VERSION,
+            "name": name,
+            "n_hses": n_hses,
+            "n_eterms": n_eterms,
+        }
+        (path / "meta.json").write_text(json.dumps(meta))
+        return cls(path)
+
+    def eterm_ids_in_box(self, box: flat.Box) -> np.ndarray:
+        """Ids of eterms whose reach boxes overlap the box. A superset of the
+        eterms that can contain points inside the box.
+        """
+        boxes = self.reach_boxes
+        (ids,) = np.nonzero(
+            (boxes[:, 0] <= box.max_x)
+            & (box.min_x <= boxes[:, 2])
+            & (boxes[:, 1] <= box.max_y)
+            & (box.min_y <= boxes[:, 3])
+        )
+        return ids
+
+    def esum(self, eterm_ids: t.Optional[t.Sequence[int]] = None) -> flat.Esum:
+        """Esum made of the given eterms, or of all of them."""
+        if eterm_ids is None:
+            eterm_ids = np.arange(len(self))
+        return self.table.select(eterm_ids).to_esum()
+
+    def esum_in_box(self, box: flat.Box) -> flat.Esum:
+        """Esum of the eterms that can contain points inside the box."""
+        return self.esum(self.eterm_ids_in_box(box))
+
+    def contains_many(
+        self,
+        points: np.ndarray,
+        with_eps: bool = False,
+        tiles: t.Union[int, t.Tuple[int, int]] = 1,
+    ) -> np.ndarray:
+        """Same as `flat.Esum.contains_many()`.
+
+        Args:
+            points: [n_points x 2] array.
+            tiles: points are split by a grid with this many tiles along each
+                axis, or `(n_cols, n_rows)`. Each tile only loads the eterms
+                near its points.
+        """
+        points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        result = np.zeros(len(points), dtype=bool)
+        if len(points) == 0:
+            return result
+
+        n_cols, n_rows = (tiles, tiles) if isinstance(tiles, int) else tiles
+        grid = tiled.Grid.over_box(_points_box(points), n_cols, n_rows)
+        cells = _cells_of(grid, points)
+        for cell in np.unique(cells):
+            (point_ids,) = np.nonzero(cells == cell)
+            cell_points = points[point_ids]
+            esum = self.esum_in_box(_points_box(cell_points))
+            result[point_ids] = esum.contains_many(cell_points, with_eps=with_eps)
+        return result
+
+    def _grid_box(self) -> t.Optional[flat.Box]:
+        """Box over all reach boxes. None if there are unbounded eterms."""
+        boxes = np.asarray(self.reach_boxes)
+        boxes = boxes[boxes[:, 0] <= boxes[:, 2]]
+        if len(boxes) == 0 or not np.isfinite(boxes).all():
+            return None
+        return flat.Box(
+            min_x=float(boxes[:, 0].min()),
+            min_y=float(boxes[:, 1].min()),
+            max_x=float(boxes[:, 2].max()),
+            max_y=float(boxes[:, 3].max()),
+        )
+
+    def detect_boundary(
+        self,
+        tiles: t.Union[int, t.Tuple[int, int]] = 4,
+        workers: t.Optional[int] = None,
+    ) -> t.List[flat.XSegment]:
+        """Boundary of the whole store, computed tile by tile like
+        `tiled.detect_boundary_tiled()`. Each tile only reads the eterms that
+        reach it, and only their lines split its segments. The boundary covers
+        the same points as `flat.detect_boundary()`, but segments aren't split
+        where lines of far away eterms cross them.
+
+        Unbounded stores don't fit in a grid, they are processed in one go.
+
+        Args:
+            tiles: number of tiles along each axis, or `(n_cols, n_rows)`.
+            workers: number of processes. Defaults to the number of CPUs. With
+                1, everything runs in the calling process.
+        """
+        grid_box = self._grid_box()
+        if grid_box is None:
+            if len(self) > 0 and not np.isfinite(self.reach_boxes).all():
+                return flat.detect_boundary(self.esum())
+            return []
+
+        n_cols, n_rows = (tiles, tiles) if isinstance(tiles, int) else tiles
+        grid = tiled.Grid.over_box(grid_box, n_cols, n_rows)
+        cells = list(itertools.product(range(n_cols), range(n_rows)))
+        workers = workers or os.cpu_count() or 1
+
+        hs_cache: t.Dict[int, flat.Hs] = {}
+
+        def _hs(hs_i: int) -> flat.Hs:
+            if hs_i not in hs_cache:
+                hs_cache[hs_i] = self.table.hs(hs_i)
+            return hs_cache[hs_i]
+
+        segments = []
+        line_ids: t.Dict[flat.Hs, int] = {}
+        line_runs: t.Dict[int, t.List[t.Tuple[flat.X, flat.X]]] = {}
+        for result in _run_tiles(self, grid, cells, workers):
+            vertices = [flat.X(_hs(i1), _hs(i2)) for i1, i2 in result.vertices.tolist()]
+            segments.extend(
+                flat.XSegment(_hs(i1), _hs(i2), _hs(i3))
+                for i1, i2, i3 in result.segments.tolist()
+            )
+            for hs_i, first, last in result.runs.tolist():
+                # Equal halfspaces of different eterms are different rows, and
+                # tiles may pick different ones.
+                line_i = line_ids.setdefault(_hs(hs_i), hs_i)
+                run = (vertices[first], vertices[last])
+                line_runs.setdefault(line_i, []).append(run)
+
+        # Each stitch is classified by the eterms that reach its midpoint's tile.
+        by_cell: t.Dict[t.Tuple[int, int], t.List[flat.XSegment]] = {}
+        # All runs' lines are in the cache, they are a part of their vertices.
+        for stitch in tiled._stitches(line_runs, hs_cache):
+            by_cell.setdefault(
+                grid.cell_of(flat._segment_mid_pt(stitch)), []
+            ).append(stitch)
+        for (col, row), stitches in by_cell.items():
+            tile_box = tiled._widen(grid.tile_box(col, row))
+            segments.extend(flat.filter_segments(self.esum_in_box(tile_box), stitches))
+
+        return segments
+
+    def _tile_task(
+        self, grid: tiled.Grid, col: int, row: int, robust: bool
+    ) -> t.Optional[tiled._TileTask]:
+        tile_box = tiled._widen(grid.tile_box(col, row))
+        eterm_ids = self.eterm_ids_in_box(tile_box)
+        if len(eterm_ids) == 0:
+            return None
+
+        rows, offsets = self.table.hs_rows(eterm_ids)
+        tile_ids = np.unique(rows)
+        tile_hses = self.table.take(tile_ids)
+        is_line = flat._lines_reaching_eterm(
+            tile_hses.endpoints,
+            np.arange(len(tile_ids)),
+            tiled._box_endpoints(tile_box),
+            np.full(4, -1),
+        )
+        return tiled._TileTask(
+            grid=grid,
+            col=col,
+            row=row,
+            hs_ids=tile_ids,
+            hses=tile_hses,
+            is_line=is_line,
+            eterm_hses=np.searchsorted(tile_ids, rows),
+            eterm_offsets=offsets,
+            robust=robust,
+        )
+
+
+def _detect_store_tile(
+    store: ShapeStore, grid: tiled.Grid, col: int, row: int, robust: bool
+) -> t.Optional[tiled._TileResult]:
+    task = store._tile_task(grid, col, row, robust)
+    return None if task is None else tiled._detect_tile(task)
+
+
+def _run_tiles(
+    store: ShapeStore,
+    grid: tiled.Grid,
+    cells: t.Sequence[t.Tuple[int, int]],
+    workers: int,
+) -> t.Iterator[tiled._TileResult]:
+    robust = core.settings.robust
+    if workers == 1:
+        results = (
+            _detect_store_tile(store, grid, col, row, robust) for col, row in cells
+        )
+        yield from (result for result in results if result is not None)
+        return
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        cols, rows = zip(*cells)
+        results = executor.map(
+            _detect_store_tile,
+            itertools.repeat(store),
+            itertools.repeat(grid),
+            cols,
+            rows,
+            itertools.repeat(robust),
+        )
+        yield from (result for result in results if result is not None)
+
+
+def _chunked(items: t.Iterable, size: int) -> t.Iterator[list]:
+    items = iter(items)
+    while chunk := list(itertools.islice(items, size)):
+        yield chunk
+
+
+def _points_box(points: np.ndarray) -> flat.Box:
+    (min_x, min_y), (max_x, max_y) = points.min(axis=0), points.max(axis=0)
+    return flat.Box(min_x=min_x, min_y=min_y, max_x=max_x, max_y=max_y)
+
+
+def _cells_of(grid: tiled.Grid, points: np.ndarray) -> np.ndarray:
+    """Batched `tiled.Grid.cell_of()`, as flat cell indices."""
+
+    def _axis(coords, origin, size, n):
+        if size <= 0:
+            return np.zeros(len(coords), dtype=np.int64)
+        return np.clip(np.floor((coords - origin) / size), 0, n - 1).astype(np.int64)
+
+    cols = _axis(points[:, 0], grid.min_x, grid.cell_w, grid.n_cols)
+    rows = _axis(points[:, 1], grid.min_y, grid.cell_h, grid.n_rows)
+    return cols * grid.n_rows + rows
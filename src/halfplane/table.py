@@ -0,0 +1,349 @@
+"""
+Array-backed shape representation. Instead of a graph of frozen dataclasses,
+an `Esum` is stored as a handful of flat NumPy arrays. Halfspaces of all
+eterms are laid out one after another, and `eterm_offsets` marks where each
+eterm starts. `Esum.table` gives the table of a shape.
+
+The same layout is used wherever shapes leave the object graph: `.npz` files
+in `io`, memory-mapped stores in `store`, shared memory in `parallel`, tile
+tasks in `tiled` and the disk cache in `cache`.
+
+The kernels at the bottom of this module check whole tables at once: every
+halfspace against every point, reduced per eterm. `flat` runs its batched
+containment checks and segment filtering through them, on `Esum.table`.
+"""
+
+import dataclasses
+import typing as t
+
+import numpy as np
+
+from . import core, flat
+from .generic_structs import FOSet
+
+
+def hses_closed(hses: t.Iterable[flat.Hs]) -> np.ndarray:
+    """[n_hses] bool array. True for `Hpc`, False for `Hp`."""
+    return np.array([isinstance(hs, flat.Hpc) for hs in hses], dtype=bool)
+
+
+def hses_from_arrays(endpoints: np.ndarray, closed: np.ndarray) -> t.List[flat.Hs]:
+    """Inverse of `flat._hses_endpoints()` and `hses_closed()`."""
+    return [
+        (flat.Hpc if is_closed else flat.Hp)(flat.Pt(x1, y1), flat.Pt(x2, y2))
+        for ((x1, y1), (x2, y2)), is_closed in zip(endpoints.tolist(), closed.tolist())
+    ]
+
+
+def segments_to_arrays(
+    segments: t.Sequence[flat.XSegment],
+) -> t.Dict[str, np.ndarray]:
+    """Arrays for `segments_from_arrays()`. Segments refer to the halfspace
+    rows by index, so the arrays can be saved or sent to another process.
+    """
+    hs_ids: t.Dict[flat.Hs, int] = {}
+    seg_ids = [
+        [hs_ids.setdefault(hs, len(hs_ids)) for hs in (s.hs1, s.common_hs, s.hs3)]
+        for s in segments
+    ]
+    hs_table = HsTable.from_hses(hs_ids)
+    return {
+        "endpoints": hs_table.endpoints,
+        "closed": hs_table.closed,
+        "segments": np.array(seg_ids, dtype=np.int32).reshape(-1, 3),
+    }
+
+
+def segments_from_arrays(
+    endpoints: np.ndarray, closed: np.ndarray, segments: np.ndarray
+) -> t.List[flat.XSegment]:
+    """Inverse of `segments_to_arrays()`."""
+    hses = hses_from_arrays(endpoints, closed)
+    return [flat.XSegment(*(hses[i] for i in ids)) for ids in segments.tolist()]
+
+
+@dataclasses.dataclass(frozen=True, eq=False)
+class HsTable:
+    endpoints: np.ndarray
+    "[n_hses x 2 x 2] float64 array. Axis 1 picks p1 or p2, axis 2 picks x or y."
+
+    closed: np.ndarray
+    "[n_hses] bool array. True for `Hpc`, False for `Hp`."
+
+    eterm_offsets: np.ndarray
+    """[n_eterms + 1] int64 array. Halfspaces of the i-th eterm are stored at
+    `eterm_offsets[i]:eterm_offsets[i + 1]`.
+    """
+
+    name: t.Optional[str] = None
+
+    @classmethod
+    def from_eterms(
+        cls, eterms: t.Iterable[flat.Eterm], name: t.Optional[str] = None
+    ) -> "HsTable":
+        eterms = list(eterms)
+        hses = [hs for eterm in eterms for hs in eterm.hses]
+        offsets = np.cumsum([0, *(len(eterm.hses) for eterm in eterms)])
+        # Eterms cache their endpoints, most of them are there already.
+        endpoints = [eterm.endpoints for eterm in eterms if len(eterm.hses) > 0]
+
+        return cls(
+            endpoints=(
+                np.concatenate(endpoints) if endpoints else flat._hses_endpoints([])
+            ),
+            closed=hses_closed(hses),
+            eterm_offsets=offsets.astype(np.int64),
+            name=name,
+        )
+
+    @classmethod
+    def from_esum(cls, esum: flat.Esum) -> "HsTable":
+        return cls.from_eterms(esum.eterms, name=esum.name)
+
+    @classmethod
+    def from_hses(
+        cls, hses: t.Iterable[flat.Hs], name: t.Optional[str] = None
+    ) -> "HsTable":
+        """Table of loose halfspaces, all of them in a single eterm."""
+        hses = list(hses)
+        return cls(
+            endpoints=flat._hses_endpoints(hses),
+            closed=hses_closed(hses),
+            eterm_offsets=np.array([0, len(hses)], dtype=np.int64),
+            name=name,
+        )
+
+    @property
+    def n_eterms(self) -> int:
+        return len(self.eterm_offsets) - 1
+
+    @property
+    def n_hses(self) -> int:
+        return len(self.endpoints)
+
+    @property
+    def nbytes(self) -> int:
+        return self.endpoints.nbytes + self.closed.nbytes + self.eterm_offsets.nbytes
+
+    def eterm_slice(self, eterm_i: int) -> slice:
+        return slice(self.eterm_offsets[eterm_i], self.eterm_offsets[eterm_i + 1])
+
+    def hs(self, hs_i: int) -> flat.Hs:
+        (x1, y1), (x2, y2) = self.endpoints[hs_i].tolist()
+        hs_cls = flat.Hpc if self.closed[hs_i] else flat.Hp
+        return hs_cls(flat.Pt(x1, y1), flat.Pt(x2, y2))
+
+    def hses(self) -> t.List[flat.Hs]:
+        """All halfspaces, one eterm after another."""
+        return hses_from_arrays(self.endpoints, self.closed)
+
+    def eterm(self, eterm_i: int) -> flat.Eterm:
+        hs_slice = self.eterm_slice(eterm_i)
+        return flat.Eterm(
+            hses=FOSet(self.hs(hs_i) for hs_i in range(hs_slice.start, hs_slice.stop))
+        )
+
+    def eterms(self) -> t.List[flat.Eterm]:
+        return self._split_eterms(self.hses())
+
+    def _split_eterms(self, hses: t.Sequence[flat.Hs]) -> t.List[flat.Eterm]:
+        """Eterms made of `hses`, one per row of the table."""
+        offsets = self.eterm_offsets.tolist()
+        return [
+            flat.Eterm.from_hses(*hses[start:stop])
+            for start, stop in zip(offsets, offsets[1:])
+        ]
+
+    def to_esum(self) -> flat.Esum:
+        return flat.Esum(eterms=FOSet(self.eterms()), name=self.name)
+
+    def hs_rows(self, eterm_ids: np.ndarray) -> t.Tuple[np.ndarray, np.ndarray]:
+        """Halfspace rows of the eterms, one eterm after another, and offsets
+        into them.
+        """
+        eterm_ids = np.asarray(eterm_ids, dtype=np.int64)
+        starts = np.asarray(self.eterm_offsets[eterm_ids], dtype=np.int64)
+        stops = np.asarray(self.eterm_offsets[eterm_ids + 1], dtype=np.int64)
+        lengths = stops - starts
+        offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+        rows = np.repeat(starts - offsets[:-1], lengths) + np.arange(offsets[-1])
+        return rows, offsets
+
+    def take(self, hs_rows: np.ndarray) -> "HsTable":
+        """Copy of the given halfspace rows, all of them in a single eterm.
+        Reads only those rows, so it's cheap on memory-mapped tables.
+        """
+        hs_rows = np.asarray(hs_rows, dtype=np.int64)
+        return HsTable(
+            endpoints=np.asarray(self.endpoints[hs_rows], dtype=np.float64),
+            closed=np.asarray(self.closed[hs_rows], dtype=bool),
+            eterm_offsets=np.array([0, len(hs_rows)], dtype=np.int64),
+            name=self.name,
+        )
+
+    def eterm_arrays(
+        self, eterm_ids: t.Optional[np.ndarray] = None
+    ) -> t.Tuple[np.ndarray, np.ndarray]:
+        """Endpoints of the eterms' halfspaces, one eterm after another, and
+        offsets into them. The input of the kernels. With no `eterm_ids`, all
+        eterms, without copying.
+        """
+        if eterm_ids is None:
+            return self.endpoints, self.eterm_offsets
+        rows, offsets = self.hs_rows(eterm_ids)
+        return self.endpoints[rows], offsets
+
+    def select(self, eterm_ids: np.ndarray) -> "HsTable":
+        """Copy of the given eterms."""
+        rows, offsets = self.hs_rows(eterm_ids)
+        return dataclasses.replace(self.take(rows), eterm_offsets=offsets)
+
+
+# ----- kernels ------
+
+
+# Upper bound for the number of z factors computed at once. The temporary
+# arrays have to stay in the CPU cache, bigger chunks are a lot slower.
+_CHUNK_SIZE = 2**14
+
+
+def _point_chunks(n_hses: int, n_points: int) -> t.Iterator[slice]:
+    step = max(1, _CHUNK_SIZE // max(n_hses, 1))
+    for start in range(0, n_points, step):
+        yield slice(start, start + step)
+
+
+def _reduce_per_eterm(
+    flags: np.ndarray, eterm_offsets: np.ndarray, reduce: np.ufunc
+) -> np.ndarray:
+    # Much faster than `reduce.reduceat()` along the first axis. Empty eterms
+    # get the identity of `reduce`.
+    offsets = eterm_offsets.tolist()
+    result = np.empty((len(offsets) - 1, flags.shape[1]), dtype=bool)
+    for eterm_i, (start, stop) in enumerate(zip(offsets, offsets[1:])):
+        result[eterm_i] = reduce.reduce(flags[start:stop], axis=0)
+    return result
+
+
+def all_per_eterm(flags: np.ndarray, eterm_offsets: np.ndarray) -> np.ndarray:
+    """[n_eterms x n_points] bool array. Whether the flags of all the eterm's
+    halfspaces are set. True for eterms without halfspaces.
+
+    Args:
+        flags: [n_hses x n_points] bool array, e.g. from `flat._z_above()`.
+        eterm_offsets: [n_eterms + 1] array. Rows of `flags` of each eterm.
+    """
+    return _reduce_per_eterm(flags, eterm_offsets, np.logical_and)
+
+
+def any_per_eterm(flags: np.ndarray, eterm_offsets: np.ndarray) -> np.ndarray:
+    """Same as `all_per_eterm()`, but any flag will do. False for eterms
+    without halfspaces.
+    """
+    return _reduce_per_eterm(flags, eterm_offsets, np.logical_or)
+
+
+def contains_pts(
+    endpoints: np.ndarray,
+    eterm_offsets: np.ndarray,
+    points: np.ndarray,
+    threshold: float,
+) -> np.ndarray:
+    """Whether any eterm has every z factor above the threshold, see
+    `flat._z_above()`.
+
+    Args:
+        endpoints, eterm_offsets: see `HsTable.eterm_arrays()`.
+        points: [n_points x 2] array.
+    Returns:
+        [n_points] bool array.
+    """
+    result = np.zeros(len(points), dtype=bool)
+    for chunk in _point_chunks(len(endpoints), len(points)):
+        above = flat._z_above(endpoints, points[chunk], threshold)
+        result[chunk] = all_per_eterm(above, eterm_offsets).any(axis=0)
+    return result
+
+
+def complement_contains_pts(
+    endpoints: np.ndarray,
+    eterm_offsets: np.ndarray,
+    points: np.ndarray,
+    threshold: float,
+) -> np.ndarray:
+    """`contains_pts()` of the conjugate, without generating it: every eterm
+    needs a halfspace whose conjugate has its z factor above the threshold.
+    True for all points if there are no eterms.
+    """
+    # Conjugates have p1 and p2 swapped.
+    conjugate_ends = endpoints[:, ::-1, :]
+    result = np.zeros(len(points), dtype=bool)
+    for chunk in _point_chunks(len(endpoints), len(points)):
+        above = flat._z_above(conjugate_ends, points[chunk], threshold)
+        result[chunk] = any_per_eterm(above, eterm_offsets).all(axis=0)
+    return result
+
+
+def classify_pts(
+    endpoints: np.ndarray,
+    eterm_offsets: np.ndarray,
+    points: np.ndarray,
+    eps: float = 10e-7,
+) -> t.Tuple[np.ndarray, np.ndarray]:
+    """`contains_pts()` with the loose and the strict threshold, in a single
+    pass. Every z factor is calculated once and compared against both.
+
+    Returns:
+        - [n_points] bool array, loose check
+        - [n_points] bool array, strict check
+    """
+    with_eps = np.zeros(len(points), dtype=bool)
+    strict = np.zeros(len(points), dtype=bool)
+    for chunk in _point_chunks(len(endpoints), len(points)):
+        if core.settings.robust:
+            signs = flat._z_signs(endpoints, points[chunk])
+            above_with_eps, above_strict = signs >= 0, signs > 0
+        else:
+            z = flat._z_factors(endpoints, points[chunk])
+            above_with_eps, above_strict = z > -eps, z > eps
+        with_eps[chunk] = all_per_eterm(above_with_eps, eterm_offsets).any(axis=0)
+        strict[chunk] = all_per_eterm(above_strict, eterm_offsets).any(axis=0)
+    return with_eps, strict
+
+
+def unique_lines(table: HsTable) -> np.ndarray:
+    """Indices of the first occurrence of each distinct halfspace."""
+    if table.n_hses == 0:
+        return np.zeros(0, dtype=np.int64)
+
+    rows = np.hstack([table.endpoints.reshape(-1, 4), table.closed[:, None]])
+    _, first_idx = np.unique(rows, axis=0, return_index=True)
+    return np.sort(first_idx)
+
+
+def find_all_xs(table: HsTable) -> t.Tuple[np.ndarray, np.ndarray]:
+    """Batched `flat.find_all_xs()`. Crosses every pair of distinct halfspaces.
+
+    Uses homogeneous coordinates, so the points can differ from
+    `flat._intersection_point()` by rounding errors.
+
+    Returns:
+        - [n_xs x 2] int array of halfspace index pairs
+        - [n_xs x 2] float array of cross points
+    """
+    hs_idx = unique_lines(table)
+    i1, i2 = np.triu_indices(len(hs_idx), k=1)
+    i1 = hs_idx[i1]
+    i2 = hs_idx[i2]
+
+    ends = table.endpoints
+    # Lines in homogeneous coordinates: cross product of (x, y, 1) endpoints.
+    homo = np.concatenate([ends, np.ones(ends.shape[:2] + (1,))], axis=2)
+    lines = np.cross(homo[:, 0, :], homo[:, 1, :])
+    pts = np.cross(lines[i1], lines[i2])
+
+    crossing = pts[:, 2] != 0
+    pairs = np.stack([i1[crossing], i2[crossing]], axis=1)
+    points = pts[crossing, :2] / pts[crossing, 2:]
+
+    return pairs, points
@@ -0,0 +1,368 @@
+"""
+Boundary detection of a single big esum, split into tiles of a regular grid.
+
+Every vertex belongs to exactly one tile, the one its point falls into. A
+tile only needs:
+- eterms that can contain points inside the tile, found with
+  `Eterm.reach_box`
+- lines that pass through the tile
+
+Lines are convex and so are tiles, so the vertices of a line inside a tile
+are a contiguous run of the line's sorted vertices. Each tile builds and
+classifies the segments of its runs. Afterwards, runs of the same line in
+neighbouring tiles are stitched with one extra segment each. These are
+classified against the whole esum.
+
+The result has the same geometry as `flat.detect_boundary()`. When more than
+two lines cross at the same point, the zero-length segments between the
+coincident vertices may pair up differently.
+"""
+
+import concurrent.futures
+import dataclasses
+import itertools
+import math
+import os
+import typing as t
+
+import more_itertools as mitt
+import numpy as np
+
+from . import core, flat, table
+
+
+@dataclasses.dataclass(frozen=True)
+class Grid:
+    min_x: float
+    min_y: float
+    cell_w: float
+    cell_h: float
+    n_cols: int
+    n_rows: int
+
+    @classmethod
+    def over_box(cls, box: flat.Box, n_cols: int, n_rows: int) -> "Grid":
+        return cls(
+            min_x=box.min_x,
+            min_y=box.min_y,
+            cell_w=(box.max_x - box.min_x) / n_cols,
+            cell_h=(box.max_y - box.min_y) / n_rows,
+            n_cols=n_cols,
+            n_rows=n_rows,
+        )
+
+    def cell_of(self, pt: flat.Pt) -> t.Tuple[int, int]:
+        """Column and row of the tile that owns the point. Points outside the
+        grid go to the closest tile.
+        """
+        return (
+            _clamped_cell(pt.x, self.min_x, self.cell_w, self.n_cols),
+            _clamped_cell(pt.y, self.min_y, self.cell_h, self.n_rows),
+        )
+
+    def tile_box(self, col: int, row: int) -> flat.Box:
+        return flat.Box(
+            min_x=self.min_x + col * self.cell_w,
+            min_y=self.min_y + row * self.cell_h,
+            max_x=self.min_x + (col + 1) * self.cell_w,
+            max_y=self.min_y + (row + 1) * self.cell_h,
+        )
+
+
+def _clamped_cell(coord: float, origin: float, size: float, n: int) -> int:
+    if size <= 0:
+        return 0
+    return min(max(math.floor((coord - origin) / size), 0), n - 1)
+
+
+@dataclasses.dataclass(frozen=True)
+class _TileTask:
+    """Everything a worker needs to process one tile. Halfspaces are rows of
+    a small table, local to the task.
+    """
+
+    grid: Grid
+    col: int
+    row: int
+
+    hs_ids: np.ndarray
+    "[n_hses] int64 array. Ids of the halfspaces in the whole esum. Sorted."
+
+    hses: table.HsTable
+    "Halfspaces of the tile, all of them in a single eterm."
+
+    is_line: np.ndarray
+    "[n_hses] bool array. Halfspaces whose lines pass through the tile."
+
+    eterm_hses: np.ndarray
+    "Table rows of the eterms' halfspaces, one eterm after another."
+
+    eterm_offsets: np.ndarray
+    "[n_eterms + 1] array. Slices of `eterm_hses`."
+
+    robust: bool
+    "Predicate mode of the caller. Workers don't inherit it."
+
+
+@dataclasses.dataclass(frozen=True)
+class _TileResult:
+    vertices: np.ndarray
+    "[n_vertices x 2] array of halfspace ids. `X(hs1, hs2)`."
+
+    segments: np.ndarray
+    "[n_segments x 3] array of halfspace ids. Boundary segments inside the tile."
+
+    runs: np.ndarray
+    """[n_runs x 3] array. Line id and the first and the last of the line's
+    vertices in the tile, as rows of `vertices`.
+    """
+
+
+def _detect_tile(task: _TileTask, eps: float = 10e-7) -> _TileResult:
+    with core.robust_predicates(task.robust):
+        return _detect_tile_in_mode(task, eps)
+
+
+def _detect_tile_in_mode(task: _TileTask, eps: float) -> _TileResult:
+    hses = task.hses.hses()
+    eterm_hses = task.eterm_hses.tolist()
+    offsets = task.eterm_offsets.tolist()
+    local_esum = flat.Esum.from_terms(
+        *(
+            flat.Eterm.from_hses(*(hses[i] for i in eterm_hses[start:stop]))
+            for start, stop in zip(offsets, offsets[1:])
+        )
+    )
+
+    # Same as `flat.find_vertices_clipped()`, limited to the tile's lines.
+    (line_rows,) = np.nonzero(task.is_line)
+    lines = task.hses.endpoints[line_rows]
+    pairs = set()
+    for start, stop in zip(offsets, offsets[1:]):
+        term_rows = task.eterm_hses[start:stop]
+        mask = flat._lines_reaching_eterm(
+            lines, line_rows, task.hses.endpoints[term_rows], term_rows, eps=eps
+        )
+        pairs.update(itertools.combinations(line_rows[mask].tolist(), 2))
+
+    crosses = (flat.X(hses[i1], hses[i2]) for i1, i2 in sorted(pairs))
+    vertices = [
+        cross
+        for cross in crosses
+        if cross.point is not None
+        and task.grid.cell_of(cross.point) == (task.col, task.row)
+        and flat._esum_contains_x_with_eps(local_esum, cross)
+    ]
+    vertices = flat.collapse_xs(vertices)
+
+    # Same as `flat.find_segments()`, but remembers the runs.
+    coords = flat._xs_coords(vertices)
+    x_indices = {cross: x_i for x_i, cross in enumerate(vertices)}
+    segments = []
+    runs = []
+    for hs, xs_on_this_hs in flat.hs_xs_index(vertices).items():
+        xs_on_this_hs = list(xs_on_this_hs)
+        sorted_indices = _sorted_x_indices(coords, x_indices, xs_on_this_hs, hs)
+        runs.append((hs, sorted_indices[0], sorted_indices[-1]))
+        segments.extend(
+            flat.XSegment.from_xs(vertices[i1], vertices[i2])
+            for i1, i2 in mitt.pairwise(sorted_indices)
+        )
+    segments = flat.filter_segments(local_esum, list(mitt.unique_everseen(segments)))
+
+    hs_ids = {hs: hs_id for hs, hs_id in zip(hses, task.hs_ids.tolist())}
+    return _TileResult(
+        vertices=np.array(
+            [[hs_ids[x.hs1], hs_ids[x.hs2]] for x in vertices], dtype=np.int64
+        ).reshape(-1, 2),
+        segments=np.array(
+            [[hs_ids[s.hs1], hs_ids[s.common_hs], hs_ids[s.hs3]] for s in segments],
+            dtype=np.int64,
+        ).reshape(-1, 3),
+        runs=np.array(
+            [[hs_ids[hs], first, last] for hs, first, last in runs], dtype=np.int64
+        ).reshape(-1, 3),
+    )
+
+
+def _sorted_x_indices(
+    coords: np.ndarray,
+    x_indices: t.Dict[flat.X, int],
+    xs: t.Sequence[flat.X],
+    hs: flat.Hs,
+) -> t.List[int]:
+    indices = np.array([x_indices[cross] for cross in xs], dtype=np.int64)
+    return indices[flat._sort_along_hs(coords[indices], hs)].tolist()
+
+
+def _box_endpoints(box: flat.Box) -> np.ndarray:
+    """Closed halfspaces of the box, counter-clockwise so the inside is on the
+    left.
+    """
+    corners = np.array(
+        [
+            [box.min_x, box.min_y],
+            [box.max_x, box.min_y],
+            [box.max_x, box.max_y],
+            [box.min_x, box.max_y],
+        ],
+        dtype=np.float64,
+    )
+    return np.stack([corners, np.roll(corners, -1, axis=0)], axis=1)
+
+
+def _widen(box: flat.Box) -> flat.Box:
+    """Makes room for rounding errors in `Grid.cell_of()`."""
+    margin = 1e-6 * (
+        1 + max(abs(box.min_x), abs(box.min_y), abs(box.max_x), abs(box.max_y))
+    )
+    return flat.Box(
+        min_x=box.min_x - margin,
+        min_y=box.min_y - margin,
+        max_x=box.max_x + margin,
+        max_y=box.max_y + margin,
+    )
+
+
+def _boxes_overlap(box1: flat.Box, box2: flat.Box) -> bool:
+    return (
+        box1.min_x <= box2.max_x
+        and box2.min_x <= box1.max_x
+        and box1.min_y <= box2.max_y
+        and box2.min_y <= box1.max_y
+    )
+
+
+def _make_tasks(
+    eterms: t.Sequence[flat.Eterm],
+    hses: t.Sequence[flat.Hs],
+    grid: Grid,
+) -> t.List[_TileTask]:
+    hs_ids = {hs: hs_i for hs_i, hs in enumerate(hses)}
+    all_hses = table.HsTable.from_hses(hses)
+    all_ids = np.arange(len(hses))
+    eterm_ids = [
+        np.array([hs_ids[hs] for hs in eterm.hses], dtype=np.int64) for eterm in eterms
+    ]
+
+    tasks = []
+    for col, row in itertools.product(range(grid.n_cols), range(grid.n_rows)):
+        tile_box = _widen(grid.tile_box(col, row))
+        local = [
+            eterm_i
+            for eterm_i, eterm in enumerate(eterms)
+            if _boxes_overlap(eterm.reach_box, tile_box)
+        ]
+        if len(local) == 0:
+            continue
+
+        is_line = flat._lines_reaching_eterm(
+            all_hses.endpoints, all_ids, _box_endpoints(tile_box), np.full(4, -1)
+        )
+        in_eterms = np.zeros(len(hses), dtype=bool)
+        for eterm_i in local:
+            in_eterms[eterm_ids[eterm_i]] = True
+        (tile_ids,) = np.nonzero(is_line | in_eterms)
+        rows = np.full(len(hses), -1, dtype=np.int64)
+        rows[tile_ids] = np.arange(len(tile_ids))
+
+        tasks.append(
+            _TileTask(
+                grid=grid,
+                col=col,
+                row=row,
+                hs_ids=tile_ids,
+                hses=all_hses.take(tile_ids),
+                is_line=is_line[tile_ids],
+                eterm_hses=np.concatenate([rows[eterm_ids[i]] for i in local]),
+                eterm_offsets=np.cumsum(
+                    [0, *(len(eterm_ids[i]) for i in local)], dtype=np.int64
+                ),
+                robust=core.settings.robust,
+            )
+        )
+    return tasks
+
+
+def _run_tasks(tasks: t.Sequence[_TileTask], workers: int) -> t.Iterator[_TileResult]:
+    if workers == 1:
+        yield from map(_detect_tile, tasks)
+        return
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        yield from executor.map(_detect_tile, tasks)
+
+
+def detect_boundary_tiled(
+    esum: t.Union[flat.Esum, flat.NotEsum],
+    tiles: t.Union[int, t.Tuple[int, int]] = 4,
+    workers: t.Optional[int] = None,
+) -> t.List[flat.XSegment]:
+    """Same geometry as `flat.detect_boundary()`, computed tile by tile.
+
+    Args:
+        esum: the shape. Unbounded shapes don't fit in a grid, they are
+            processed in one go.
+        tiles: number of tiles along each axis, or `(n_cols, n_rows)`. More
+            tiles means less memory per worker.
+        workers: number of processes. Defaults to the number of CPUs. With 1,
+            everything runs in the calling process.
+    """
+    if isinstance(esum, flat.NotEsum):
+        esum = esum.expand()
+    n_cols, n_rows = (tiles, tiles) if isinstance(tiles, int) else tiles
+    workers = workers or os.cpu_count() or 1
+
+    eterms = list(esum.eterms)
+    reach_boxes = [eterm.reach_box for eterm in eterms]
+    if len(eterms) == 0 or any(box is None for box in reach_boxes):
+        return flat.detect_boundary(esum)
+
+    eterms = [e for e, box in zip(eterms, reach_boxes) if box != flat.EMPTY_BOX]
+    if len(eterms) == 0:
+        return []
+    grid_box = flat.Box(
+        min_x=min(e.reach_box.min_x for e in eterms),
+        min_y=min(e.reach_box.min_y for e in eterms),
+        max_x=max(e.reach_box.max_x for e in eterms),
+        max_y=max(e.reach_box.max_y for e in eterms),
+    )
+    grid = Grid.over_box(grid_box, n_cols, n_rows)
+    hses = list(mitt.unique_everseen(hs for term in esum.eterms for hs in term.hses))
+
+    segments = []
+    line_runs: t.Dict[int, t.List[t.Tuple[flat.X, flat.X]]] = {}
+    for result in _run_tasks(_make_tasks(eterms, hses, grid), workers):
+        vertices = [flat.X(hses[i1], hses[i2]) for i1, i2 in result.vertices.tolist()]
+        segments.extend(
+            flat.XSegment(hses[i1], hses[i2], hses[i3])
+            for i1, i2, i3 in result.segments.tolist()
+        )
+        for hs_i, first, last in result.runs.tolist():
+            line_runs.setdefault(hs_i, []).append((vertices[first], vertices[last]))
+
+    return segments + flat.filter_segments(esum, _stitches(line_runs, hses))
+
+
+def _stitches(
+    line_runs: t.Mapping[int, t.Sequence[t.Tuple[flat.X, flat.X]]],
+    hses: t.Union[t.Sequence[flat.Hs], t.Mapping[int, flat.Hs]],
+) -> t.List[flat.XSegment]:
+    """Segments between neighbouring runs of the same line. They aren't
+    classified yet.
+
+    Args:
+        line_runs: first and last vertex of each run, by line id.
+        hses: halfspaces by id.
+    """
+    stitches = []
+    for hs_i, runs in line_runs.items():
+        if len(runs) < 2:
+            continue
+        firsts = flat._xs_coords([first for first, _ in runs])
+        sorted_runs = [runs[i] for i in flat._sort_along_hs(firsts, hses[hs_i])]
+        stitches.extend(
+            flat.XSegment.from_xs(prev_last, next_first)
+            for (_, prev_last), (next_first, _) in mitt.pairwise(sorted_runs)
+        )
+    return stitches
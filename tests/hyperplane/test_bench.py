@@ -0,0 +1,169 @@
+import itertools
+import json
+
+import pytest
+
+from halfplane import flat, incremental, shape_gen
+from halfplane.bench import __main__ as bench_main
+from halfplane.bench import cases, report, timing
+
+
+def _stats(median, q1=None, q3=None):
+    return timing.Stats(
+        median_ns=median,
+        q1_ns=median if q1 is None else q1,
+        q3_ns=median if q3 is None else q3,
+        min_ns=0,
+        max_ns=0,
+        repeats=5,
+    )
+
+
+def _report(**medians):
+    return {
+        "version": report.FORMAT_VERSION,
+        "results": {
+            name: _stats(*values).to_json() for name, values in medians.items()
+        },
+    }
+
+
+def test_stats_from_samples():
+    stats = timing.Stats.from_samples([5, 1, 4, 2, 3])
+
+    assert (stats.q1_ns, stats.median_ns, stats.q3_ns) == (2, 3, 4)
+    assert stats.iqr_ns == 2
+    assert (stats.min_ns, stats.max_ns, stats.repeats) == (1, 5, 5)
+    assert timing.Stats.from_json(stats.to_json()) == stats
+
+
+def test_measure_with_fake_timer():
+    clock = itertools.count(step=100)
+    setups = itertools.count()
+    calls = []
+    case = cases.Case("phase", "shape", lambda: (next(setups),), calls.append)
+
+    stats = timing.measure(
+        case, warmup=2, repeats=3, min_sample_ns=1000, timer=lambda: next(clock)
+    )
+
+    # The calibration call took 100ns, so 10 calls per sample. Each sample
+    # takes a single tick of the fake clock.
+    assert stats.calls_per_sample == 10
+    assert stats.median_ns == 10
+    assert stats.repeats == 3
+    assert len(calls) == 1 + 10 + 3 * 10
+    # Every call got its own inputs.
+    assert calls == list(range(len(calls)))
+
+
+def test_measure_needs_repeats():
+    case = cases.Case("phase", "shape", lambda: (), lambda: None)
+
+    with pytest.raises(ValueError):
+        timing.measure(case, repeats=0)
+
+
+def test_compare():
+    baseline = _report(
+        slower=(100, 95, 105),
+        faster=(100, 95, 105),
+        noisy=(100, 50, 150),
+        same=(100, 95, 105),
+        gone=(100,),
+    )
+    current = _report(
+        slower=(150, 145, 155),
+        faster=(50, 45, 55),
+        noisy=(150, 60, 200),
+        same=(105, 100, 110),
+        added=(100,),
+    )
+
+    statuses = {c.name: c.status for c in report.compare(baseline, current)}
+
+    assert statuses == {
+        "slower": "regression",
+        "faster": "improvement",
+        "noisy": "same",
+        "same": "same",
+        "gone": "missing",
+        "added": "new",
+    }
+
+
+def test_save_load(tmp_path):
+    data = _report(a=(1,))
+    report.save(data, tmp_path / "sub" / "report.json")
+
+    assert report.load(tmp_path / "sub" / "report.json") == data
+
+    (tmp_path / "old.json").write_text(json.dumps({"version": 0}))
+    with pytest.raises(ValueError):
+        report.load(tmp_path / "old.json")
+
+
+def test_case_names_are_unique():
+    names = [case.name for case in cases.all_cases()]
+
+    assert len(names) == len(set(names))
+    assert {case.phase for case in cases.all_cases()} >= {
+        "find_all_xs",
+        "find_vertices",
+        "find_segments",
+        "filter_segments",
+        "intersection",
+        "conjugate",
+        "contains",
+    }
+
+
+@pytest.mark.parametrize("shape", ["triangle", "crude_c"])
+def test_cases_run(shape):
+    for case in cases.all_cases():
+        if case.shape == shape:
+            case.run(*case.setup())
+
+
+def test_incremental_edit_is_local(monkeypatch):
+    reach_bounds = flat._reach_bounds
+
+    def _n_checked_lines(n):
+        eterms = cases._diagonal_rects(seed=0, n=n)
+        boundary = incremental.IncrementalBoundary(flat.Esum.from_terms(*eterms))
+        checked = []
+
+        def _counting(lines, *args):
+            checked.append(len(lines))
+            return reach_bounds(lines, *args)
+
+        monkeypatch.setattr(flat, "_reach_bounds", _counting)
+        eterm = shape_gen.rect(8 * 20 + 1, 8 * 20 + 1, 3, 3).eterms[0]
+        boundary.add_eterm(eterm)
+        boundary.remove_eterm(eterm)
+        monkeypatch.setattr(flat, "_reach_bounds", reach_bounds)
+        return sum(checked)
+
+    # The edit has the same neighbours in both shapes, so it checks the same
+    # lines, not 4 times as many.
+    assert _n_checked_lines(50) == _n_checked_lines(200) > 0
+
+
+def test_main(tmp_path, capsys):
+    baseline_path = tmp_path / "baseline.json"
+    args = ["--filter", "*/triangle", "--repeats", "2", "--warmup", "0"]
+
+    assert bench_main.main([*args, "--output", str(baseline_path)]) == 0
+    saved = report.load(baseline_path)
+    assert set(saved["results"]) == {
+        case.name for case in cases.all_cases() if case.shape == "triangle"
+    }
+
+    data = report.load(baseline_path)
+    for stats in data["results"].values():
+        stats.update(median_ns=1, q1_ns=1, q3_ns=1)
+    report.save(data, baseline_path)
+    capsys.readouterr()
+
+    assert bench_main.main([*args, "--baseline", str(baseline_path)]) == 1
+    assert "regression" in capsys.readouterr().out
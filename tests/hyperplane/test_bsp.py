@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from halfplane import bsp, common_shapes, flat, shape_gen
+
+
+SHAPES = [
+    common_shapes.triangle(),
+    common_shapes.letter_c(),
+    common_shapes.hourglass(),
+    common_shapes.crude_c().conjugate,
+    shape_gen.rect_union_chain(n=10),
+    shape_gen.rect_intersection_chain(n=4),
+    shape_gen.play_button_chain(min_x=4.0, min_y=3.0, n=2, stride=0.2),
+    flat.Esum.empty,
+]
+
+
+def _grid_pts():
+    xs, ys = np.meshgrid(np.arange(-1, 20, 0.25), np.arange(-1, 20, 0.25))
+    far_pts = [[1e12, 0.0], [-1e12, 1e12], [np.nan, 1.0]]
+    return np.concatenate([np.stack([xs.ravel(), ys.ravel()], axis=1), far_pts])
+
+
+@pytest.mark.parametrize("esum", SHAPES)
+@pytest.mark.parametrize(
+    "with_eps,ref_fn",
+    [
+        (False, flat._esum_contains_pt_strict),
+        (True, flat._esum_contains_pt_with_eps),
+    ],
+)
+def test_same_as_esum(esum, with_eps, ref_fn):
+    compiled = esum.compile(with_eps=with_eps)
+    pts = _grid_pts()
+
+    expected = [ref_fn(esum, flat.Pt(x, y)) for x, y in pts.tolist()]
+
+    assert compiled.contains_many(pts).tolist() == expected
+    assert [compiled.contains(flat.Pt(x, y)) for x, y in pts.tolist()] == expected
+
+
+@pytest.mark.parametrize("esum", SHAPES)
+def test_residual_leaves(esum):
+    compiled = bsp.compile_esum(esum, max_depth=2)
+    pts = _grid_pts()
+
+    assert compiled.depth <= 2
+    assert compiled.contains_many(pts).tolist() == esum.contains_many(pts).tolist()
+    assert [compiled.contains(flat.Pt(x, y)) for x, y in pts[::7].tolist()] == [
+        esum.contains(flat.Pt(x, y)) for x, y in pts[::7].tolist()
+    ]
+
+
+def test_shallow_tree():
+    compiled = shape_gen.rect_union_chain(n=50).compile()
+
+    assert compiled.depth < 20
+    assert len(compiled.residuals) == 0
@@ -0,0 +1,233 @@
+import os
+import threading
+from fractions import Fraction
+
+import pytest
+
+from halfplane import cache, common_shapes, core, flat, shape_gen
+
+
+class TestLRUCache:
+    def test_evicts_least_recently_used(self):
+        lru = cache.LRUCache(maxsize=2)
+        lru.put("a", 1)
+        lru.put("b", 2)
+        assert lru.get("a") == 1
+
+        lru.put("c", 3)
+
+        assert "a" in lru
+        assert "b" not in lru
+        assert "c" in lru
+        assert lru.info() == cache.CacheInfo(hits=1, misses=0, size=2, maxsize=2)
+
+    def test_counters(self):
+        lru = cache.LRUCache(maxsize=4)
+        calls = []
+
+        def _compute(key):
+            calls.append(key)
+            return key * 2
+
+        assert [lru.get_or_compute(k, _compute) for k in [1, 2, 1, 1]] == [2, 4, 2, 2]
+        assert calls == [1, 2]
+        assert lru.info() == cache.CacheInfo(hits=2, misses=2, size=2, maxsize=4)
+
+        lru.clear()
+        assert lru.info() == cache.CacheInfo(hits=0, misses=0, size=0, maxsize=4)
+
+    def test_zero_size_stores_nothing(self):
+        lru = cache.LRUCache(maxsize=0)
+        lru.put("a", 1)
+
+        assert len(lru) == 0
+
+    def test_negative_size(self):
+        with pytest.raises(ValueError):
+            cache.LRUCache(maxsize=-1)
+
+    def test_threads(self):
+        lru = cache.LRUCache(maxsize=8)
+
+        def _work(offset):
+            for i in range(2000):
+                key = (i + offset) % 16
+                assert lru.get_or_compute(key, lambda k: -k) == -key
+
+        threads = [threading.Thread(target=_work, args=(i,)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        info = lru.info()
+        assert info.size == 8
+        assert info.hits + info.misses == 8 * 2000
+
+
+class TestEsumMemo:
+    def test_boundary_same_as_flat(self):
+        memo = cache.EsumMemo()
+        esum = common_shapes.hourglass()
+
+        expected = flat.detect_boundary(esum)
+
+        assert flat.detect_boundary(esum, cache=memo) == expected
+        assert flat.detect_boundary(esum, cache=memo) == expected
+        assert memo.info()["boundaries"].hits == 1
+        assert memo.info()["vertices"].misses == 1
+
+    def test_structural_key(self):
+        memo = cache.EsumMemo()
+        memo.detect_boundary(shape_gen.rect_union_chain(3))
+        memo.detect_boundary(shape_gen.rect_union_chain(3))
+
+        assert memo.info()["boundaries"].hits == 1
+
+    def test_result_is_a_copy(self):
+        memo = cache.EsumMemo()
+        esum = common_shapes.crude_c()
+
+        memo.detect_boundary(esum).clear()
+
+        assert memo.detect_boundary(esum) == flat.detect_boundary(esum)
+
+    def test_vertices_and_conjugate(self):
+        memo = cache.EsumMemo()
+        esum = common_shapes.crude_c()
+
+        assert memo.find_vertices(esum) == flat.find_vertices(esum)
+        assert memo.conjugate(esum) is memo.conjugate(esum)
+        assert memo.conjugate(esum) == esum.conjugate
+
+        memo.clear()
+        assert all(info.size == 0 for info in memo.info().values())
+
+    def test_predicate_mode_key(self):
+        memo = cache.EsumMemo()
+        esum = common_shapes.crude_c()
+
+        memo.detect_boundary(esum)
+        with core.robust_predicates():
+            memo.detect_boundary(esum)
+        memo.detect_boundary(esum)
+
+        assert memo.info()["boundaries"].misses == 2
+        assert memo.info()["boundaries"].hits == 1
+
+
+class TestDiskCache:
+    def test_canonical_hash(self):
+        esum = shape_gen.rect_union_chain(3)
+        shuffled = flat.Esum(
+            [flat.Eterm(list(reversed(e.hses))) for e in reversed(esum.eterms)]
+        )
+
+        assert cache.canonical_hash(esum) == cache.canonical_hash(shuffled)
+        assert cache.canonical_hash(esum) != cache.canonical_hash(esum.conjugate)
+        assert cache.canonical_hash(esum) != cache.canonical_hash(
+            shape_gen.rect_union_chain(4)
+        )
+
+        with core.robust_predicates():
+            robust_hash = cache.canonical_hash(esum)
+        assert robust_hash == cache.canonical_hash(esum, robust=True)
+        assert robust_hash != cache.canonical_hash(esum)
+
+    def test_canonical_hash_of_fractions(self):
+        third = Fraction(1, 3)
+        close = third + Fraction(1, 10**30)
+        assert float(third) == float(close)
+
+        assert cache.canonical_hash(shape_gen.rect(0, 0, third, 1)) != (
+            cache.canonical_hash(shape_gen.rect(0, 0, close, 1))
+        )
+        assert cache.canonical_hash(shape_gen.rect(0, 0, Fraction(1, 2), 1)) == (
+            cache.canonical_hash(shape_gen.rect(0, 0, 0.5, 1))
+        )
+
+    def test_fractions_skip_the_disk(self, tmp_path):
+        third = Fraction(1, 3)
+        esum = shape_gen.rect(0, 0, third, 1).union(shape_gen.rect(third, 0, 1, 1))
+        disk_cache = cache.DiskCache(tmp_path)
+
+        with core.robust_predicates():
+            expected = flat.detect_boundary(esum)
+            first = disk_cache.detect_boundary(esum)
+            second = disk_cache.detect_boundary(esum)
+
+        points = [x.point for seg in second for x in (seg.x1, seg.x2)]
+        assert first == second == expected
+        assert any(isinstance(pt.x, Fraction) for pt in points)
+        assert list(tmp_path.iterdir()) == []
+
+    @pytest.mark.parametrize(
+        "esum",
+        [common_shapes.hourglass(), common_shapes.crude_c(), flat.Esum.empty],
+    )
+    def test_roundtrip(self, tmp_path, esum):
+        expected = flat.detect_boundary(esum)
+
+        assert cache.DiskCache(tmp_path).detect_boundary(esum) == expected
+        # Fresh instance, as if the process was restarted.
+        disk_cache = cache.DiskCache(tmp_path)
+        assert flat.detect_boundary(esum, cache=disk_cache) == expected
+        assert disk_cache.info().hits == 1
+
+    def test_prunes_least_recently_used(self, tmp_path):
+        shapes = [shape_gen.rect_union_chain(n) for n in [2, 3, 4]]
+        disk_cache = cache.DiskCache(tmp_path)
+        for mtime, esum in enumerate(shapes):
+            disk_cache.detect_boundary(esum)
+            os.utime(disk_cache.entry_path(esum), (mtime, mtime))
+
+        disk_cache.max_bytes = disk_cache.info().n_bytes - 1
+        disk_cache.prune()
+
+        assert not disk_cache.entry_path(shapes[0]).exists()
+        assert disk_cache.entry_path(shapes[1]).exists()
+        assert disk_cache.entry_path(shapes[2]).exists()
+
+    def test_scans_only_over_cap(self, tmp_path, monkeypatch):
+        disk_cache = cache.DiskCache(tmp_path)
+        scans = []
+        entries = cache.DiskCache._entries
+
+        def _counted_entries(self):
+            scans.append(None)
+            return entries(self)
+
+        monkeypatch.setattr(cache.DiskCache, "_entries", _counted_entries)
+        for n in [2, 3, 4]:
+            disk_cache.detect_boundary(shape_gen.rect_union_chain(n))
+        assert len(scans) == 1
+
+        disk_cache.max_bytes = disk_cache.info().n_bytes
+        disk_cache.detect_boundary(shape_gen.rect_union_chain(5))
+        assert len(scans) == 3
+        assert disk_cache.info().n_bytes <= disk_cache.max_bytes * cache._PRUNE_TARGET
+
+    def test_broken_entry(self, tmp_path):
+        esum = common_shapes.crude_c()
+        disk_cache = cache.DiskCache(tmp_path)
+        disk_cache.entry_path(esum).write_bytes(b"not a zip")
+
+        assert disk_cache.detect_boundary(esum) == flat.detect_boundary(esum)
+        assert disk_cache.info().misses == 1
+
+    def test_memo_layer(self, tmp_path):
+        esum = common_shapes.crude_c()
+        disk_cache = cache.DiskCache(tmp_path, memo=cache.EsumMemo())
+
+        disk_cache.detect_boundary(esum)
+        disk_cache.entry_path(esum).unlink()
+
+        assert disk_cache.detect_boundary(esum) == flat.detect_boundary(esum)
+        assert disk_cache.info().misses == 1
+
+    def test_from_env(self, tmp_path, monkeypatch):
+        monkeypatch.delenv(cache.CACHE_DIR_ENV, raising=False)
+        assert cache.cache_from_env() is None
+
+        monkeypatch.setenv(cache.CACHE_DIR_ENV, str(tmp_path))
+        assert cache.cache_from_env().path == tmp_path
@@ -1,6 +1,7 @@
 import dataclasses
 import random
 
+import numpy as np
 import pytest
 
 from halfplane.flat import (
@@ -15,7 +16,8 @@ from halfplane.flat import (
     collapse_xs,
     infer_smallest_segments,
 )
-from halfplane import flat, common_shapes
+from halfplane import flat, common_shapes, shape_gen
+from halfplane.generic_structs import FOSet
 
 
 def _translate_point(pt: Pt, dx, dy):
@@ -451,6 +453,106 @@ class TestInferSegments:
         assert segments == problematic_ref_segments
 
 
+@pytest.mark.parametrize(
+    "esum",
+    [
+        common_shapes.letter_c(),
+        common_shapes.hourglass(),
+        shape_gen.rect_union_chain(n=4),
+        shape_gen.play_button_chain(min_x=4.0, min_y=3.0, n=3, stride=0.2),
+    ],
+)
+def test_filter_segments_same_as_two_scans(esum):
+    segments = flat.find_segments(flat.find_vertices(esum))
+
+    expected = [
+        seg
+        for seg in segments
+        if flat._esum_contains_seg_with_eps(esum, seg)
+        and not flat._esum_contains_seg_strict(esum, seg)
+    ]
+
+    assert flat.filter_segments(esum, segments) == expected
+    assert [seg for seg in segments if flat.segment_on_boundary(esum, seg)] == expected
+
+
+class TestXSegmentEndpoints:
+    @pytest.fixture
+    def hses(self):
+        return [
+            Hp(Pt(0, 0), Pt(0, 1)),
+            Hp(Pt(0, 0), Pt(1, 0)),
+            Hp(Pt(1, 0), Pt(1, 1)),
+        ]
+
+    def test_cached(self, hses):
+        segment = XSegment(*hses)
+
+        assert segment.x1 is segment.x1
+        assert segment.x2 is segment.x2
+        assert segment.x1.point is segment.x1.point
+
+    def test_reuses_matching_xs(self, hses):
+        h_left, h_bottom, h_right = hses
+        x_left = X(h_left, h_bottom)
+        x_right = X(h_right, h_bottom)
+
+        segment = XSegment.from_xs(x_left, x_right)
+
+        assert segment == XSegment(*hses)
+        assert segment.x1 is x_left
+        # Halfspace order doesn't match `x2`, so it's rebuilt.
+        assert segment.x2 == X(h_bottom, h_right)
+        assert segment.x2.point == Pt(1, 0)
+
+    def test_kept_by_renamed(self, hses):
+        segment = XSegment(*hses)
+        x1 = segment.x1
+
+        renamed = segment.renamed("renamed")
+        assert renamed.debug_name == "renamed"
+        assert renamed.x1 is x1
+        assert renamed == segment
+        assert hash(renamed) == hash(XSegment(*hses))
+
+    def test_not_init_fields(self, hses):
+        with pytest.raises(TypeError):
+            XSegment(*hses, _x1=X(hses[0], hses[1]))
+
+    def test_find_segments_reuses_xs(self, hses):
+        h_left, h_bottom, h_right = hses
+        x_left = X(h_left, h_bottom)
+
+        (segment,) = flat.find_segments([x_left, X(h_bottom, h_right)])
+
+        assert segment.debug_name == "0"
+        assert segment.x1 is x_left or segment.x2 is x_left
+
+
+@pytest.mark.parametrize(
+    "esum",
+    [
+        common_shapes.letter_c(),
+        common_shapes.hourglass(),
+        shape_gen.rect_union_chain(n=4),
+    ],
+)
+def test_find_segments_covers_every_hs(esum):
+    xs = list(flat.find_vertices(esum))
+    segments = flat.find_segments(xs)
+
+    expected = set()
+    for hs, xs_on_hs in flat.hs_xs_index(xs).items():
+        if len(xs_on_hs) > 1:
+            expected.update(infer_smallest_segments(list(xs_on_hs), hs))
+
+    assert len(segments) == len(set(segments))
+    assert set(segments) == expected
+    assert [seg.debug_name for seg in segments] == [
+        f"{seg_i}" for seg_i in range(len(segments))
+    ]
+
+
 @dataclasses.dataclass(frozen=True)
 class SampleModel:
     sample_field: str
@@ -531,3 +633,425 @@ def test_points_bbox(pts, expected_bbox):
 )
 def test_segment_on_boundary(esum, segment, expected):
     assert flat.segment_on_boundary(esum, segment) == expected
+
+
+def _vertex_pairs(xs):
+    return {frozenset(x.halfspaces) for x in xs}
+
+
+@pytest.mark.parametrize(
+    "esum",
+    [
+        common_shapes.letter_c(),
+        common_shapes.crude_c(),
+        common_shapes.big_l(),
+        common_shapes.hourglass(),
+        common_shapes.letter_chi(),
+        common_shapes.single_hs(),
+        shape_gen.rect_union_chain(n=10),
+        shape_gen.rect_intersection_chain(n=6),
+        shape_gen.play_button_chain(min_x=4.0, min_y=3.0, n=2, stride=0.2),
+    ],
+)
+def test_find_vertices_clipped_matches_find_vertices(esum):
+    assert _vertex_pairs(flat.find_vertices_clipped(esum)) == _vertex_pairs(
+        flat.find_vertices(esum)
+    )
+
+
+@pytest.mark.parametrize(
+    "esum",
+    [
+        common_shapes.triangle(),
+        common_shapes.letter_c(),
+        common_shapes.hourglass(),
+        shape_gen.play_button_chain(min_x=4.0, min_y=3.0, n=2, stride=0.2),
+        Esum.empty,
+    ],
+)
+@pytest.mark.parametrize(
+    "with_eps,ref_fn",
+    [
+        (False, flat._esum_contains_pt_strict),
+        (True, flat._esum_contains_pt_with_eps),
+    ],
+)
+def test_contains_many(esum, with_eps, ref_fn):
+    pts = np.array(
+        [[x, y] for x in np.arange(-1, 16, 0.5) for y in np.arange(-1, 16, 0.5)]
+    )
+
+    expected = [ref_fn(esum, Pt(x, y)) for x, y in pts.tolist()]
+
+    assert esum.contains_many(pts, with_eps=with_eps).tolist() == expected
+
+
+class TestEtermRegionBbox:
+    def test_bounded(self):
+        eterm = shape_gen.rect(1, 2, 3, 4).eterms[0]
+        assert eterm.bounded
+        assert eterm.region_bbox == Box(min_x=1, min_y=2, max_x=4, max_y=6)
+
+    @pytest.mark.parametrize(
+        "eterm",
+        [
+            Eterm.from_hses(),
+            Eterm.from_hses(Hpc(Pt(0, 0), Pt(1, 0))),
+            # a strip
+            Eterm.from_hses(Hpc(Pt(0, 0), Pt(1, 0)), Hpc(Pt(1, 2), Pt(0, 2))),
+            # a wedge
+            Eterm.from_hses(
+                Hpc(Pt(0, 0), Pt(1, 0)),
+                Hpc(Pt(0, 1), Pt(0, 0)),
+                Hpc(Pt(-1, 1), Pt(-1, 0)),
+            ),
+        ],
+    )
+    def test_unbounded(self, eterm):
+        assert not eterm.bounded
+        assert eterm.region_bbox is None
+
+    def test_empty(self):
+        rect1 = shape_gen.rect(0, 0, 1, 1).eterms[0]
+        rect2 = shape_gen.rect(5, 5, 1, 1).eterms[0]
+        eterm = Eterm(hses=rect1.hses | rect2.hses)
+
+        assert eterm.region_bbox == flat.EMPTY_BOX
+
+    def test_cached(self):
+        eterm = shape_gen.rect(1, 2, 3, 4).eterms[0]
+        assert eterm.region_bbox is eterm.region_bbox
+        assert eterm.bbox is eterm.bbox
+
+
+@pytest.mark.parametrize(
+    "box1,box2,expected",
+    [
+        (Box(0, 0, 1, 1), Box(0.5, 0.5, 2, 2), True),
+        (Box(0, 0, 1, 1), Box(1.05, 0, 2, 1), True),
+        (Box(0, 0, 1, 1), Box(2, 0, 3, 1), False),
+        (Box(0, 0, 1, 1), Box(0, 2, 1, 3), False),
+        (Box(0, 0, 1, 1), flat.EMPTY_BOX, False),
+        (flat.EMPTY_BOX, flat.EMPTY_BOX, False),
+    ],
+)
+def test_boxes_collide(box1, box2, expected):
+    assert flat._boxes_collide(box1, box2) == expected
+    assert flat._boxes_collide(box2, box1) == expected
+
+
+def test_intersection_culls_disjoint_terms():
+    assert len(shape_gen.rect_intersection_chain(n=6).eterms) == 0
+
+
+@pytest.mark.parametrize("n", [2, 3])
+def test_culled_intersection_contains_same_points(n):
+    shapes = [
+        shape_gen.play_button_shape(4 + i * 0.2, 3 + i * 0.2, 10.0, 6.0)
+        for i in range(n)
+    ]
+    culled = shapes[0]
+    full = shapes[0]
+    for shape in shapes[1:]:
+        culled = culled.intersection(shape)
+        full = Esum.from_terms(
+            *[
+                Eterm(hses=term1.hses | term2.hses)
+                for term1 in full.eterms
+                for term2 in shape.eterms
+            ]
+        )
+
+    pts = np.array(
+        [[x, y] for x in np.arange(2, 18, 0.25) for y in np.arange(1, 12, 0.25)]
+    )
+
+    assert len(culled.eterms) < len(full.eterms)
+    assert culled.contains_many(pts).tolist() == full.contains_many(pts).tolist()
+    assert (
+        culled.contains_many(pts, with_eps=True).tolist()
+        == full.contains_many(pts, with_eps=True).tolist()
+    )
+
+
+class TestEtermFeasible:
+    @pytest.mark.parametrize(
+        "eterm",
+        [
+            Eterm.from_hses(),
+            Eterm.from_hses(Hpc(Pt(0, 0), Pt(1, 0))),
+            shape_gen.rect(1, 2, 3, 4).eterms[0],
+            # a single point
+            Eterm(
+                hses=shape_gen.rect(0, 0, 1, 1).eterms[0].hses
+                | shape_gen.rect(1, 1, 1, 1).eterms[0].hses
+            ),
+            # a line
+            Eterm.from_hses(Hpc(Pt(0, 0), Pt(1, 0)), Hpc(Pt(1, 0), Pt(0, 0))),
+        ],
+    )
+    def test_feasible(self, eterm):
+        assert eterm.feasible
+
+    @pytest.mark.parametrize(
+        "eterm",
+        [
+            Eterm(
+                hses=shape_gen.rect(0, 0, 1, 1).eterms[0].hses
+                | shape_gen.rect(5, 5, 1, 1).eterms[0].hses
+            ),
+            # two halfplanes facing away from each other
+            Eterm.from_hses(Hpc(Pt(0, 0), Pt(1, 0)), Hpc(Pt(1, -1), Pt(0, -1))),
+            # an unbounded wedge and a halfplane facing away from it
+            Eterm.from_hses(
+                Hpc(Pt(0, 0), Pt(1, 0)),
+                Hpc(Pt(0, 1), Pt(0, 0)),
+                Hpc(Pt(0, -1), Pt(-1, 0)),
+            ),
+        ],
+    )
+    def test_infeasible(self, eterm):
+        assert not eterm.feasible
+
+
+def test_prune_chained_differences():
+    pruned = shape_gen.rect(0, 0, 20, 20)
+    full = pruned
+    for rect_i in range(4):
+        a_rect = shape_gen.rect(rect_i * 3.0, 1.0, 2.0, 2.0)
+        pruned = pruned.difference(a_rect)
+        full = full.intersection(a_rect.conjugate)
+
+    pts = np.array(
+        [[x, y] for x in np.arange(-1, 21, 0.25) for y in np.arange(-1, 5, 0.25)]
+    )
+
+    assert len(pruned.eterms) < len(full.eterms) / 2
+    assert full.pruned() == pruned
+    assert pruned.contains_many(pts).tolist() == full.contains_many(pts).tolist()
+    assert (
+        pruned.contains_many(pts, with_eps=True).tolist()
+        == full.contains_many(pts, with_eps=True).tolist()
+    )
+
+
+class TestMinimized:
+    def test_drops_redundant_hses(self):
+        rect = shape_gen.rect(0, 0, 4, 4).eterms[0]
+        bigger_rect = shape_gen.rect(-1, -1, 6, 6).eterms[0]
+        eterm = Eterm(hses=rect.hses | bigger_rect.hses)
+
+        assert eterm.minimized() == rect
+
+    def test_keeps_most_restrictive_parallel_hs(self):
+        eterm = Eterm.from_hses(
+            Hpc(Pt(0, 0), Pt(1, 0)),
+            Hpc(Pt(0, 1), Pt(1, 1)),
+            Hp(Pt(0, 1), Pt(1, 1)),
+        )
+
+        assert eterm.minimized() == Eterm.from_hses(Hp(Pt(0, 1), Pt(1, 1)))
+
+    def test_drops_hs_touching_a_vertex(self):
+        triangle = common_shapes.triangle().eterms[0]
+        (vertex,) = [
+            x.point
+            for x in flat.find_vertices(common_shapes.triangle())
+            if x.point.y > 5
+        ]
+        touching = Hpc(Pt(vertex.x + 1, vertex.y), Pt(vertex.x - 1, vertex.y))
+
+        eterm = Eterm(hses=FOSet([*triangle.hses, touching]))
+        assert eterm.minimized() == triangle
+
+    def test_infeasible(self):
+        eterm = Eterm.from_hses(Hpc(Pt(0, 0), Pt(1, 0)), Hpc(Pt(1, -1), Pt(0, -1)))
+        assert eterm.minimized() is None
+
+    def test_zero_area_is_unchanged(self):
+        eterm = Eterm.from_hses(Hpc(Pt(0, 0), Pt(1, 0)), Hpc(Pt(1, 0), Pt(0, 0)))
+        assert eterm.minimized() is eterm
+
+
+@pytest.mark.parametrize(
+    "esum",
+    [
+        common_shapes.letter_c(),
+        common_shapes.big_l(),
+        shape_gen.rect_intersection_chain(n=4),
+        shape_gen.play_button_chain(min_x=4.0, min_y=3.0, n=3, stride=0.2),
+    ],
+)
+def test_minimized_esum_has_same_shape(esum):
+    minimized = esum.minimized()
+    pts = np.array(
+        [[x, y] for x in np.arange(-1, 20, 0.25) for y in np.arange(-1, 20, 0.25)]
+    )
+
+    def _total_length(segments):
+        return sum(seg.x1.point.distance(seg.x2.point) for seg in segments)
+
+    n_hses = sum(len(eterm.hses) for eterm in esum.eterms)
+    n_minimized_hses = sum(len(eterm.hses) for eterm in minimized.eterms)
+    assert n_minimized_hses < n_hses
+    assert minimized.contains_many(pts).tolist() == esum.contains_many(pts).tolist()
+    assert _total_length(flat.detect_boundary(minimized)) == pytest.approx(
+        _total_length(flat.detect_boundary(esum))
+    )
+
+
+class TestNotEsum:
+    SHAPES = [
+        common_shapes.crude_c(),
+        common_shapes.big_l(),
+        common_shapes.hourglass(),
+        shape_gen.rect_union_chain(n=4),
+        Esum.empty,
+    ]
+
+    @staticmethod
+    def _grid_pts():
+        return np.array(
+            [[x, y] for x in np.arange(-1, 15, 0.25) for y in np.arange(-1, 15, 0.25)]
+        )
+
+    @pytest.mark.parametrize("esum", SHAPES)
+    def test_contains_same_as_conjugate(self, esum):
+        not_esum = esum.lazy_conjugate
+        pts = self._grid_pts()
+
+        for with_eps in [False, True]:
+            assert (
+                not_esum.contains_many(pts, with_eps=with_eps).tolist()
+                == esum.conjugate.contains_many(pts, with_eps=with_eps).tolist()
+            )
+        assert [not_esum.contains(Pt(x, y)) for x, y in pts[::7].tolist()] == [
+            esum.conjugate.contains(Pt(x, y)) for x, y in pts[::7].tolist()
+        ]
+
+    @pytest.mark.parametrize("esum", SHAPES)
+    def test_expand(self, esum):
+        assert esum.lazy_conjugate.expand() == esum.conjugate.pruned()
+        assert esum.lazy_conjugate.conjugate is esum
+
+    def test_expand_within(self):
+        within = shape_gen.rect(0, 0, 20, 20)
+        other = shape_gen.rect_union_chain(n=3)
+
+        assert (
+            other.lazy_conjugate.expand(within=within)
+            == within.intersection(other.conjugate).pruned()
+        )
+
+    def test_detect_boundary(self):
+        esum = common_shapes.crude_c()
+
+        assert flat.detect_boundary(esum.lazy_conjugate) == flat.detect_boundary(
+            esum.conjugate.pruned()
+        )
+
+
+class TestEtermIndex:
+    SHAPES = [
+        shape_gen.rect_union_chain(n=30),
+        shape_gen.rect_intersection_chain(n=4),
+        common_shapes.crude_c().conjugate,
+        common_shapes.hourglass(),
+        Esum.empty,
+    ]
+
+    @staticmethod
+    def _grid_pts():
+        return np.array(
+            [[x, y] for x in np.arange(-2, 25, 0.25) for y in np.arange(-2, 25, 0.25)]
+        )
+
+    def test_cached(self):
+        esum = shape_gen.rect_union_chain(n=3)
+        assert esum.index is esum.index
+
+    @pytest.mark.parametrize("esum", SHAPES)
+    def test_candidates_cover_containing_eterms(self, esum):
+        index = esum.index
+        for x, y in self._grid_pts().tolist():
+            pt = Pt(x, y)
+            candidates = set(index.candidates(pt))
+            for eterm in esum.eterms:
+                if flat._eterm_contains_pt_with_eps(eterm, pt):
+                    assert eterm in candidates
+
+    def test_skips_far_eterms(self):
+        esum = shape_gen.rect_union_chain(n=30)
+        assert len(esum.index.candidates(Pt(1.0, 1.0))) < len(esum.eterms) / 3
+        assert len(esum.index.candidates(Pt(-100.0, 1.0))) == 0
+
+    @pytest.mark.parametrize("esum", SHAPES)
+    def test_same_as_full_scan(self, esum, monkeypatch):
+        pts = self._grid_pts()
+        segments = flat.find_segments(flat.find_vertices(esum))
+
+        def _results():
+            return (
+                esum.contains_many(pts).tolist(),
+                esum.contains_many(pts, with_eps=True).tolist(),
+                [esum.contains(Pt(x, y)) for x, y in pts[::5].tolist()],
+                flat.filter_segments(esum, segments),
+                [seg for seg in segments if flat.segment_on_boundary(esum, seg)],
+            )
+
+        monkeypatch.setattr(flat, "_INDEX_MIN_ETERMS", 0)
+        indexed = _results()
+        monkeypatch.setattr(flat, "_INDEX_MIN_ETERMS", 10**9)
+        scanned = _results()
+
+        assert indexed == scanned
+
+
+def _segments_geometry(segments):
+    out = set()
+    for seg in segments:
+        pt1, pt2 = seg.x1.point, seg.x2.point
+        if pt1.distance(pt2) > 1e-9:
+            coords = (round(c, 6) for c in (pt1.x, pt1.y, pt2.x, pt2.y))
+            out.add((seg.common_hs, *coords))
+    return out
+
+
+@pytest.mark.parametrize(
+    "esum",
+    [
+        common_shapes.triangle(),
+        common_shapes.letter_c(),
+        common_shapes.hourglass(),
+        common_shapes.letter_chi(),
+        common_shapes.single_hs(),
+        common_shapes.crude_c().conjugate,
+        shape_gen.rect_union_chain(n=10),
+        shape_gen.play_button_chain(min_x=4.0, min_y=3.0, n=2, stride=0.2),
+        Esum.empty,
+    ],
+)
+def test_iter_boundary_same_as_detect_boundary(esum):
+    segments = list(flat.iter_boundary(esum))
+
+    assert len(segments) == len(set(segments))
+    assert _segments_geometry(segments) == _segments_geometry(
+        flat.detect_boundary(esum)
+    )
+
+
+def test_iter_boundary_is_lazy(monkeypatch):
+    esum = shape_gen.rect_union_chain(n=10)
+    n_hses = len({hs for eterm in esum.eterms for hs in eterm.hses})
+    calls = []
+    filter_segments = flat.filter_segments
+
+    def _counting_filter(esum, segments):
+        calls.append(len(segments))
+        return filter_segments(esum, segments)
+
+    monkeypatch.setattr(flat, "filter_segments", _counting_filter)
+
+    next(flat.iter_boundary(esum))
+
+    assert len(calls) < n_hses
@@ -0,0 +1,163 @@
+import random
+
+import pytest
+
+from halfplane import common_shapes, flat, incremental, shape_gen
+
+
+def _segments_geometry(segments):
+    out = set()
+    for seg in segments:
+        pt1, pt2 = seg.x1.point, seg.x2.point
+        if pt1.distance(pt2) > 1e-9:
+            coords = (round(c, 6) for c in (pt1.x, pt1.y, pt2.x, pt2.y))
+            out.add((seg.common_hs, *coords))
+    return out
+
+
+def _vertex_lines(vertices):
+    return {frozenset((x.hs1, x.hs2)) for x in vertices}
+
+
+def _assert_same_as_full(boundary):
+    expected = flat.detect_boundary(boundary.esum)
+
+    assert _segments_geometry(boundary.segments) == _segments_geometry(expected)
+    assert _vertex_lines(boundary.vertices) == _vertex_lines(
+        flat.find_vertices(boundary.esum)
+    )
+
+
+@pytest.mark.parametrize("seed", [0, 1])
+def test_random_edits_same_as_full(seed):
+    rng = random.Random(seed)
+    eterms = [
+        shape_gen.rect(
+            rng.randint(0, 12), rng.randint(0, 12), rng.randint(1, 5), rng.randint(1, 5)
+        ).eterms[0]
+        for _ in range(12)
+    ]
+    boundary = incremental.IncrementalBoundary()
+    live = []
+
+    for _ in range(25):
+        if live and rng.random() < 0.35:
+            boundary.remove_eterm(live.pop(rng.randrange(len(live))))
+        else:
+            eterm = rng.choice(eterms)
+            if eterm in live:
+                continue
+            live.append(eterm)
+            boundary.add_eterm(eterm)
+
+        _assert_same_as_full(boundary)
+
+
+def _random_triangle(rng):
+    pts = [flat.Pt(1000 + rng.uniform(0, 12), rng.uniform(0, 12)) for _ in range(3)]
+    (ax, ay), (bx, by), (cx, cy) = [(pt.x, pt.y) for pt in pts]
+    if (bx - ax) * (cy - ay) - (by - ay) * (cx - ax) < 0:
+        pts.reverse()
+    return flat.Eterm.from_hses(
+        *(flat.Hpc(pts[i], pts[(i + 1) % 3]) for i in range(3))
+    )
+
+
+def test_random_triangle_edits_same_as_full():
+    # Lines in all directions, far from the origin. They share the index
+    # buckets with lines that aren't quite parallel to them.
+    rng = random.Random(3)
+    eterms = [_random_triangle(rng) for _ in range(10)]
+    boundary = incremental.IncrementalBoundary(flat.Esum.from_terms(*eterms[:4]))
+    live = list(eterms[:4])
+
+    for _ in range(20):
+        eterm = rng.choice(eterms)
+        if eterm in live:
+            live.remove(eterm)
+            boundary.remove_eterm(eterm)
+        else:
+            live.append(eterm)
+            boundary.add_eterm(eterm)
+
+        _assert_same_as_full(boundary)
+
+
+def test_line_index_widens_for_tilted_lines():
+    # A line close to horizontal, and a small box far from the origin along
+    # it. The box's offset along the bucket's normal is nowhere near the
+    # line's.
+    tilted = flat.Hpc(flat.Pt(0, 0), flat.Pt(1, 0.02))
+    origin_eterm = shape_gen.rect(0, 0, 1, 1).eterms[0]
+    box_eterm = shape_gen.rect(999, 19, 2, 2).eterms[0]
+    lines = incremental._LineTable()
+    lines.add(tilted)
+    index = incremental._LineIndex.from_lines(lines, [origin_eterm, box_eterm])
+
+    assert index.lines_through(box_eterm.reach_box).tolist() == [0]
+    assert index.eterms_crossed_by(0) == [origin_eterm, box_eterm]
+
+    index.remove_eterm(box_eterm)
+    index.remove_line(0)
+    index.add_line(0, lines.ends.data[0])
+    index.add_eterm(box_eterm)
+
+    assert index.lines_through(box_eterm.reach_box).tolist() == [0]
+    assert index.eterms_crossed_by(0) == [origin_eterm, box_eterm]
+    far_box = shape_gen.rect(999, 60, 2, 2).eterms[0].reach_box
+    assert index.lines_through(far_box).size == 0
+
+
+def test_many_edits_same_as_full():
+    # Enough edits to repick the grid's cell size a few times.
+    rng = random.Random(2)
+    eterms = [
+        shape_gen.rect(
+            rng.randint(0, 40), rng.randint(0, 40), rng.randint(1, 5), rng.randint(1, 5)
+        ).eterms[0]
+        for _ in range(40)
+    ]
+    boundary = incremental.IncrementalBoundary(flat.Esum.from_terms(*eterms[:20]))
+    live = list(eterms[:20])
+
+    for step in range(300):
+        eterm = rng.choice(eterms)
+        if eterm in live:
+            live.remove(eterm)
+            boundary.remove_eterm(eterm)
+        else:
+            live.append(eterm)
+            boundary.add_eterm(eterm)
+
+        if step % 50 == 0:
+            _assert_same_as_full(boundary)
+
+    assert boundary.esum == flat.Esum.from_terms(*live)
+    _assert_same_as_full(boundary)
+
+
+@pytest.mark.parametrize(
+    "esum",
+    [common_shapes.hourglass(), common_shapes.crude_c(), shape_gen.rect_union_chain(4)],
+)
+def test_from_esum(esum):
+    _assert_same_as_full(incremental.IncrementalBoundary(esum))
+
+
+def test_remove_everything():
+    esum = shape_gen.rect_union_chain(3)
+    boundary = incremental.IncrementalBoundary(esum)
+
+    for eterm in esum.eterms:
+        boundary.remove_eterm(eterm)
+
+    assert boundary.esum == flat.Esum.empty
+    assert boundary.segments == []
+    assert boundary.vertices == set()
+
+
+def test_remove_missing():
+    boundary = incremental.IncrementalBoundary(shape_gen.rect_union_chain(2))
+
+    with pytest.raises(KeyError):
+        boundary.remove_eterm(shape_gen.rect(100, 100, 1, 1).eterms[0])
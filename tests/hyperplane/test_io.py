@@ -0,0 +1,193 @@
+import dataclasses
+import io as std_io
+from fractions import Fraction
+
+import numpy as np
+import pytest
+
+from halfplane import common_shapes, core, flat, io, shape_gen
+
+
+SHAPES = [
+    common_shapes.triangle(),
+    common_shapes.letter_c(),
+    shape_gen.rect_union_chain(n=3),
+    shape_gen.rect(0, 0, 2, 2).difference(shape_gen.rect(1, 1, 1, 1)),
+    flat.Esum.empty,
+]
+
+
+@pytest.mark.parametrize("esum", SHAPES)
+def test_dump_load_round_trip(esum):
+    vertices = flat.find_vertices(esum)
+
+    loaded, points = io.loads_shape(io.dumps_shape(esum, vertices))
+
+    assert loaded == esum
+    assert points == [v.point for v in vertices]
+
+
+def test_name_is_kept():
+    esum = dataclasses.replace(shape_gen.rect(0, 0, 1, 1), name="square")
+
+    loaded, points = io.loads_shape(io.dumps_shape(esum, None))
+
+    assert loaded.name == "square"
+    assert points == []
+
+
+@pytest.mark.parametrize("esum", SHAPES)
+def test_lines_round_trip(esum):
+    buf = std_io.StringIO()
+    io.dump_shape_lines(esum, buf)
+
+    buf.seek(0)
+    assert io.load_shape_lines(buf) == esum
+    buf.seek(0)
+    assert list(io.iter_eterms(buf)) == list(esum.eterms)
+
+
+def test_iter_eterms_is_lazy():
+    esum = shape_gen.rect_union_chain(n=3)
+    buf = std_io.StringIO()
+    io.dump_shape_lines(esum, buf)
+    lines = buf.getvalue().splitlines(keepends=True)
+    consumed = []
+
+    def _lines():
+        for line in lines:
+            consumed.append(line)
+            yield line
+
+    class _Reader:
+        def __init__(self):
+            self._lines = _lines()
+
+        def readline(self):
+            return next(self._lines, "")
+
+        def __iter__(self):
+            return self._lines
+
+    eterms = io.iter_eterms(_Reader())
+    first = next(eterms)
+
+    assert first == next(iter(esum.eterms))
+    assert len(consumed) == 2
+
+
+def test_fractions_round_trip():
+    third = Fraction(1, 3)
+    esum = flat.Esum.from_terms(
+        flat.Eterm.from_hses(
+            flat.Hp(flat.Pt(0, 0), flat.Pt(1, third)),
+            flat.Hp(flat.Pt(1, third), flat.Pt(0, 1)),
+            flat.Hp(flat.Pt(0, 1), flat.Pt(0, 0)),
+        )
+    )
+    with core.robust_predicates():
+        vertices = flat.find_vertices(esum)
+
+    def _coords(esum):
+        return [
+            (c, type(c))
+            for term in esum.eterms
+            for hs in term.hses
+            for c in (hs.p1.x, hs.p1.y, hs.p2.x, hs.p2.y)
+        ]
+
+    loaded, points = io.loads_shape(io.dumps_shape(esum, vertices))
+    assert _coords(loaded) == _coords(esum)
+    assert points == [v.point for v in vertices]
+    assert any(isinstance(pt.y, Fraction) for pt in points)
+
+    buf = std_io.StringIO()
+    io.dump_shape_lines(esum, buf)
+    buf.seek(0)
+    assert _coords(flat.Esum.from_terms(*io.iter_eterms(buf))) == _coords(esum)
+
+
+def test_hpc_type_is_kept():
+    esum = flat.Esum.from_terms(
+        flat.Eterm.from_hses(
+            flat.Hpc(flat.Pt(0, 0), flat.Pt(1, 0)),
+            flat.Hp(flat.Pt(1, 0), flat.Pt(0, 1)),
+            flat.Hpc(flat.Pt(0, 1), flat.Pt(0, 0)),
+        )
+    )
+
+    loaded, _ = io.loads_shape(io.dumps_shape(esum, None))
+
+    types = [type(hs) for term in loaded.eterms for hs in term.hses]
+    assert flat.Hpc in types
+    assert loaded == esum
+
+
+@pytest.mark.parametrize(
+    "text",
+    [
+        "",
+        '{"format": "something-else"}\n',
+        '{"format": "halfplane-esum-lines", "version": 99}\n',
+        '{"format": "halfplane-esum-lines", "version": 1}\n[{"p1": \n',
+        '{"format": "halfplane-esum-lines", "version": 1}\n'
+        '[{"p1": {"x": 0, "y": 0}, "p2": {"x": 1, "y": 0}, "type": "Nope"}]\n',
+    ],
+)
+def test_broken_lines(text):
+    with pytest.raises(ValueError):
+        list(io.iter_eterms(std_io.StringIO(text)))
+
+
+
+def _npz_round_trip(esum, vertices=None, segments=None, **kwargs):
+    buf = std_io.BytesIO()
+    io.dump_shape_npz(esum, vertices, segments, buf, **kwargs)
+    buf.seek(0)
+    return io.load_shape_npz(buf)
+
+
+@pytest.mark.parametrize("esum", SHAPES)
+@pytest.mark.parametrize("compress", [False, True])
+def test_npz_round_trip(esum, compress):
+    vertices = flat.find_vertices(esum)
+    segments = flat.detect_boundary(esum)
+
+    shape = _npz_round_trip(
+        esum, vertices=vertices, segments=segments, compress=compress
+    )
+    loaded, loaded_vertices, loaded_segments = shape.to_objects()
+
+    assert loaded == esum
+    assert loaded_vertices == vertices
+    assert loaded_segments == segments
+    assert shape.endpoints.dtype == np.float64
+    assert shape.endpoints.flags.c_contiguous
+
+
+def test_npz_optional_parts():
+    esum = dataclasses.replace(shape_gen.rect(0, 0, 1, 1), name="square")
+
+    shape = _npz_round_trip(esum)
+
+    assert shape.vertices is None and shape.segments is None
+    assert shape.name == "square"
+    assert shape.to_objects() == (esum, None, None)
+
+
+def test_npz_foreign_halfspace():
+    other = shape_gen.rect(5, 5, 1, 1)
+
+    with pytest.raises(ValueError):
+        _npz_round_trip(
+            shape_gen.rect(0, 0, 1, 1), segments=flat.detect_boundary(other)
+        )
+
+
+def test_npz_version_check():
+    buf = std_io.BytesIO()
+    np.savez(buf, version=np.array(io.NPZ_VERSION + 1))
+    buf.seek(0)
+
+    with pytest.raises(ValueError):
+        io.load_shape_npz(buf)
@@ -0,0 +1,93 @@
+import pickle
+
+import pytest
+
+from halfplane import common_shapes, flat, parallel, shape_gen
+
+
+SHAPES = [
+    common_shapes.triangle(),
+    common_shapes.hourglass(),
+    common_shapes.crude_c(),
+    shape_gen.rect_union_chain(n=4),
+    shape_gen.rect_intersection_chain(n=3),
+    flat.Esum.empty,
+]
+
+
+@pytest.mark.parametrize("workers,chunksize", [(1, None), (2, None), (2, 4)])
+def test_same_as_serial(workers, chunksize):
+    expected = [flat.detect_boundary(esum) for esum in SHAPES]
+
+    assert (
+        parallel.detect_boundary_many(SHAPES, workers=workers, chunksize=chunksize)
+        == expected
+    )
+
+
+def test_iter_covers_every_esum():
+    results = dict(parallel.iter_detect_boundary_many(SHAPES, workers=2, chunksize=1))
+
+    assert sorted(results) == list(range(len(SHAPES)))
+    assert results[1] == flat.detect_boundary(SHAPES[1])
+
+
+def test_not_esum():
+    not_esum = common_shapes.crude_c().lazy_conjugate
+
+    assert parallel.detect_boundary_many([not_esum], workers=2) == [
+        flat.detect_boundary(not_esum)
+    ]
+
+
+def test_shared_esums():
+    with parallel.SharedEsums(SHAPES) as shared:
+        with parallel.attach(shared.handle) as view:
+            assert len(view) == len(SHAPES)
+            for esum_i, esum in enumerate(SHAPES):
+                assert view.esum(esum_i).eterms == esum.eterms
+                hs_table = view.table(esum_i)
+                for field in ["endpoints", "closed", "eterm_offsets"]:
+                    assert (
+                        getattr(hs_table, field).tolist()
+                        == getattr(esum.table, field).tolist()
+                    )
+
+
+def test_shared_esums_handle_is_small():
+    with parallel.SharedEsums(SHAPES * 50) as shared:
+        assert len(pickle.dumps(shared.handle)) < 300
+
+
+def test_shared_esums_are_removed():
+    shared = parallel.SharedEsums(SHAPES)
+    handle = shared.handle
+    shared.close()
+    shared.close()
+
+    with pytest.raises(FileNotFoundError):
+        with parallel.attach(handle):
+            pass
+
+
+def test_shared_esums_removed_when_fill_fails(monkeypatch):
+    handles = []
+
+    def _failing_views(buf, handle):
+        handles.append(handle)
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(parallel, "_block_views", _failing_views)
+    with pytest.raises(KeyboardInterrupt):
+        parallel.SharedEsums(SHAPES)
+    monkeypatch.undo()
+
+    with pytest.raises(FileNotFoundError):
+        with parallel.attach(handles[0]):
+            pass
+
+
+def test_shared_esums_empty():
+    with parallel.SharedEsums([]) as shared:
+        with parallel.attach(shared.handle) as view:
+            assert len(view) == 0
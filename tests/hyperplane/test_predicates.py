@@ -0,0 +1,271 @@
+import itertools
+import random
+import threading
+from fractions import Fraction
+
+import numpy as np
+import pytest
+
+from halfplane import bsp, common_shapes, core, flat, predicates, shape_gen
+
+
+def _hp(x1, y1, x2, y2):
+    return flat.Hp(flat.Pt(x1, y1), flat.Pt(x2, y2))
+
+
+def _exact_cross(hs1, hs2):
+    px, py, p2x, p2y, qx, qy, q2x, q2y = map(Fraction, predicates._hs_coords(hs1, hs2))
+    ux, uy, vx, vy = p2x - px, p2y - py, q2x - qx, q2y - qy
+    d = ux * vy - uy * vx
+    if d == 0:
+        return None
+    tn = (qx - px) * vy - (qy - py) * vx
+    return px + ux * tn / d, py + uy * tn / d
+
+
+def _exact_orient(hs, x, y):
+    h1x, h1y, h2x, h2y = map(Fraction, predicates._hs_coords(hs))
+    det = (h2x - h1x) * (y - h1y) - (h2y - h1y) * (x - h1x)
+    return (det > 0) - (det < 0)
+
+
+def _random_hses(seed, n, scale):
+    rng = random.Random(seed)
+    # Coarse grids give many collinear and parallel configurations.
+    return [
+        _hp(*(rng.randint(-4, 4) * scale + rng.choice([0, 0, 1e-12]) for _ in "abcd"))
+        for _ in range(n)
+    ]
+
+
+@pytest.mark.parametrize("scale", [1, 1e9])
+def test_orient_matches_exact(scale):
+    base = 0.1 * scale
+    for i in range(-4, 5):
+        for j in range(-4, 5):
+            # Points along the line `y = x`, shifted by a few ulps.
+            x = base * i
+            y = x + j * 2**-52 * max(abs(x), 1)
+            det = (Fraction(base) * 3) * (Fraction(y) - Fraction(base)) - (
+                Fraction(base) * 3
+            ) * (Fraction(x) - Fraction(base))
+            expected = (det > 0) - (det < 0)
+            assert predicates.orient(base, base, 4 * base, 4 * base, x, y) == expected
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_orient_x_and_mid_match_exact(seed):
+    hses = [hs for hs in _random_hses(seed, 9, 1) if hs.p1 != hs.p2]
+    for hs, hs1, hs2, hs3 in itertools.product(hses[:4], hses, hses, hses[:3]):
+        x1, x2 = flat.X(hs1, hs2), flat.X(hs2, hs3)
+        pt1, pt2 = _exact_cross(hs1, hs2), _exact_cross(hs2, hs3)
+
+        expected = None if pt1 is None else _exact_orient(hs, *pt1)
+        assert predicates.orient_x(hs, x1) == expected
+
+        if pt1 is None or pt2 is None:
+            expected = None
+        else:
+            expected = _exact_orient(
+                hs, (pt1[0] + pt2[0]) / 2, (pt1[1] + pt2[1]) / 2
+            )
+        assert predicates.orient_mid(hs, x1, x2) == expected
+
+
+@pytest.mark.parametrize("np_type", [np.int64, np.float64])
+def test_numpy_scalars(np_type):
+    # Big enough for the degree 4 terms to overflow int64.
+    coords = [[0, 0, 2**40, 1], [0, 2**40, 2**40, 0], [1, 1, 2**40, 2**40 - 3]]
+    hs, hs1, hs2 = (_hp(*map(float, c)) for c in coords)
+    np_hs, np_hs1, np_hs2 = (_hp(*map(np_type, c)) for c in coords)
+
+    assert predicates.orient(*map(np_type, (0, 0, 2, 2, 1, 1))) == 0
+    assert predicates.orient(*map(np_type, (0, 0, 2, 2, 0, 1))) == 1
+    assert predicates.orient_x(np_hs, flat.X(np_hs1, np_hs2)) == predicates.orient_x(
+        hs, flat.X(hs1, hs2)
+    )
+    assert predicates.orient_mid(
+        np_hs, flat.X(np_hs1, np_hs2), flat.X(np_hs2, np_hs)
+    ) == predicates.orient_mid(hs, flat.X(hs1, hs2), flat.X(hs2, hs))
+    assert predicates.intersection(np_hs1, np_hs2) == predicates.intersection(
+        hs1, hs2
+    )
+
+
+def test_numpy_floats_take_the_float_path(monkeypatch):
+    def _exact(coords):
+        raise AssertionError("exact path")
+
+    monkeypatch.setattr(predicates, "_scaled_ints", _exact)
+    coords = map(np.float64, (0, 0, 2, 2, 0, 1))
+    assert predicates.orient(*coords) == 1
+
+
+def test_orient_mid_batch_agrees_where_unambiguous():
+    hses = [hs for hs in _random_hses(7, 12, 1e6) if hs.p1 != hs.p2]
+    segments = [
+        flat.XSegment(hs1, hs2, hs3)
+        for hs1, hs2, hs3 in itertools.permutations(hses, 3)
+    ]
+    hs_ends = flat._hses_endpoints(hses)
+    x1_ends = flat._hses_endpoints(
+        hs for seg in segments for hs in (seg.hs1, seg.common_hs)
+    ).reshape(-1, 2, 2, 2)
+    x2_ends = flat._hses_endpoints(
+        hs for seg in segments for hs in (seg.common_hs, seg.hs3)
+    ).reshape(-1, 2, 2, 2)
+
+    signs, ambiguous = predicates.orient_mid_batch(hs_ends, x1_ends, x2_ends)
+
+    assert ambiguous.any() and not ambiguous.all()
+    for hs_i, hs in enumerate(hses):
+        for seg_i, seg in enumerate(segments):
+            expected = predicates.orient_mid(hs, seg.x1, seg.x2)
+            if expected is None:
+                assert ambiguous[hs_i, seg_i]
+            elif not ambiguous[hs_i, seg_i]:
+                assert signs[hs_i, seg_i] == expected
+
+
+@pytest.mark.parametrize("seed", range(3))
+def test_intersection(seed):
+    hses = _random_hses(seed, 8, 1)
+    for hs1, hs2 in itertools.combinations(hses, 2):
+        expected = _exact_cross(hs1, hs2)
+        result = predicates.intersection(hs1, hs2)
+        if expected is None:
+            assert result is None
+        else:
+            # Nearly parallel lines are ill-conditioned, only the exact
+            # fallback is precise to the last bit.
+            assert result == pytest.approx(tuple(map(float, expected)), rel=1e-3)
+
+
+def test_intersection_of_fractions_is_exact():
+    third = Fraction(1, 3)
+    hs1 = _hp(0, 0, third, 1)
+    hs2 = _hp(0, third, 1, third)
+
+    assert predicates.intersection(hs1, hs2) == (Fraction(1, 9), third)
+    with core.robust_predicates():
+        assert flat.X(hs1, hs2).point == flat.Pt(Fraction(1, 9), third)
+
+
+def test_near_parallel_lines_are_not_parallel():
+    hs1 = _hp(0.0, 0.0, 1.0, 0.0)
+    hs2 = _hp(0.0, 1.0, 1.0, 1.0 - 2**-50)
+
+    assert predicates.intersection(hs1, hs2) == pytest.approx((2.0**50, 0.0))
+    assert predicates.intersection(hs1, _hp(0.0, 1.0, 1.0, 1.0)) is None
+
+
+def test_robust_predicates_restores_setting():
+    assert not core.settings.robust
+    with pytest.raises(RuntimeError):
+        with core.robust_predicates():
+            assert core.settings.robust
+            with core.robust_predicates(False):
+                assert not core.settings.robust
+            assert core.settings.robust
+            raise RuntimeError
+    assert not core.settings.robust
+
+
+def _segments_geometry(segments):
+    geometry = set()
+    for seg in segments:
+        pt1, pt2 = seg.x1.point, seg.x2.point
+        if pt1 != pt2:
+            coords = tuple(round(float(c), 6) for c in (pt1.x, pt1.y, pt2.x, pt2.y))
+            geometry.add((seg.common_hs, coords))
+    return geometry
+
+
+def _fresh(esum):
+    """Copy without cached cross points, which depend on the predicate mode."""
+    return flat.Esum.from_terms(
+        *(
+            flat.Eterm.from_hses(*(type(hs)(hs.p1, hs.p2) for hs in eterm.hses))
+            for eterm in esum.eterms
+        )
+    )
+
+
+@pytest.mark.parametrize(
+    "esum",
+    [
+        common_shapes.triangle(),
+        common_shapes.letter_c(),
+        common_shapes.hourglass(),
+        shape_gen.rect_union_chain(n=4),
+        shape_gen.play_button_chain(min_x=4.0, min_y=3.0, n=2, stride=0.2),
+        shape_gen.rect(0, 0, 2, 2).union(shape_gen.rect(2, 2, 2, 2)),
+    ],
+)
+def test_robust_detect_boundary_same_as_float(esum):
+    expected = _segments_geometry(flat.detect_boundary(_fresh(esum)))
+    with core.robust_predicates():
+        result = _segments_geometry(flat.detect_boundary(_fresh(esum)))
+
+    assert result == expected
+
+
+def test_robust_contains():
+    esum = shape_gen.rect(0, 0, 2, 2)
+    pts = [flat.Pt(1, 1), flat.Pt(0, 1), flat.Pt(3, 1), flat.Pt(Fraction(1, 3), 0)]
+    with core.robust_predicates():
+        strict = [esum.contains(pt) for pt in pts]
+        with_eps = [flat._esum_contains_pt_with_eps(esum, pt) for pt in pts]
+
+    assert strict == [True, False, False, False]
+    assert with_eps == [True, True, False, True]
+
+
+def test_robust_contains_many_has_no_eps():
+    esum = shape_gen.rect(0, 0, 2, 2)
+    # Just outside and just inside the left edge.
+    pts = [[-1e-12, 1.0], [1e-12, 1.0]]
+
+    assert esum.contains_many(pts, with_eps=True).tolist() == [True, True]
+    assert esum.contains_many(pts).tolist() == [False, False]
+    with core.robust_predicates():
+        assert esum.contains_many(pts, with_eps=True).tolist() == [False, True]
+        assert esum.contains_many(pts).tolist() == [False, True]
+
+
+def test_robust_setting_is_per_thread():
+    seen = []
+    with core.robust_predicates():
+        thread = threading.Thread(target=lambda: seen.append(core.settings.robust))
+        thread.start()
+        thread.join()
+        assert core.settings.robust
+
+    assert seen == [False]
+
+
+def test_robust_not_esum_contains_many():
+    not_esum = flat.NotEsum(shape_gen.rect(0, 0, 2, 2))
+    pts = [[-1e-12, 1.0], [0.0, 1.0], [1e-12, 1.0], [3.0, 1.0]]
+
+    with core.robust_predicates():
+        expected = [not_esum.contains(flat.Pt(x, y)) for x, y in pts]
+        result = not_esum.contains_many(pts).tolist()
+
+    assert expected == [True, False, False, True]
+    assert result == expected
+
+
+@pytest.mark.parametrize("with_eps", [False, True])
+def test_robust_compiled_esum(with_eps):
+    esum = shape_gen.rect(0, 0, 2, 2)
+    pts = [[-1e-12, 1.0], [0.0, 1.0], [1e-12, 1.0], [1.0, 1.0], [5.0, 1.0]]
+    with core.robust_predicates():
+        expected = esum.contains_many(pts, with_eps=with_eps).tolist()
+        compiled = bsp.compile_esum(esum, with_eps=with_eps)
+
+    # The mode is picked when compiling.
+    assert compiled.robust
+    assert compiled.contains_many(pts).tolist() == expected
+    assert [compiled.contains(flat.Pt(x, y)) for x, y in pts] == expected
+    assert not bsp.compile_esum(esum, robust=False).contains_many(pts)[2]
@@ -51,3 +51,33 @@ class TestEterm:
         centroid = flat.Pt(x=centroid_pos[0], y=centroid_pos[1])
 
         assert flat.box_contains_pt(eterm.bbox, centroid)
+
+
+_small_coords = st.integers(min_value=-20, max_value=20)
+
+
+@st.composite
+def _small_esums(draw):
+    eterms = draw(
+        st.lists(
+            st.lists(
+                _hses(coords=_small_coords).filter(lambda hs: hs.p1 != hs.p2),
+                min_size=1,
+                max_size=4,
+            ),
+            min_size=1,
+            max_size=4,
+        )
+    )
+    return flat.Esum.from_terms(*[flat.Eterm.from_hses(*hses) for hses in eterms])
+
+
+class TestEsum:
+    @given(esum=_small_esums())
+    def test_find_vertices_clipped_matches_find_vertices(self, esum: flat.Esum):
+        def _pairs(xs):
+            return {frozenset(x.halfspaces) for x in xs}
+
+        assert _pairs(flat.find_vertices_clipped(esum)) == _pairs(
+            flat.find_vertices(esum)
+        )
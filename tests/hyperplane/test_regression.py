@@ -514,8 +514,11 @@ def _endpoints_arr(segments: t.Sequence[XSegment]) -> np.ndarray:
         (common_shapes.letter_c(), _letter_c_boundary()),
     ],
 )
-def test_detect_boundary(esum, expected_segments):
-    segments = flat.detect_boundary(esum)
+@pytest.mark.parametrize(
+    "vertices_finder", [flat.find_vertices, flat.find_vertices_clipped]
+)
+def test_detect_boundary(esum, expected_segments, vertices_finder):
+    segments = flat.detect_boundary(esum, vertices_finder=vertices_finder)
     np.testing.assert_array_almost_equal(
         _endpoints_arr(segments), _endpoints_arr(expected_segments)
     )
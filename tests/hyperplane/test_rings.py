@@ -0,0 +1,93 @@
+import random
+
+import numpy as np
+import pytest
+
+from halfplane import common_shapes, core, flat, rings, shape_gen
+
+
+rect = shape_gen.rect
+
+
+@pytest.mark.parametrize(
+    "esum,areas,n_points",
+    [
+        (rect(0, 0, 3, 2), [6], [4]),
+        (shape_gen.rect_union_chain(n=4), [37], [16]),
+        (rect(0, 0, 10, 10).difference(rect(3, 3, 4, 4)), [100, -16], [4, 4]),
+        # Touching corners.
+        (rect(0, 0, 2, 2).union(rect(2, 2, 2, 2)), [4, 4], [4, 4]),
+        # Shared edge.
+        (rect(0, 0, 2, 2).union(rect(2, 0, 2, 2)), [8], [4]),
+        (flat.Esum.empty, [], []),
+    ],
+)
+def test_examples(esum, areas, n_points):
+    result = rings.boundary_rings(esum)
+
+    assert sorted(result.signed_areas().tolist(), reverse=True) == pytest.approx(areas)
+    assert sorted(len(result.ring(i)) for i in range(len(result))) == sorted(n_points)
+    assert result.is_hole.tolist() == [area < 0 for area in result.signed_areas()]
+
+
+def test_perimeter():
+    result = rings.boundary_rings(rect(0, 0, 10, 10).difference(rect(3, 3, 4, 4)))
+
+    assert result.perimeter() == pytest.approx(40 + 16)
+
+
+@pytest.mark.parametrize("seed", [0, 1, 2])
+def test_area_of_random_rects(seed):
+    rng = random.Random(seed)
+    esum = flat.Esum.from_terms(
+        *(
+            rect(
+                min_x=rng.randint(0, 12),
+                min_y=rng.randint(0, 12),
+                width=rng.randint(1, 5),
+                height=rng.randint(1, 5),
+            ).eterms[0]
+            for _ in range(10)
+        )
+    )
+    xs, ys = np.meshgrid(np.arange(0.5, 20), np.arange(0.5, 20))
+    cell_centers = np.stack([xs.ravel(), ys.ravel()], axis=1)
+
+    result = rings.boundary_rings(esum)
+
+    assert result.area() == pytest.approx(esum.contains_many(cell_centers).sum())
+
+
+@pytest.mark.parametrize(
+    "esum",
+    [
+        common_shapes.triangle(),
+        common_shapes.letter_c(),
+        common_shapes.hourglass(),
+        shape_gen.play_button_chain(min_x=4.0, min_y=3.0, n=2, stride=0.2),
+    ],
+)
+def test_points_are_on_boundary(esum):
+    result = rings.boundary_rings(esum)
+
+    assert len(result) > 0
+    assert result.area() > 0
+    with_eps = esum.contains_many(result.coords, with_eps=True)
+    strict = esum.contains_many(result.coords)
+    assert (with_eps & ~strict).all()
+
+
+def test_unbounded():
+    with pytest.raises(ValueError):
+        rings.boundary_rings(common_shapes.crude_c())
+
+
+def test_robust_thin_rect():
+    # The long edges are closer than `eps`, the float check sees both of them
+    # through each midpoint.
+    esum = rect(0, 0, 1, 1e-8)
+    with core.robust_predicates():
+        result = rings.boundary_rings(esum)
+
+    assert len(result) == 1
+    assert result.signed_areas().tolist() == pytest.approx([1e-8])
@@ -0,0 +1,158 @@
+import io as std_io
+import pickle
+import random
+
+import numpy as np
+import pytest
+
+from halfplane import common_shapes, flat, io, shape_gen, store
+
+
+def _covered_intervals(segments):
+    """Boundary as merged intervals along each line. Independent of where the
+    segments are split and of which halfspace a line belongs to.
+    """
+    by_line = {}
+    for seg in segments:
+        hs = seg.common_hs
+        direction = (hs.p2.position2d - hs.p1.position2d).astype(np.float64)
+        direction /= np.hypot(*direction)
+        if direction[0] < -1e-12 or (abs(direction[0]) <= 1e-12 and direction[1] < 0):
+            direction = -direction
+        offset = direction[0] * hs.p1.y - direction[1] * hs.p1.x
+        line = (round(direction[0], 6), round(direction[1], 6), round(offset, 6))
+        t1, t2 = (
+            float(np.dot(x.point.position2d, direction)) for x in (seg.x1, seg.x2)
+        )
+        if abs(t1 - t2) > 1e-9:
+            by_line.setdefault(line, []).append(sorted([t1, t2]))
+
+    out = set()
+    for line, intervals in by_line.items():
+        intervals.sort()
+        merged = [intervals[0]]
+        for start, stop in intervals[1:]:
+            if start <= merged[-1][1] + 1e-9:
+                merged[-1][1] = max(merged[-1][1], stop)
+            else:
+                merged.append([start, stop])
+        out.update((line, round(start, 6), round(stop, 6)) for start, stop in merged)
+    return out
+
+
+def _random_rects(seed, n):
+    rng = random.Random(seed)
+    return flat.Esum.from_terms(
+        *(
+            shape_gen.rect(
+                min_x=rng.randint(0, 20),
+                min_y=rng.randint(0, 20),
+                width=rng.randint(1, 5),
+                height=rng.randint(1, 5),
+            ).eterms[0]
+            for _ in range(n)
+        )
+    )
+
+
+SHAPES = [
+    common_shapes.triangle(),
+    common_shapes.hourglass(),
+    shape_gen.rect_union_chain(n=10),
+    shape_gen.play_button_chain(min_x=4.0, min_y=3.0, n=2, stride=0.2),
+    _random_rects(seed=0, n=30),
+    flat.Esum.empty,
+]
+
+
+@pytest.mark.parametrize("esum", SHAPES)
+def test_round_trip(esum, tmp_path):
+    shape_store = store.ShapeStore.create(tmp_path / "s", esum, chunksize=7)
+
+    assert len(shape_store) == len(esum.eterms)
+    assert shape_store.esum() == esum
+    assert isinstance(shape_store.table.endpoints, (np.memmap, np.ndarray))
+
+
+def test_create_from_lines(tmp_path):
+    esum = _random_rects(seed=1, n=10)
+    buf = std_io.StringIO()
+    io.dump_shape_lines(esum, buf)
+    buf.seek(0)
+
+    shape_store = store.ShapeStore.create(tmp_path / "s", io.iter_eterms(buf))
+
+    assert shape_store.esum() == esum
+    assert isinstance(shape_store.table.endpoints, np.memmap)
+
+
+@pytest.mark.parametrize("esum", SHAPES)
+@pytest.mark.parametrize("tiles", [1, 4])
+def test_contains_many(esum, tiles, tmp_path):
+    shape_store = store.ShapeStore.create(tmp_path / "s", esum)
+    rng = np.random.default_rng(0)
+    points = np.concatenate(
+        [rng.uniform(-2, 27, size=(300, 2)), rng.integers(0, 25, size=(100, 2))]
+    )
+
+    for with_eps in [False, True]:
+        result = shape_store.contains_many(points, with_eps=with_eps, tiles=tiles)
+        expected = esum.contains_many(points, with_eps=with_eps)
+        assert result.tolist() == expected.tolist()
+
+
+def test_culling(tmp_path):
+    shape_store = store.ShapeStore.create(
+        tmp_path / "s", shape_gen.rect_union_chain(n=10)
+    )
+
+    ids = shape_store.eterm_ids_in_box(flat.Box(0, 0, 0.5, 0.5))
+
+    assert 0 < len(ids) < len(shape_store)
+
+
+@pytest.mark.parametrize("esum", SHAPES)
+@pytest.mark.parametrize("tiles", [1, 3, (5, 2)])
+def test_detect_boundary(esum, tiles, tmp_path):
+    shape_store = store.ShapeStore.create(tmp_path / "s", esum)
+
+    segments = shape_store.detect_boundary(tiles=tiles, workers=1)
+
+    assert _covered_intervals(segments) == _covered_intervals(
+        flat.detect_boundary(esum)
+    )
+
+
+def test_detect_boundary_unbounded(tmp_path):
+    quadrant = flat.Eterm.from_hses(
+        flat.Hp(flat.Pt(0, 0), flat.Pt(1, 0)), flat.Hp(flat.Pt(0, 1), flat.Pt(0, 0))
+    )
+    esum = flat.Esum.from_terms(quadrant, shape_gen.rect(-1, -1, 2, 2).eterms[0])
+    shape_store = store.ShapeStore.create(tmp_path / "s", esum)
+
+    segments = shape_store.detect_boundary(tiles=3, workers=1)
+
+    assert _covered_intervals(segments) == _covered_intervals(
+        flat.detect_boundary(esum)
+    )
+
+
+def test_workers_share_the_files(tmp_path):
+    esum = _random_rects(seed=2, n=20)
+    shape_store = store.ShapeStore.create(tmp_path / "s", esum)
+
+    unpickled = pickle.loads(pickle.dumps(shape_store))
+    segments = shape_store.detect_boundary(tiles=3, workers=2)
+
+    assert len(pickle.dumps(shape_store)) < 500
+    assert unpickled.esum() == esum
+    assert _covered_intervals(segments) == _covered_intervals(
+        flat.detect_boundary(esum)
+    )
+
+
+def test_not_a_store(tmp_path):
+    (tmp_path / "meta.json").write_text('{"format": "something-else"}')
+
+    with pytest.raises(ValueError):
+        store.ShapeStore(tmp_path)
@@ -0,0 +1,176 @@
+import dataclasses
+
+import numpy as np
+import numpy.testing
+import pytest
+
+from halfplane import common_shapes, flat, shape_gen, table
+
+
+SHAPES = [
+    common_shapes.triangle(),
+    common_shapes.crude_c(),
+    common_shapes.letter_c(),
+    common_shapes.big_l(),
+    common_shapes.hourglass(),
+    shape_gen.rect_union_chain(n=5),
+    shape_gen.play_button_chain(min_x=4.0, min_y=3.0, n=2, stride=0.2),
+    flat.Esum.empty,
+]
+
+
+@pytest.mark.parametrize("esum", SHAPES)
+def test_round_trip(esum):
+    assert table.HsTable.from_esum(esum).to_esum().eterms == esum.eterms
+
+
+def test_round_trip_keeps_name():
+    esum = dataclasses.replace(common_shapes.triangle(), name="triangle")
+
+    assert esum.table.name == "triangle"
+    assert esum.table.to_esum() == esum
+    assert esum.table.to_esum().name == "triangle"
+
+
+def test_closed_flags():
+    eterm = flat.Eterm.from_hses(
+        flat.Hp(flat.Pt(0, 0), flat.Pt(1, 0)), flat.Hpc(flat.Pt(1, 0), flat.Pt(0, 1))
+    )
+    hs_table = table.HsTable.from_eterms([eterm])
+
+    assert hs_table.closed.tolist() == [False, True]
+    assert hs_table.hses() == list(eterm.hses)
+
+
+@pytest.mark.parametrize("esum", SHAPES)
+def test_segments_round_trip(esum):
+    segments = flat.detect_boundary(esum)
+    arrays = table.segments_to_arrays(segments)
+
+    assert table.segments_from_arrays(**arrays) == list(segments)
+    assert arrays["segments"].shape == (len(segments), 3)
+
+
+@pytest.mark.parametrize("esum", SHAPES)
+def test_find_all_xs(esum):
+    hs_table = table.HsTable.from_esum(esum)
+    pairs, points = table.find_all_xs(hs_table)
+
+    found = {
+        frozenset([hs_table.hs(i1), hs_table.hs(i2)]): pt
+        for (i1, i2), pt in zip(pairs.tolist(), points)
+    }
+    expected = {
+        frozenset(x.halfspaces): x.point
+        for x in flat.find_all_xs(hs for term in esum.eterms for hs in term.hses)
+    }
+
+    assert found.keys() == expected.keys()
+    for hs_pair, pt in found.items():
+        # Almost parallel lines cross far away, where both methods lose
+        # precision.
+        if np.abs(pt).max() > 1e6:
+            continue
+        numpy.testing.assert_array_almost_equal(pt, expected[hs_pair].position2d)
+
+
+def test_select():
+    esum = shape_gen.rect_union_chain(n=5)
+    hs_table = esum.table
+    eterms = list(esum.eterms)
+
+    selected = hs_table.select(np.array([3, 0]))
+
+    assert selected.eterms() == [eterms[3], eterms[0]]
+    assert hs_table.select(np.zeros(0, dtype=np.int64)).to_esum() == flat.Esum.empty
+
+
+def test_from_hses_and_take():
+    hses = list(common_shapes.crude_c().eterms[0].hses)
+    hs_table = table.HsTable.from_hses(hses)
+
+    assert hs_table.n_eterms == 1
+    assert hs_table.hses() == hses
+    assert hs_table.take(np.array([2, 0])).hses() == [hses[2], hses[0]]
+
+
+def _random_points():
+    rng = np.random.default_rng(0)
+    return rng.uniform(-2, 12, size=(500, 2))
+
+
+@pytest.mark.parametrize("esum", SHAPES)
+def test_contains_kernels(esum):
+    points = _random_points()
+    ends, offsets = esum.table.eterm_arrays()
+    expected_strict = [esum.contains(flat.Pt(x, y)) for x, y in points.tolist()]
+    expected_with_eps = [
+        flat._esum_contains_pt_with_eps(esum, flat.Pt(x, y))
+        for x, y in points.tolist()
+    ]
+
+    with_eps, strict = table.classify_pts(ends, offsets, points)
+
+    assert table.contains_pts(ends, offsets, points, 10e-7).tolist() == (
+        expected_strict
+    )
+    assert strict.tolist() == expected_strict
+    assert with_eps.tolist() == expected_with_eps
+    if esum.eterms:
+        assert table.complement_contains_pts(ends, offsets, points, 10e-7).tolist() == (
+            [flat.NotEsum(esum).contains(flat.Pt(x, y)) for x, y in points.tolist()]
+        )
+
+
+def test_per_eterm_empty_eterms():
+    flags = np.array([[True, False], [True, True], [False, False]])
+    offsets = np.array([0, 0, 2, 2, 3])
+
+    assert table.all_per_eterm(flags, offsets).tolist() == [
+        [True, True],
+        [True, False],
+        [True, True],
+        [False, False],
+    ]
+    assert table.any_per_eterm(flags, offsets).tolist() == [
+        [False, False],
+        [True, True],
+        [False, False],
+        [False, False],
+    ]
+
+
+def test_eterm_arrays():
+    esum = shape_gen.rect_union_chain(n=5)
+    eterms = list(esum.eterms)
+
+    ends, offsets = esum.table.eterm_arrays(np.array([3, 1]))
+
+    numpy.testing.assert_array_equal(
+        ends, np.concatenate([eterms[3].endpoints, eterms[1].endpoints])
+    )
+    assert offsets.tolist() == [0, 4, 8]
+    assert esum.table.eterm_arrays()[0] is esum.table.endpoints
+
+
+def test_esum_checks_run_on_the_table(monkeypatch):
+    esum = shape_gen.rect_union_chain(n=5)
+    points = _random_points()
+    calls = []
+
+    def _counted(kernel):
+        def _kernel(endpoints, *args, **kwargs):
+            calls.append(kernel.__name__)
+            assert np.shares_memory(endpoints, esum.table.endpoints)
+            return kernel(endpoints, *args, **kwargs)
+
+        return _kernel
+
+    for name in ["contains_pts", "classify_pts", "complement_contains_pts"]:
+        monkeypatch.setattr(table, name, _counted(getattr(table, name)))
+
+    esum.contains_many(points)
+    flat.filter_segments(esum, flat.find_segments(flat.find_vertices(esum)))
+    esum.lazy_conjugate.contains_many(points)
+
+    assert calls == ["contains_pts", "classify_pts", "complement_contains_pts"]
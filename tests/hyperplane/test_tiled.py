@@ -0,0 +1,91 @@
+import random
+
+import pytest
+
+from halfplane import common_shapes, flat, shape_gen, tiled
+
+
+def _segments_geometry(segments):
+    out = set()
+    for seg in segments:
+        pt1, pt2 = seg.x1.point, seg.x2.point
+        if pt1.distance(pt2) > 1e-9:
+            coords = (round(c, 6) for c in (pt1.x, pt1.y, pt2.x, pt2.y))
+            out.add((seg.common_hs, *coords))
+    return out
+
+
+def _random_rects(seed, n):
+    rng = random.Random(seed)
+    return flat.Esum.from_terms(
+        *(
+            shape_gen.rect(
+                min_x=rng.randint(0, 20),
+                min_y=rng.randint(0, 20),
+                width=rng.randint(1, 5),
+                height=rng.randint(1, 5),
+            ).eterms[0]
+            for _ in range(n)
+        )
+    )
+
+
+SHAPES = [
+    common_shapes.triangle(),
+    common_shapes.hourglass(),
+    common_shapes.letter_c(),
+    shape_gen.rect_union_chain(n=10),
+    shape_gen.play_button_chain(min_x=4.0, min_y=3.0, n=2, stride=0.2),
+    _random_rects(seed=0, n=20),
+    flat.Esum.empty,
+]
+
+
+@pytest.mark.parametrize("esum", SHAPES)
+@pytest.mark.parametrize("tiles", [1, 3, (5, 2)])
+def test_same_as_serial(esum, tiles):
+    expected = flat.detect_boundary(esum)
+
+    segments = tiled.detect_boundary_tiled(esum, tiles=tiles, workers=1)
+
+    assert _segments_geometry(segments) == _segments_geometry(expected)
+
+
+def test_workers():
+    esum = _random_rects(seed=1, n=20)
+    expected = flat.detect_boundary(esum)
+
+    segments = flat.detect_boundary(esum, tiles=4, workers=2)
+
+    assert _segments_geometry(segments) == _segments_geometry(expected)
+
+
+def test_unbounded_falls_back_to_serial():
+    esum = common_shapes.crude_c().conjugate
+
+    assert tiled.detect_boundary_tiled(esum, tiles=3, workers=1) == (
+        flat.detect_boundary(esum)
+    )
+
+
+def test_cache_and_tiles():
+    with pytest.raises(ValueError):
+        flat.detect_boundary(common_shapes.triangle(), cache=object(), tiles=2)
+
+
+def test_vertices_finder_and_tiles():
+    with pytest.raises(ValueError):
+        flat.detect_boundary(
+            common_shapes.triangle(),
+            vertices_finder=flat.find_vertices_clipped,
+            tiles=2,
+        )
+
+
+def test_grid_cells_cover_the_plane():
+    grid = tiled.Grid.over_box(flat.Box(0, 0, 10, 4), n_cols=5, n_rows=2)
+
+    assert grid.cell_of(flat.Pt(0, 0)) == (0, 0)
+    assert grid.cell_of(flat.Pt(2, 2)) == (1, 1)
+    assert grid.cell_of(flat.Pt(10, 4)) == (4, 1)
+    assert grid.cell_of(flat.Pt(-5, 100)) == (0, 1)